@@ -0,0 +1,150 @@
+"""
+Модуль API эндпоинтов для мониторинга сервиса
+"""
+
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends
+from starlette.responses import PlainTextResponse
+from starlette import status as status_codes
+
+from core.db import pool_stats
+from core.metrics import metrics_registry
+from core.tasks import notification_dispatcher
+from schemas.monitoring import (
+    CacheStatsSchema,
+    CircuitBreakerStatsSchema,
+    DbPoolStatsSchema,
+    DispatcherChannelStatsSchema,
+    NotificationStatusCountsSchema,
+    RateLimiterStatsSchema,
+)
+from service.notifications.cache import notification_history_cache
+from service.notifications.notification_sender import (
+    notification_handler_factory
+)
+from service.notifications.rate_limiter import notification_rate_limiter
+from service.notifications.repository import (
+    NotificationRepository,
+    get_notification_repository,
+)
+
+monitoring_router = APIRouter(
+    prefix="/api/monitoring",
+    tags=["Monitoring"]
+)
+metrics_router = APIRouter(tags=["Monitoring"])
+
+
+@metrics_router.get(
+    path="/metrics",
+    summary="Метрики в формате Prometheus",
+    description="Гистограммы длительности запросов и отправок, "
+                "счетчики результатов отправки и повторов, "
+                "ожидание пула БД и глубина очередей диспетчера",
+    response_class=PlainTextResponse,
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_metrics():
+    """
+    Метрики сервиса в текстовом формате Prometheus
+    """
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@monitoring_router.get(
+    path="/dispatcher",
+    summary="Состояние диспетчера отправки",
+    description="Возвращает глубину очереди и число отправок "
+                "в процессе для каждого канала",
+    response_model=Dict[str, DispatcherChannelStatsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_dispatcher_stats():
+    """
+    Состояние очередей диспетчера отправки по каналам
+    """
+    return notification_dispatcher.stats()
+
+
+@monitoring_router.get(
+    path="/cache",
+    summary="Счетчики кэша истории уведомлений",
+    description="Возвращает попадания, промахи и инвалидации кэша, "
+                "null если кэш отключен",
+    response_model=Optional[CacheStatsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_cache_stats():
+    """
+    Счетчики кэша истории уведомлений
+    """
+    if notification_history_cache is None:
+        return None
+    return notification_history_cache.stats()
+
+
+@monitoring_router.get(
+    path="/rate-limiter",
+    summary="Ожидание ограничителя скорости отправки",
+    description="Возвращает число отправок, ждавших ограничителя, "
+                "и суммарное время ожидания по каналам",
+    response_model=Dict[str, RateLimiterStatsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_rate_limiter_stats():
+    """
+    Счетчики ограничителя скорости отправки по каналам
+    """
+    return notification_rate_limiter.stats()
+
+
+@monitoring_router.get(
+    path="/circuit-breakers",
+    summary="Состояние circuit breaker каналов отправки",
+    description="Возвращает состояние цепи (closed, open, half_open), "
+                "вызовы и ошибки в скользящем окне по каналам",
+    response_model=Dict[str, CircuitBreakerStatsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_circuit_breaker_stats():
+    """
+    Состояние circuit breaker по каналам
+    """
+    return notification_handler_factory.circuit_stats()
+
+
+@monitoring_router.get(
+    path="/db-pools",
+    summary="Использование пулов соединений БД",
+    description="Возвращает размер пула, число выданных и свободных "
+                "соединений для пулов API и фоновой отправки",
+    response_model=Dict[str, DbPoolStatsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_db_pool_stats():
+    """
+    Использование пулов соединений БД
+    """
+    return pool_stats()
+
+
+@monitoring_router.get(
+    path="/statuses",
+    summary="Число уведомлений по статусам",
+    description="Возвращает число уведомлений в статусах pending, sent "
+                "и failed по каналам из поддерживаемых триггером "
+                "счетчиков, без сканирования таблицы уведомлений",
+    response_model=Dict[str, NotificationStatusCountsSchema],
+    status_code=status_codes.HTTP_200_OK,
+)
+async def get_status_counts(
+    repository: NotificationRepository = Depends(get_notification_repository),
+):
+    """
+    Число уведомлений по статусам для каждого канала
+    """
+    return await repository.status_counts()
@@ -2,28 +2,117 @@
 Модуль API эндпоинтов для работы с уведомлениями
 """
 
+import asyncio
+import logging
+from collections import Counter
 from typing import Optional, List, Literal
 
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.params import Depends, Query
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.exceptions import RequestValidationError
+from fastapi.params import Depends, Header, Query
+from pydantic import TypeAdapter, ValidationError
 from starlette import status as status_codes
+from starlette.responses import StreamingResponse
 
-from core.tasks import send_notification_background
+from api.responses import SchemaJSONResponse
+from core.config import app_config
+from core.db import async_session_factory
+from core.tasks import notification_dispatcher
 from schemas.notifications import (
+    BatchCreatedSchema,
+    BroadcastCreatedSchema,
+    CreateBroadcastSchema,
     CreateNotificationSchema,
+    NotificationPageSchema,
     NotificationSchema,
 )
-
+from service.notifications.exceptions import DispatcherOverloadedError
+from service.notifications.idempotency import idempotency_cache
 from service.notifications.repository import (
     get_notification_repository,
     NotificationRepository,
 )
+from service.notifications.status_hub import (
+    StatusSubscription,
+    notification_status_hub,
+)
+
+logger = logging.getLogger(__name__)
 
 notifications_router = APIRouter(
     prefix="/api/notifications",
     tags=["Notifications"]
 )
 
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+
+_create_schemas_adapter = TypeAdapter(List[CreateNotificationSchema])
+
+
+def _parse_batch_body(
+        body: bytes,
+        content_type: str
+) -> List[CreateNotificationSchema]:
+    """
+    Разбор и валидация тела пакетного запроса:
+    JSON массив или NDJSON (одно уведомление на строку)
+
+    :param body: тело запроса
+    :param content_type: заголовок Content-Type
+    :return: провалидированные схемы создания уведомлений
+    """
+    if content_type.split(";")[0].strip() in NDJSON_MEDIA_TYPES:
+        create_schemas = []
+        errors = []
+        for line_number, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                create_schemas.append(
+                    CreateNotificationSchema.model_validate_json(line)
+                )
+            except ValidationError as err:
+                errors.extend(
+                    {**error, "loc": ("body", line_number, *error["loc"])}
+                    for error in err.errors(include_url=False)
+                )
+        if errors:
+            raise RequestValidationError(errors)
+        return create_schemas
+
+    try:
+        return _create_schemas_adapter.validate_json(body)
+    except ValidationError as err:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in err.errors(include_url=False)
+        ]) from err
+
+
+def _submit(notification_schema: NotificationSchema):
+    """
+    Постановка уведомления в очередь диспетчера.
+
+    Если очередь успела заполниться, пока уведомление сохранялось,
+    оно остается в БД и будет отправлено обработчиком очереди
+    после истечения аренды.
+    """
+    try:
+        notification_dispatcher.submit(notification_schema)
+    except DispatcherOverloadedError as err:
+        logger.warning(
+            "уведомление id=%i отложено до истечения аренды: %s",
+            notification_schema.id_notification,
+            err
+        )
+
 
 @notifications_router.post(
     summary="Создать новое уведомление",
@@ -35,35 +124,231 @@ notifications_router = APIRouter(
 )
 async def create_notification(
     create_schema: CreateNotificationSchema,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        min_length=1,
+        max_length=255,
+        description="Ключ идемпотентности: повтор запроса с тем же "
+                    "ключом возвращает уже созданное уведомление",
+    ),
     repository: NotificationRepository = Depends(get_notification_repository),
 ):
     """
     Создание нового уведомления.
 
     Уведомление сохраняется в БД со статусом "pending",
-    после чего запускается фоновая задача
+    после чего ставится в очередь диспетчера
     для его отправки. Клиент получает ответ немедленно,
     не дожидаясь завершения отправки.
+
+    Если очередь канала заполнена, возвращается 503.
+    В режиме DISPATCH_MODE=worker уведомление только сохраняется,
+    его отправит обработчик очереди (worker.py).
+
+    Уведомление с send_at только сохраняется: его передаст
+    в отправку планировщик в назначенное время.
+
+    Повтор запроса с тем же Idempotency-Key возвращает исходное
+    уведомление с заголовком Idempotent-Replayed: true, не создавая
+    новое и не отправляя его повторно.
     """
-    notification = await repository.create(create_schema=create_schema)
-    notification_schema = NotificationSchema.model_validate(
-        notification,
-        from_attributes=True
+    if idempotency_key is not None:
+        replayed = idempotency_cache.get(idempotency_key)
+        if replayed is not None:
+            return _replay(replayed, create_schema, response)
+
+    # запланированное уведомление отправит планировщик
+    inline = (
+        app_config.dispatch_mode == "inline"
+        and create_schema.send_at is None
     )
-    background_tasks.add_task(
-        send_notification_background,
-        notification_schema
+    if inline and notification_dispatcher.free_slots(
+            create_schema.notification_type,
+            create_schema.priority,
+    ) <= 0:
+        raise HTTPException(
+            status_code=status_codes.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Очередь отправки переполнена, повторите позже",
+            headers={"Retry-After": "1"},
+        )
+
+    lease = app_config.dispatch_lease if inline else None
+    if idempotency_key is None:
+        notification_schema = await repository.create(
+            create_schema=create_schema,
+            lease=lease,
+        )
+    else:
+        notification_schema, created = await repository.create_idempotent(
+            create_schema=create_schema,
+            idempotency_key=idempotency_key,
+            lease=lease,
+        )
+        idempotency_cache.set(idempotency_key, notification_schema)
+        if not created:
+            return _replay(notification_schema, create_schema, response)
+
+    if inline:
+        _submit(notification_schema)
+    return notification_schema.model_dump()
+
+
+def _replay(
+        notification_schema: NotificationSchema,
+        create_schema: CreateNotificationSchema,
+        response: Response,
+) -> dict:
+    """
+    Ответ на повтор запроса с уже использованным ключом идемпотентности
+
+    :raises HTTPException: ключ использован с другими данными
+    """
+    if (
+            notification_schema.user_id,
+            notification_schema.message,
+            notification_schema.notification_type,
+            notification_schema.priority,
+            notification_schema.send_at,
+    ) != (
+            create_schema.user_id,
+            create_schema.message,
+            create_schema.notification_type,
+            create_schema.priority,
+            create_schema.send_at,
+    ):
+        raise HTTPException(
+            status_code=status_codes.HTTP_409_CONFLICT,
+            detail="Ключ идемпотентности уже использован с другими данными",
+        )
+    response.headers["Idempotent-Replayed"] = "true"
+    return notification_schema.model_dump()
+
+
+@notifications_router.post(
+    summary="Создать пачку уведомлений",
+    description="Создает уведомления из JSON массива или NDJSON "
+                "и ставит всю пачку в очередь отправки",
+    response_description="Количество и id созданных уведомлений",
+    path="/batch",
+    response_model=BatchCreatedSchema,
+    response_class=SchemaJSONResponse,
+    status_code=status_codes.HTTP_201_CREATED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {
+                            "$ref": "#/components/schemas/"
+                                    "CreateNotificationSchema"
+                        },
+                    }
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_notifications_batch(
+    request: Request,
+    repository: NotificationRepository = Depends(get_notification_repository),
+):
+    """
+    Пакетное создание уведомлений.
+
+    Все уведомления вставляются чанками (один INSERT на чанк)
+    и фиксируются одним коммитом. Если в очередях диспетчера
+    есть место для всей пачки, она сразу ставится в очередь,
+    иначе её разбирает обработчик очереди в БД.
+    """
+    create_schemas = _parse_batch_body(
+        await request.body(),
+        request.headers.get("content-type", "application/json"),
+    )
+    if not create_schemas:
+        raise RequestValidationError([{
+            "type": "too_short",
+            "loc": ("body",),
+            "msg": "Пачка должна содержать хотя бы одно уведомление",
+            "input": [],
+        }])
+    if len(create_schemas) > app_config.batch_max_size:
+        raise HTTPException(
+            status_code=status_codes.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Размер пачки превышает {app_config.batch_max_size}",
+        )
+
+    inline = app_config.dispatch_mode == "inline" and all(
+        notification_dispatcher.free_slots(notification_type, priority)
+        >= count
+        for (notification_type, priority), count in Counter(
+            (create_schema.notification_type, create_schema.priority)
+            for create_schema in create_schemas
+            if create_schema.send_at is None
+        ).items()
+    )
+    notification_schemas = await repository.create_many(
+        create_schemas=create_schemas,
+        lease=app_config.dispatch_lease if inline else None,
+    )
+    if inline:
+        for notification_schema in notification_schemas:
+            if notification_schema.send_at is None:
+                _submit(notification_schema)
+    return SchemaJSONResponse(
+        BatchCreatedSchema(
+            created=len(notification_schemas),
+            ids=[schema.id_notification for schema in notification_schemas],
+        ),
+        status_code=status_codes.HTTP_201_CREATED,
+    )
+
+
+@notifications_router.post(
+    summary="Создать рассылку",
+    description="Создает уведомления с одним текстом для списка "
+                "или диапазона получателей",
+    response_description="id шаблона и количество созданных уведомлений",
+    path="/broadcast",
+    response_model=BroadcastCreatedSchema,
+    response_class=SchemaJSONResponse,
+    status_code=status_codes.HTTP_201_CREATED,
+)
+async def create_broadcast(
+    broadcast: CreateBroadcastSchema,
+    repository: NotificationRepository = Depends(get_notification_repository),
+):
+    """
+    Создание рассылки.
+
+    Текст сохраняется один раз как шаблон, строки получателей
+    создаются на стороне БД. Рассылка не ставится в очередь
+    диспетчера сразу: её разбирает обработчик очереди с учетом
+    приоритета, не вытесняя срочные уведомления.
+    """
+    if broadcast.recipient_count > app_config.broadcast_max_recipients:
+        raise HTTPException(
+            status_code=status_codes.HTTP_413_CONTENT_TOO_LARGE,
+            detail="Число получателей превышает "
+                   f"{app_config.broadcast_max_recipients}",
+        )
+    return SchemaJSONResponse(
+        await repository.create_broadcast(broadcast),
+        status_code=status_codes.HTTP_201_CREATED,
     )
-    return notification
 
 
 @notifications_router.get(
     path="/{user_id}",
     summary="Получить уведомления пользователя",
-    description="Возвращает уведомления пользователя "
+    description="Возвращает страницу уведомлений пользователя "
                 "с фильтрацией по статусу отправки",
-    response_model=List[NotificationSchema],
+    response_model=NotificationPageSchema,
+    response_class=SchemaJSONResponse,
     status_code=status_codes.HTTP_200_OK,
 )
 async def get_user_notifications(
@@ -72,20 +357,127 @@ async def get_user_notifications(
         None,
         description="Фильтр по статусу уведомления"
     ),
+    limit: int = Query(
+        app_config.page_default_limit,
+        ge=1,
+        le=app_config.page_max_limit,
+        description="Размер страницы"
+    ),
+    before_id: Optional[int] = Query(
+        None,
+        ge=1,
+        description="Курсор: next_cursor предыдущей страницы"
+    ),
     repository: NotificationRepository = Depends(get_notification_repository),
 ):
     """
     Возвращает историю уведомлений
     для указанного пользователя с возможностью фильтрации по статусу.
+
+    История отдается страницами от новых к старым,
+    для следующей страницы передается before_id=next_cursor.
     """
-    notifications = await repository.get_by_user_id(
+    page = await repository.get_by_user_id(
         user_id=user_id,
-        status=status
+        status=status,
+        limit=limit,
+        before_id=before_id,
+    )
+    return SchemaJSONResponse(page)
+
+
+@notifications_router.get(
+    path="/{user_id}/export",
+    summary="Выгрузить всю историю уведомлений пользователя",
+    description="Потоково отдает все уведомления пользователя "
+                "в формате NDJSON (одно уведомление на строку)",
+    response_class=StreamingResponse,
+    responses={
+        status_codes.HTTP_200_OK: {
+            "content": {"application/x-ndjson": {}},
+        }
+    },
+)
+async def export_user_notifications(
+    user_id: int,
+    status: Optional[Literal["pending", "sent", "failed"]] = Query(
+        None,
+        description="Фильтр по статусу уведомления"
+    ),
+):
+    """
+    Выгрузка всей истории пользователя для поддержки и аудита.
+
+    Ответ отправляется после выхода из эндпоинта, поэтому генератор
+    открывает собственную сессию, а не использует зависимость.
+    Строки читаются серверным курсором чанками, и память
+    не зависит от размера истории.
+    """
+    async def ndjson_chunks():
+        async with async_session_factory() as session:
+            repository = NotificationRepository(session)
+            async for chunk in repository.stream_by_user_id(
+                    user_id=user_id,
+                    status=status,
+            ):
+                yield "".join(
+                    notification.model_dump_json(by_alias=True) + "\n"
+                    for notification in chunk
+                )
+
+    return StreamingResponse(
+        ndjson_chunks(),
+        media_type="application/x-ndjson",
     )
-    schemas = [
-        NotificationSchema.model_validate(
-            notification, from_attributes=True
+
+
+async def _wait_disconnect(
+        websocket: WebSocket,
+        subscription: StatusSubscription,
+):
+    """
+    Ожидание отключения клиента: входящие сообщения
+    игнорируются, при отключении подписка закрывается
+    """
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+    subscription.close()
+
+
+@notifications_router.websocket(path="/{user_id}/statuses")
+async def push_user_statuses(websocket: WebSocket, user_id: int):
+    """
+    Подписка на смену статусов уведомлений пользователя
+    вместо опроса истории.
+
+    На каждую смену статуса клиент получает JSON сообщение
+    NotificationStatusEventSchema. Клиенту, не успевающему читать
+    события, соединение закрывается с кодом 1013: ему нужно
+    перечитать историю и подключиться заново.
+    """
+    if notification_status_hub is None:
+        await websocket.close(
+            code=status_codes.WS_1008_POLICY_VIOLATION,
+            reason="Подписка на статусы отключена",
+        )
+        return
+    await websocket.accept()
+    async with notification_status_hub.subscribe(user_id) as subscription:
+        receiver = asyncio.create_task(
+            _wait_disconnect(websocket, subscription)
+        )
+        try:
+            while (event := await subscription.get()) is not None:
+                await websocket.send_text(event.model_dump_json())
+        except WebSocketDisconnect:
+            return
+        finally:
+            disconnected = receiver.done()
+            receiver.cancel()
+    if not disconnected:
+        # подписка закрыта хабом: переполнение или остановка сервиса
+        await websocket.close(
+            code=status_codes.WS_1013_TRY_AGAIN_LATER
+            if subscription.overflowed
+            else status_codes.WS_1001_GOING_AWAY
         )
-        for notification in notifications
-    ]
-    return schemas
@@ -0,0 +1,32 @@
+"""
+Классы ответов API
+"""
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+from starlette.responses import Response
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema_type: type) -> TypeAdapter:
+    """
+    TypeAdapter схемы, создается один раз на тип
+    """
+    return TypeAdapter(schema_type)
+
+
+class SchemaJSONResponse(Response):
+    """
+    JSON ответ из pydantic-схемы.
+
+    Схема сериализуется в байты за один проход через
+    TypeAdapter.dump_json с алиасами полей. Если эндпоинт возвращает
+    этот ответ, FastAPI не валидирует результат по response_model
+    повторно и не прогоняет его через jsonable_encoder и json.dumps,
+    а response_model остается только для документации.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _adapter(type(content)).dump_json(content, by_alias=True)
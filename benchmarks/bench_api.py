@@ -0,0 +1,118 @@
+"""
+Нагрузочные бенчмарки HTTP API: пропускная способность
+и задержки POST/GET и время от создания до статуса "sent"
+"""
+import asyncio
+import time
+from argparse import Namespace
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import Integer, any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from benchmarks.harness import measure_async, summarize
+from core.db import async_session_factory
+from main import app
+from models.notifications import Notification
+
+USER_ID = 800001
+
+
+async def bench_post(client: httpx.AsyncClient, options: Namespace) -> dict:
+    """
+    POST /api/notifications/
+    """
+    async def post(index: int):
+        response = await client.post(
+            "/api/notifications/",
+            json={
+                "user_id": USER_ID + index % 100,
+                "message": f"Benchmark message {index}",
+                "type": "telegram" if index % 2 else "email",
+            },
+        )
+        response.raise_for_status()
+
+    return await measure_async(
+        post,
+        rounds=options.rounds,
+        concurrency=options.concurrency,
+    )
+
+
+async def bench_get(client: httpx.AsyncClient, options: Namespace) -> dict:
+    """
+    GET /api/notifications/{user_id}
+    """
+    async def get(index: int):
+        response = await client.get(
+            f"/api/notifications/{USER_ID + index % 100}",
+            params={"limit": 50},
+        )
+        response.raise_for_status()
+
+    return await measure_async(
+        get,
+        rounds=options.rounds,
+        concurrency=options.concurrency,
+    )
+
+
+async def bench_time_to_sent(
+        client: httpx.AsyncClient,
+        options: Namespace,
+) -> dict:
+    """
+    время от ответа на POST /batch до статуса "sent" в БД
+    """
+    response = await client.post(
+        "/api/notifications/batch",
+        json=[
+            {
+                "user_id": USER_ID + index % 100,
+                "message": f"End-to-end {index}",
+                "type": "telegram" if index % 2 else "email",
+            }
+            for index in range(options.rounds)
+        ],
+    )
+    response.raise_for_status()
+    created_at = time.perf_counter()
+    waiting = set(response.json()["ids"])
+    samples: List[float] = []
+    deadline = created_at + options.timeout
+    while waiting and time.perf_counter() < deadline:
+        async with async_session_factory() as session:
+            result = await session.execute(
+                select(Notification.id_notification).where(
+                    Notification.id_notification == any_(
+                        bindparam("ids", list(waiting), type_=ARRAY(Integer))
+                    ),
+                    Notification.status == "sent",
+                )
+            )
+            sent = set(result.scalars().all())
+        observed_at = time.perf_counter()
+        samples.extend([observed_at - created_at] * len(sent))
+        waiting -= sent
+        await asyncio.sleep(0.01)
+    summary = summarize(samples, time.perf_counter() - created_at)
+    summary["not_sent"] = len(waiting)
+    return summary
+
+
+async def run(options: Namespace) -> Dict[str, dict]:
+    """
+    Запуск бенчмарков API на приложении с выполненным lifespan
+    """
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url="http://bench",
+        ) as client:
+            return {
+                "post": await bench_post(client, options),
+                "get": await bench_get(client, options),
+                "time_to_sent": await bench_time_to_sent(client, options),
+            }
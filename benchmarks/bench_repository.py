@@ -0,0 +1,136 @@
+"""
+Сравнение ORM-гидратации и облегченных путей NotificationRepository:
+процессорное время и выделенная память на одну строку
+"""
+import time
+import tracemalloc
+from argparse import Namespace
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import select
+
+from core.db import async_session_factory
+from models.notifications import Notification
+from schemas.notifications import CreateNotificationSchema, NotificationSchema
+from service.notifications.repository import NotificationRepository
+
+USER_ID = 700001
+PAGE_SIZE = 500
+
+
+async def _profile(
+        operation: Callable[[int], Awaitable[int]],
+        rounds: int,
+) -> Dict[str, float]:
+    """
+    Процессорное время и пик выделенной памяти на строку
+
+    :param operation: корутина, возвращает число обработанных строк
+    :param rounds: число повторов для замера времени
+    """
+    await operation(0)
+    rows = 0
+    started_at = time.process_time()
+    for index in range(rounds):
+        rows += await operation(index)
+    cpu = time.process_time() - started_at
+
+    tracemalloc.start()
+    try:
+        traced_rows = await operation(rounds)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "rows": rows,
+        "cpu_us_per_row": round(cpu / rows * 1e6, 3),
+        "peak_alloc_bytes_per_row": round(peak / traced_rows, 1),
+    }
+
+
+async def orm_page(_: int) -> int:
+    """
+    страница истории через ORM-объекты и from_attributes
+    """
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(Notification)
+            .where(Notification.user_id == USER_ID)
+            .order_by(Notification.id_notification.desc())
+            .limit(PAGE_SIZE)
+        )
+        items = [
+            NotificationSchema.model_validate(notification,
+                                              from_attributes=True)
+            for notification in result.scalars()
+        ]
+    return len(items)
+
+
+async def lean_page(_: int) -> int:
+    """
+    страница истории через кортежи колонок
+    """
+    async with async_session_factory() as session:
+        page = await NotificationRepository(session).get_by_user_id(
+            user_id=USER_ID,
+            limit=PAGE_SIZE,
+        )
+    return len(page.items)
+
+
+async def orm_create(index: int) -> int:
+    """
+    создание через ORM-объект и unit of work
+    """
+    async with async_session_factory() as session:
+        notification = Notification(
+            user_id=USER_ID + 1,
+            message=f"ORM {index}",
+            notification_type="email",
+            status="pending",
+        )
+        session.add(notification)
+        await session.commit()
+        NotificationSchema.model_validate(notification, from_attributes=True)
+    return 1
+
+
+async def lean_create(index: int) -> int:
+    """
+    создание через INSERT ... RETURNING
+    """
+    async with async_session_factory() as session:
+        await NotificationRepository(session).create(
+            CreateNotificationSchema(
+                user_id=USER_ID + 1,
+                message=f"Core {index}",
+                type="email",
+            )
+        )
+    return 1
+
+
+async def run(options: Namespace) -> Dict[str, dict]:
+    """
+    Запуск сравнения ORM и облегченных путей
+    """
+    async with async_session_factory() as session:
+        await NotificationRepository(session).create_many(
+            [
+                CreateNotificationSchema(
+                    user_id=USER_ID,
+                    message=f"History {index}",
+                    type="telegram",
+                )
+                for index in range(PAGE_SIZE)
+            ],
+            lease=3600,
+        )
+    page_rounds = max(options.rounds // 20, 5)
+    return {
+        "page_orm": await _profile(orm_page, page_rounds),
+        "page_lean": await _profile(lean_page, page_rounds),
+        "create_orm": await _profile(orm_create, options.rounds),
+        "create_lean": await _profile(lean_create, options.rounds),
+    }
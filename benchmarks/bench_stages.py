@@ -0,0 +1,275 @@
+"""
+Микробенчмарки отдельных стадий обработки уведомления:
+валидация, вставка, диспетчеризация и запись статусов
+"""
+import asyncio
+import json
+from argparse import Namespace
+from typing import Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from api.responses import SchemaJSONResponse
+from benchmarks.harness import measure, measure_async, summarize
+from core.config import app_config
+from core.db import async_session_factory
+from schemas.notifications import (
+    CreateNotificationSchema,
+    NotificationPageSchema,
+    NotificationSchema,
+)
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.repository import NotificationRepository
+
+USER_ID = 900001
+
+
+def _payload(index: int) -> dict:
+    return {
+        "user_id": USER_ID + index % 100,
+        "message": f"Benchmark message {index}",
+        "type": "telegram" if index % 2 else "email",
+    }
+
+
+def bench_validation(options: Namespace) -> dict:
+    """
+    валидация тела запроса на создание
+    """
+    return measure(
+        lambda index: CreateNotificationSchema.model_validate(
+            _payload(index)
+        ),
+        rounds=options.rounds * 10,
+    )
+
+
+def _page(size: int) -> NotificationPageSchema:
+    return NotificationPageSchema(
+        items=[
+            NotificationSchema(
+                id_notification=index + 1,
+                user_id=USER_ID,
+                message=f"Benchmark message {index}",
+                notification_type="email",
+                status="sent",
+            )
+            for index in range(size)
+        ],
+        next_cursor=1,
+    )
+
+
+def bench_page_response_model(options: Namespace) -> dict:
+    """
+    страница из 500 уведомлений по пути response_model:
+    повторная валидация, jsonable_encoder и json.dumps
+    """
+    page = _page(500)
+    adapter = TypeAdapter(NotificationPageSchema)
+    return measure(
+        lambda _: json.dumps(jsonable_encoder(adapter.dump_python(
+            adapter.validate_python(page),
+            mode="json",
+            by_alias=True,
+        ))).encode(),
+        rounds=max(options.rounds // 10, 10),
+    )
+
+
+def bench_page_response_fast(options: Namespace) -> dict:
+    """
+    та же страница через SchemaJSONResponse
+    """
+    page = _page(500)
+    return measure(
+        lambda _: SchemaJSONResponse(page).body,
+        rounds=max(options.rounds // 10, 10),
+    )
+
+
+async def bench_insert(options: Namespace) -> dict:
+    """
+    вставка одного уведомления (сессия + INSERT + коммит)
+    """
+    async def insert(index: int):
+        async with async_session_factory() as session:
+            await NotificationRepository(session).create(
+                CreateNotificationSchema.model_validate(_payload(index)),
+                lease=3600,
+            )
+
+    return await measure_async(insert, rounds=options.rounds)
+
+
+async def bench_insert_batch(options: Namespace) -> dict:
+    """
+    пакетная вставка, время приведено к одной строке
+    """
+    schemas = [
+        CreateNotificationSchema.model_validate(_payload(index))
+        for index in range(options.batch_size)
+    ]
+    samples = []
+    elapsed = 0.0
+    for _ in range(max(options.rounds // options.batch_size, 3)):
+        async with async_session_factory() as session:
+            started_at = asyncio.get_running_loop().time()
+            await NotificationRepository(session).create_many(
+                schemas,
+                lease=3600,
+            )
+            spent = asyncio.get_running_loop().time() - started_at
+        elapsed += spent
+        samples.extend([spent / len(schemas)] * len(schemas))
+    return summarize(samples, elapsed)
+
+
+async def bench_dispatch(options: Namespace) -> dict:
+    """
+    путь уведомления через очередь и воркер диспетчера
+    без отправки и записи статуса
+    """
+    done: Dict[int, asyncio.Future] = {}
+
+    async def process(batch: List[NotificationSchema]):
+        for notification in batch:
+            done.pop(notification.id_notification).set_result(None)
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"email": 4, "telegram": 4},
+        queue_size=options.rounds,
+        batch_size={"email": 20, "telegram": 1},
+    )
+    dispatcher.start()
+
+    async def dispatch(index: int):
+        notification = NotificationSchema(
+            id_notification=index + 1,
+            user_id=USER_ID,
+            message="dispatch",
+            notification_type="telegram" if index % 2 else "email",
+            status="pending",
+        )
+        done[notification.id_notification] = (
+            asyncio.get_running_loop().create_future()
+        )
+        future = done[notification.id_notification]
+        dispatcher.submit(notification)
+        await future
+
+    try:
+        return await measure_async(
+            dispatch,
+            rounds=options.rounds * 10,
+            concurrency=options.concurrency,
+        )
+    finally:
+        await dispatcher.stop()
+
+
+async def bench_dispatch_priority(options: Namespace) -> dict:
+    """
+    задержка срочного уведомления, пока в канале стоит массовая
+    рассылка: отправка имитируется паузой в 1 мс
+    """
+    done: Dict[int, asyncio.Future] = {}
+    backlog = options.rounds * 10
+
+    async def process(batch: List[NotificationSchema]):
+        await asyncio.sleep(0.001)
+        for notification in batch:
+            future = done.pop(notification.id_notification, None)
+            if future is not None:
+                future.set_result(None)
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"email": 4},
+        queue_size=backlog,
+        weights={
+            "high": app_config.high_priority_weight,
+            "normal": app_config.normal_priority_weight,
+            "low": app_config.low_priority_weight,
+        },
+    )
+    dispatcher.start()
+    for index in range(backlog):
+        dispatcher.submit(NotificationSchema(
+            id_notification=index + 1,
+            user_id=USER_ID,
+            message="campaign",
+            notification_type="email",
+            status="pending",
+            priority="low",
+        ))
+
+    async def dispatch(index: int):
+        notification = NotificationSchema(
+            id_notification=backlog + index + 1,
+            user_id=USER_ID,
+            message="Your code: 11111",
+            notification_type="email",
+            status="pending",
+            priority="high",
+        )
+        future = done[notification.id_notification] = (
+            asyncio.get_running_loop().create_future()
+        )
+        dispatcher.submit(notification)
+        await future
+
+    try:
+        return await measure_async(
+            dispatch,
+            rounds=options.rounds,
+            concurrency=options.concurrency,
+        )
+    finally:
+        await dispatcher.stop()
+
+
+async def bench_status_update(options: Namespace) -> dict:
+    """
+    пакетная запись статусов, время приведено к одному уведомлению
+    """
+    async with async_session_factory() as session:
+        created = await NotificationRepository(session).create_many(
+            [
+                CreateNotificationSchema.model_validate(_payload(index))
+                for index in range(options.batch_size)
+            ],
+            lease=3600,
+        )
+    ids = [schema.id_notification for schema in created]
+    samples = []
+    elapsed = 0.0
+    for round_index in range(max(options.rounds // options.batch_size, 3)):
+        status = "sent" if round_index % 2 else "failed"
+        async with async_session_factory() as session:
+            started_at = asyncio.get_running_loop().time()
+            await NotificationRepository(session).update_statuses(
+                {status: ids}
+            )
+            spent = asyncio.get_running_loop().time() - started_at
+        elapsed += spent
+        samples.extend([spent / len(ids)] * len(ids))
+    return summarize(samples, elapsed)
+
+
+async def run(options: Namespace) -> Dict[str, dict]:
+    """
+    Запуск всех микробенчмарков стадий
+    """
+    return {
+        "validation": bench_validation(options),
+        "page_response_model": bench_page_response_model(options),
+        "page_response_fast": bench_page_response_fast(options),
+        "insert": await bench_insert(options),
+        "insert_batch_per_row": await bench_insert_batch(options),
+        "dispatch": await bench_dispatch(options),
+        "dispatch_high_under_backlog": await bench_dispatch_priority(options),
+        "status_update_per_row": await bench_status_update(options),
+    }
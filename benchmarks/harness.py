@@ -0,0 +1,89 @@
+"""
+Общие функции бенчмарков: замер времени и сводная статистика
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """
+    Перцентиль с линейной интерполяцией
+
+    :param sorted_samples: отсортированные значения
+    :param fraction: доля от 0 до 1
+    """
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    weight = position - lower
+    return (
+        sorted_samples[lower] * (1 - weight)
+        + sorted_samples[upper] * weight
+    )
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    Сводка по замерам: пропускная способность и задержки в мс
+
+    :param samples: длительности операций в секундах
+    :param elapsed: общее время прогона в секундах
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        "count": count,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / count * 1000, 4) if count else 0.0,
+        "min_ms": round(ordered[0] * 1000, 4) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if count else 0.0,
+    }
+
+
+def measure(operation: Callable[[int], object], rounds: int):
+    """
+    Замер синхронной операции
+
+    :param operation: операция, получает номер раунда
+    :param rounds: число раундов
+    """
+    samples = []
+    started_at = time.perf_counter()
+    for index in range(rounds):
+        operation_started_at = time.perf_counter()
+        operation(index)
+        samples.append(time.perf_counter() - operation_started_at)
+    return summarize(samples, time.perf_counter() - started_at)
+
+
+async def measure_async(
+        operation: Callable[[int], Awaitable[object]],
+        rounds: int,
+        concurrency: int = 1,
+):
+    """
+    Замер асинхронной операции с заданной конкурентностью
+
+    :param operation: корутина, получает номер раунда
+    :param rounds: число раундов
+    :param concurrency: число одновременно выполняемых операций
+    """
+    samples = []
+    counter = iter(range(rounds))
+
+    async def runner():
+        for index in counter:
+            operation_started_at = time.perf_counter()
+            await operation(index)
+            samples.append(time.perf_counter() - operation_started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(runner() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started_at)
@@ -0,0 +1,170 @@
+"""
+Запуск бенчмарков на временной базе Postgres
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --baseline bench.json
+
+Для прогона на сервере из POSTGRES_* создается отдельная база,
+которая удаляется после завершения. Задержки имитации отправки
+и вероятность ошибки обнуляются, чтобы измерялся сам сервис.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_ENVIRONMENT = {
+    "TELEGRAM_SLEEP": "0",
+    "EMAIL_SLEEP": "0",
+    "ERROR_PROBABILITY": "0",
+    "NOTIFICATION_TRANSPORT": "simulated",
+    "TELEGRAM_RATE_LIMIT": "0",
+    "EMAIL_RATE_LIMIT": "0",
+    "USER_RATE_LIMIT": "0",
+    "DISPATCH_MODE": "inline",
+    "LOG_LEVEL": "WARNING",
+}
+
+SUITES = ("stages", "repository", "api")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", help="JSON прошлого прогона")
+    parser.add_argument("--suite", choices=SUITES, action="append")
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="ожидание статуса sent в секундах",
+    )
+    parser.add_argument(
+        "--database",
+        default=f"notification_bench_{os.getpid()}",
+        help="имя временной базы",
+    )
+    parser.add_argument(
+        "--keep-database",
+        action="store_true",
+        help="не удалять временную базу",
+    )
+    return parser.parse_args()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def admin_execute(statement: str):
+    """
+    Выполнение команды в служебной базе postgres
+    """
+    import asyncpg
+
+    from core.config import pg_config
+
+    connection = await asyncpg.connect(
+        host=pg_config.host,
+        port=pg_config.port,
+        user=pg_config.user,
+        password=pg_config.password.get_secret_value(),
+        database="postgres",
+    )
+    try:
+        await connection.execute(statement)
+    finally:
+        await connection.close()
+
+
+async def run_suites(options) -> dict:
+    from benchmarks import bench_api, bench_repository, bench_stages
+    from core.db import dispose_engines, init_db
+
+    await init_db()
+    results = {}
+    try:
+        for suite in options.suite or SUITES:
+            module = {
+                "stages": bench_stages,
+                "repository": bench_repository,
+                "api": bench_api,
+            }[suite]
+            for name, summary in (await module.run(options)).items():
+                results[f"{suite}.{name}"] = summary
+    finally:
+        await dispose_engines()
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    """
+    Печать изменения пропускной способности, p95 и процессорного
+    времени на строку относительно прошлого прогона
+    """
+    for name, summary in sorted(results.items()):
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in ("throughput_per_s", "p95_ms", "cpu_us_per_row"):
+            if previous.get(key) and key in summary:
+                delta = (summary[key] - previous[key]) / previous[key] * 100
+                changes.append(f"{key} {previous[key]} -> {summary[key]} "
+                               f"({delta:+.1f}%)")
+        sys.stdout.write(f"{name}: " + ", ".join(changes) + "\n")
+
+
+def main():
+    options = parse_args()
+    os.environ.update(BENCH_ENVIRONMENT)
+    os.environ["POSTGRES_DATABASE"] = options.database
+
+    asyncio.run(admin_execute(f'CREATE DATABASE "{options.database}"'))
+    try:
+        started_at = time.time()
+        results = asyncio.run(run_suites(options))
+    finally:
+        if not options.keep_database:
+            asyncio.run(
+                admin_execute(f'DROP DATABASE IF EXISTS "{options.database}"')
+            )
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started_at": started_at,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "rounds": options.rounds,
+            "concurrency": options.concurrency,
+            "batch_size": options.batch_size,
+        },
+        "results": results,
+    }
+    with open(options.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    sys.stdout.write(f"results written to {options.output}\n")
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@
 """
 import logging
 import sys
-from typing import Optional
+from typing import Literal, Optional
 from urllib.parse import quote_plus
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, SecretStr, field_validator
@@ -28,6 +28,14 @@ class PostgresConfig(BaseSettings):
     user: str = Field(..., min_length=1)
     password: SecretStr = Field(..., min_length=1)
     pg_schema: Optional[str] = Field(default="public")
+    pool_size: int = Field(default=10, ge=1)
+    max_overflow: int = Field(default=10, ge=0)
+    pool_timeout: float = Field(default=30.0, gt=0)
+    pool_recycle: int = Field(default=1800, ge=-1)
+    pool_pre_ping: bool = Field(default=False)
+    dispatch_pool_size: int = Field(default=5, ge=1)
+    dispatch_max_overflow: int = Field(default=5, ge=0)
+    statement_cache_size: int = Field(default=500, ge=0)
 
     @property
     def async_url(self) -> str:
@@ -36,6 +44,13 @@ class PostgresConfig(BaseSettings):
         """
         return self._build_url("postgresql+asyncpg://")
 
+    @property
+    def dsn(self) -> str:
+        """
+        DSN для прямого соединения asyncpg
+        """
+        return self._build_url("postgresql://")
+
     def _build_url(self, scheme: str) -> str:
         """
         Билдер URL для соединения с экранированием спец-символов
@@ -48,6 +63,51 @@ class PostgresConfig(BaseSettings):
         return f"{scheme}{credentials}@{loc}/{self.database}"
 
 
+class SmtpConfig(BaseSettings):
+    """
+    Конфигурация SMTP транспорта для email уведомлений
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="SMTP_",
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore"
+    )
+
+    host: str = Field(default="localhost", min_length=1)
+    port: int = Field(default=25, ge=1, le=65535)
+    username: Optional[str] = Field(default=None)
+    password: Optional[SecretStr] = Field(default=None)
+    use_tls: bool = Field(default=False)
+    timeout: float = Field(default=10.0, gt=0)
+    pool_size: int = Field(default=5, ge=1)
+    keepalive: float = Field(default=30.0, gt=0)
+    messages_per_connection: int = Field(default=50, ge=1)
+    sender: str = Field(default="notifications@localhost", min_length=1)
+    subject: str = Field(default="Уведомление")
+    recipient_template: str = Field(default="user{user_id}@localhost")
+
+
+class TelegramConfig(BaseSettings):
+    """
+    Конфигурация транспорта Telegram Bot API
+    """
+
+    model_config = SettingsConfigDict(
+        env_prefix="TELEGRAM_",
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore"
+    )
+
+    api_url: str = Field(default="https://api.telegram.org")
+    token: Optional[SecretStr] = Field(default=None)
+    timeout: float = Field(default=10.0, gt=0)
+    pool_size: int = Field(default=20, ge=1)
+    keepalive: float = Field(default=30.0, gt=0)
+
+
 class AppConfig(BaseSettings):
     """
     Конфигурация приложения
@@ -59,14 +119,69 @@ class AppConfig(BaseSettings):
         extra="ignore"
     )
 
-    telegram_sleep: float = Field(default=0.2, gt=0)
-    email_sleep: float = Field(default=1.0, gt=0)
+    notification_transport: Literal["simulated", "real"] = Field(
+        default="simulated"
+    )
+    telegram_sleep: float = Field(default=0.2, ge=0)
+    email_sleep: float = Field(default=1.0, ge=0)
     max_retries: int = Field(default=3, ge=1)
     retry_delay: float = Field(default=1.0, gt=0)
-    error_probability: float = Field(default=0.1, gt=0, lt=1)
+    retry_max_delay: float = Field(default=300.0, gt=0)
+    error_probability: float = Field(default=0.1, ge=0, lt=1)
     log_level: str = Field(default="INFO")
     app_host: str = Field(default="localhost")
     app_port: int = Field(default=8080, ge=1, le=65535)
+    page_default_limit: int = Field(default=50, ge=1)
+    page_max_limit: int = Field(default=500, ge=1)
+    history_cache_enabled: bool = Field(default=True)
+    history_cache_ttl: float = Field(default=5.0, gt=0)
+    history_cache_max_entries: int = Field(default=10000, ge=1)
+    history_cache_max_bytes: int = Field(default=64 * 1024 * 1024, ge=1)
+    idempotency_cache_ttl: float = Field(default=600.0, gt=0)
+    idempotency_cache_max_entries: int = Field(default=100000, ge=1)
+    export_chunk_size: int = Field(default=1000, ge=1)
+    batch_max_size: int = Field(default=10000, ge=1)
+    batch_chunk_size: int = Field(default=1000, ge=1, le=5000)
+    broadcast_max_recipients: int = Field(default=1000000, ge=1)
+    broadcast_chunk_size: int = Field(default=10000, ge=1)
+    dispatch_mode: Literal["inline", "worker"] = Field(default="inline")
+    dispatch_lease: float = Field(default=300.0, gt=0)
+    email_concurrency: int = Field(default=20, ge=1)
+    telegram_concurrency: int = Field(default=50, ge=1)
+    dispatcher_queue_size: int = Field(default=5000, ge=1)
+    high_priority_weight: int = Field(default=16, ge=1)
+    normal_priority_weight: int = Field(default=4, ge=1)
+    low_priority_weight: int = Field(default=1, ge=1)
+    email_batch_size: int = Field(default=20, ge=1)
+    telegram_batch_size: int = Field(default=1, ge=1)
+    email_coalesce_window: float = Field(default=0.0, ge=0)
+    telegram_coalesce_window: float = Field(default=0.0, ge=0)
+    coalesce_max_count: int = Field(default=10, ge=1)
+    email_rate_limit: float = Field(default=0.0, ge=0)
+    email_rate_burst: int = Field(default=10, ge=1)
+    telegram_rate_limit: float = Field(default=30.0, ge=0)
+    telegram_rate_burst: int = Field(default=30, ge=1)
+    user_rate_limit: float = Field(default=0.0, ge=0)
+    user_rate_burst: int = Field(default=1, ge=1)
+    circuit_failure_rate: float = Field(default=0.5, gt=0, le=1)
+    circuit_min_calls: int = Field(default=20, ge=1)
+    circuit_window: float = Field(default=30.0, gt=0)
+    circuit_open_timeout: float = Field(default=30.0, gt=0)
+    circuit_half_open_calls: int = Field(default=1, ge=1)
+    status_push_enabled: bool = Field(default=True)
+    status_push_queue_size: int = Field(default=100, ge=1)
+    status_push_reconnect_delay: float = Field(default=1.0, gt=0)
+    status_flush_size: int = Field(default=500, ge=1)
+    status_flush_interval: float = Field(default=0.5, gt=0)
+    worker_batch_size: int = Field(default=100, ge=1)
+    worker_poll_interval: float = Field(default=1.0, gt=0)
+    schedule_spread: float = Field(default=60.0, ge=0)
+    scheduler_horizon: float = Field(default=60.0, gt=0)
+    scheduler_max_entries: int = Field(default=100000, ge=1)
+    partition_premake_months: int = Field(default=3, ge=1)
+    partition_retention_months: int = Field(default=12, ge=0)
+    partition_archive_dir: Optional[str] = Field(default=None)
+    partition_maintenance_interval: float = Field(default=3600.0, gt=0)
 
     @classmethod
     @field_validator("log_level", mode="before")
@@ -90,6 +205,8 @@ def load_config():
     try:
         postgres_config = PostgresConfig()  # type: ignore
         application_config = AppConfig()  # type: ignore
+        smtp_transport_config = SmtpConfig()
+        telegram_transport_config = TelegramConfig()
 
         logging.basicConfig(
             level=application_config.log_level,
@@ -101,7 +218,13 @@ def load_config():
         root_logger.setLevel(application_config.log_level)
         root_logger.info("Configuration loaded successfully")
 
-        return postgres_config, application_config, root_logger
+        return (
+            postgres_config,
+            application_config,
+            smtp_transport_config,
+            telegram_transport_config,
+            root_logger,
+        )
 
     except ValueError as validation_error:
         logging.error(
@@ -120,4 +243,10 @@ def load_config():
 
 
 # глобальные объекты конфигурации
-pg_config, app_config, logger = load_config()
+(
+    pg_config,
+    app_config,
+    smtp_config,
+    telegram_config,
+    logger,
+) = load_config()
@@ -2,19 +2,85 @@
 Модуль для зависимостей подключения к БД
 """
 
-from typing import AsyncIterator
+import logging
+import time
+from typing import AsyncIterator, Dict
 
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     create_async_engine,
     async_sessionmaker,
     AsyncSession
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import pg_config, app_config
+from core.metrics import db_pool_checkout_duration, metrics_registry
+from models.notifications import BaseModel
+from schemas.monitoring import DbPoolStatsSchema
 
-engine = create_async_engine(
-    pg_config.async_url,
-    echo=bool(app_config.log_level == "DEBUG"),
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, измеряющий время ожидания соединения
+    """
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_duration.observe(
+                time.perf_counter() - started_at,
+                self.logging_name,
+            )
+
+
+def _create_engine(
+        name: str,
+        pool_size: int,
+        max_overflow: int,
+) -> AsyncEngine:
+    """
+    Движок БД с собственным пулом соединений
+
+    :param name: имя пула в логах и метриках
+    :param pool_size: число постоянных соединений
+    :param max_overflow: число дополнительных соединений при нагрузке
+    """
+    return create_async_engine(
+        pg_config.async_url,
+        echo=bool(app_config.log_level == "DEBUG"),
+        poolclass=TimedQueuePool,
+        pool_logging_name=name,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pg_config.pool_timeout,
+        pool_recycle=pg_config.pool_recycle,
+        pool_pre_ping=pg_config.pool_pre_ping,
+        connect_args={
+            "prepared_statement_cache_size": pg_config.statement_cache_size,
+        },
+    )
+
+
+# логгер пула наследует уровень корневого логгера приложения,
+# а не пакета sqlalchemy, поэтому его INFO-сообщения приглушаются
+logging.getLogger(
+    f"{TimedQueuePool.__module__}.{TimedQueuePool.__name__}"
+).setLevel(logging.WARNING)
+
+# пул запросов API и отдельный пул фоновой отправки (захват очереди,
+# запись статусов), чтобы нагрузка одного пути не забирала
+# соединения у другого
+engine = _create_engine(
+    "api",
+    pool_size=pg_config.pool_size,
+    max_overflow=pg_config.max_overflow,
+)
+dispatch_engine = _create_engine(
+    "dispatch",
+    pool_size=pg_config.dispatch_pool_size,
+    max_overflow=pg_config.dispatch_max_overflow,
 )
 
 async_session_factory = async_sessionmaker(
@@ -25,6 +91,14 @@ async_session_factory = async_sessionmaker(
     autoflush=False,
 )
 
+dispatch_session_factory = async_sessionmaker(
+    dispatch_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
 
 async def get_session() -> AsyncIterator[AsyncSession]:
     """
@@ -39,3 +113,48 @@ async def get_session() -> AsyncIterator[AsyncSession]:
             raise
         finally:
             await session.close()
+
+
+async def init_db():
+    """
+    Создание таблиц при старте API или обработчика очереди
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+
+
+async def dispose_engines():
+    """
+    Закрытие соединений всех пулов
+    """
+    await engine.dispose()
+    await dispatch_engine.dispose()
+
+
+def pool_stats() -> Dict[str, DbPoolStatsSchema]:
+    """
+    Использование пулов соединений
+    """
+    return {
+        current_engine.pool.logging_name: DbPoolStatsSchema(
+            size=current_engine.pool.size(),
+            max_overflow=max_overflow,
+            checked_out=current_engine.pool.checkedout(),
+            checked_in=current_engine.pool.checkedin(),
+            overflow=max(current_engine.pool.overflow(), 0),
+        )
+        for current_engine, max_overflow in (
+            (engine, pg_config.max_overflow),
+            (dispatch_engine, pg_config.dispatch_max_overflow),
+        )
+    }
+
+
+metrics_registry.gauge(
+    "db_pool_checked_out",
+    "Число выданных соединений пула БД",
+    lambda: {
+        (name,): stats.checked_out for name, stats in pool_stats().items()
+    },
+    labels=("pool",),
+)
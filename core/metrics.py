@@ -0,0 +1,50 @@
+"""
+Метрики сервиса в формате Prometheus
+"""
+
+from utils.metrics import MetricsRegistry
+
+metrics_registry = MetricsRegistry()
+
+http_request_duration = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP запроса",
+    labels=("method", "route", "status"),
+)
+notification_send_duration = metrics_registry.histogram(
+    "notification_send_duration_seconds",
+    "Время отправки пачки уведомлений обработчиком канала",
+    labels=("channel",),
+)
+notification_queue_wait = metrics_registry.histogram(
+    "notification_queue_wait_seconds",
+    "Время ожидания уведомления в очереди диспетчера "
+    "по каналу и приоритету",
+    labels=("channel", "priority"),
+)
+notification_schedule_lag = metrics_registry.histogram(
+    "notification_schedule_lag_seconds",
+    "Задержка передачи запланированного уведомления в отправку "
+    "относительно назначенного времени",
+)
+notifications_processed = metrics_registry.counter(
+    "notifications_processed_total",
+    "Результаты обработки уведомлений "
+    "(sent, retry, deferred, throttled, error)",
+    labels=("channel", "outcome"),
+)
+notification_retries = metrics_registry.counter(
+    "notification_retries_total",
+    "Запланированные повторы отправки (scheduled) "
+    "и исчерпавшие попытки уведомления (exhausted)",
+    labels=("result",),
+)
+db_pool_checkout_duration = metrics_registry.histogram(
+    "db_pool_checkout_seconds",
+    "Время ожидания соединения из пула БД",
+    labels=("pool",),
+    buckets=(
+        0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05,
+        0.1, 0.5, 1.0, 5.0, 30.0,
+    ),
+)
@@ -2,67 +2,232 @@
 Модуль для фоновых задач
 """
 
+import asyncio
 import logging
+import time
+from typing import List
 
-from core.db import async_session_factory
+from core.config import app_config
+from core.db import dispatch_session_factory
+from core.metrics import (
+    metrics_registry,
+    notification_send_duration,
+    notifications_processed,
+)
 from schemas.notifications import NotificationSchema
+from service.notifications.cache import notification_history_cache
+from service.notifications.coalescer import NotificationCoalescer
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import CircuitOpenError
 from service.notifications.notification_sender import (
     notification_handler_factory
 )
-from service.notifications.repository import NotificationRepository
+from service.notifications.rate_limiter import notification_rate_limiter
+from service.notifications.status_flusher import StatusFlusher
+from service.notifications.status_hub import notification_status_hub
 
 logger = logging.getLogger(__name__)
 
 
-async def send_notification_background(
-        notification_schema: NotificationSchema
+async def send_notifications_background(
+        notification_schemas: List[NotificationSchema]
 ):
-    """Фоновая задача отправки уведомления"""
+    """
+    Фоновая задача отправки пачки уведомлений одного типа.
+
+    Уведомления получателей, превысивших свой лимит, не ждут токен
+    в слоте диспетчера, а откладываются в БД до его появления.
+    Остальные перед отправкой ждут разрешения ограничителя скорости
+    канала. Пачка передается в send_batch обработчика, результат по
+    каждому уведомлению отдельно передается в status_flusher, поэтому
+    частичный отказ не влияет на остальные уведомления пачки.
+    Результат отправки сводки назначается всем вошедшим в нее
+    уведомлениям. Неудачные отправки не повторяются здесь, а
+    планируются на повтор через БД, поэтому слот диспетчера
+    освобождается сразу. Если цепь канала разомкнута, пачка
+    откладывается без попытки отправки. Сессия БД здесь не
+    открывается.
+    """
+    notification_type = notification_schemas[0].notification_type
+    notification_schemas = _defer_throttled(notification_schemas)
+    if not notification_schemas:
+        return
+    rows = [len(schema.notification_ids) for schema in notification_schemas]
     try:
         logger.debug(
-                    "Запущена фоновая задача отправки "
-                    "%s уведомления notification_id=%i",
-                    notification_schema.notification_type,
-                    notification_schema.id_notification,
-                )
-        handler = notification_handler_factory.get_handler(
-            notification_type=notification_schema.notification_type
+            "Запущена фоновая задача отправки %i %s уведомлений",
+            len(notification_schemas),
+            notification_type,
         )
-        success: bool = await handler.send(
-            notification_schema
+        handler = notification_handler_factory.get_handler(
+            notification_type=notification_type
         )
-        async with async_session_factory() as session:
-            repo = NotificationRepository(session)
-
-            notification = await repo.get(
-                id_notification=notification_schema.id_notification
+        await asyncio.gather(*(
+            notification_rate_limiter.acquire(
+                notification_type,
+                schema.user_id
             )
-
-            if notification is None:
-                logger.error(
-                    "Уведомление notification_id=%i не найдено в БД",
-                    notification_schema.id_notification
-                )
-                return
-
-            if success:
-                notification.status = "sent"
-                logger.info(
-                    "Уведомление notification_id=%i успешно отправлено",
-                    notification_schema.id_notification,
-                )
-            else:
-                notification.status = "failed"
-                logger.error(
-                    "Уведомление notification_id=%i не удалось отправить",
-                    notification_schema.id_notification,
-                )
-
-            session.add(notification)
-            await session.commit()
+            for schema in notification_schemas
+        ))
+        started_at = time.perf_counter()
+        results: List[bool] = await handler.send_batch(notification_schemas)
+        notification_send_duration.observe(
+            time.perf_counter() - started_at,
+            notification_type,
+        )
+    except CircuitOpenError as circuit_open:
+        logger.warning(
+            "%s, отправка %i уведомлений отложена (до пробной %.1fs)",
+            circuit_open,
+            len(notification_schemas),
+            circuit_open.retry_after,
+        )
+        for notification_schema in notification_schemas:
+            for id_notification in notification_schema.notification_ids:
+                status_flusher.add(id_notification, "deferred")
+        notifications_processed.inc(
+            notification_type,
+            "deferred",
+            amount=sum(rows),
+        )
+        return
     except Exception as unexpected_error:
         logger.error(
-            "непредвиденная ошибка при отправке уведомления id=%i: %s",
-            notification_schema.id_notification,
+            "непредвиденная ошибка при отправке уведомлений id=%s: %s",
+            [schema.id_notification for schema in notification_schemas],
             unexpected_error
         )
+        # повтор планируется так же, как для неудачной отправки,
+        # но строки учитываются только как error
+        for notification_schema in notification_schemas:
+            for id_notification in notification_schema.notification_ids:
+                status_flusher.add(id_notification, "retry")
+        notifications_processed.inc(
+            notification_type,
+            "error",
+            amount=sum(rows),
+        )
+        return
+
+    sent = sum(count for count, success in zip(rows, results) if success)
+    notifications_processed.inc(notification_type, "sent", amount=sent)
+    notifications_processed.inc(
+        notification_type,
+        "retry",
+        amount=sum(rows) - sent,
+    )
+    for notification_schema, success in zip(notification_schemas, results):
+        for id_notification in notification_schema.notification_ids:
+            status_flusher.add(id_notification, "sent" if success else "retry")
+        if success:
+            logger.info(
+                "Уведомление notification_id=%s успешно отправлено",
+                notification_schema.notification_ids,
+            )
+        else:
+            logger.warning(
+                "Уведомление notification_id=%s не удалось отправить, "
+                "отправка будет повторена",
+                notification_schema.notification_ids,
+            )
+
+
+def _defer_throttled(
+        notification_schemas: List[NotificationSchema]
+) -> List[NotificationSchema]:
+    """
+    Откладывает уведомления получателей, превысивших лимит
+
+    :param notification_schemas: схемы уведомлений одного типа
+    :return: уведомления, которые можно отправлять
+    """
+    allowed = []
+    for notification_schema in notification_schemas:
+        retry_after = notification_rate_limiter.try_acquire_user(
+            notification_schema.notification_type,
+            notification_schema.user_id,
+        )
+        if not retry_after:
+            allowed.append(notification_schema)
+            continue
+        for id_notification in notification_schema.notification_ids:
+            status_flusher.add(id_notification, "deferred", delay=retry_after)
+        notifications_processed.inc(
+            notification_schema.notification_type,
+            "throttled",
+            amount=len(notification_schema.notification_ids),
+        )
+    return allowed
+
+
+status_flusher = StatusFlusher(
+    session_factory=dispatch_session_factory,
+    max_batch=app_config.status_flush_size,
+    flush_interval=app_config.status_flush_interval,
+    cache=notification_history_cache,
+    status_hub=notification_status_hub,
+    max_attempts=app_config.max_retries,
+    retry_delay=app_config.retry_delay,
+    retry_max_delay=app_config.retry_max_delay,
+    defer_delay=app_config.circuit_open_timeout,
+)
+
+# сводка после окна ставится обратно в очередь диспетчера
+notification_coalescer = NotificationCoalescer(
+    process=send_notifications_background,
+    submit=lambda digest: notification_dispatcher.submit(digest),
+    windows={
+        "email": app_config.email_coalesce_window,
+        "telegram": app_config.telegram_coalesce_window,
+    },
+    max_count=app_config.coalesce_max_count,
+)
+
+notification_dispatcher = NotificationDispatcher(
+    process=notification_coalescer.process,
+    concurrency={
+        "email": app_config.email_concurrency,
+        "telegram": app_config.telegram_concurrency,
+    },
+    queue_size=app_config.dispatcher_queue_size,
+    batch_size={
+        "email": app_config.email_batch_size,
+        "telegram": app_config.telegram_batch_size,
+    },
+    weights={
+        "high": app_config.high_priority_weight,
+        "normal": app_config.normal_priority_weight,
+        "low": app_config.low_priority_weight,
+    },
+)
+
+
+metrics_registry.gauge(
+    "dispatcher_queue_depth",
+    "Число уведомлений в очереди диспетчера",
+    lambda: {
+        (notification_type,): stats.queue_depth
+        for notification_type, stats in notification_dispatcher.stats().items()
+    },
+    labels=("channel",),
+)
+metrics_registry.gauge(
+    "dispatcher_in_flight",
+    "Число отправляемых в данный момент уведомлений",
+    lambda: {
+        (notification_type,): stats.in_flight
+        for notification_type, stats in notification_dispatcher.stats().items()
+    },
+    labels=("channel",),
+)
+metrics_registry.gauge(
+    "coalescer_buffered",
+    "Число уведомлений, ожидающих объединения в сводку",
+    lambda: {(): notification_coalescer.buffered},
+)
+if notification_status_hub is not None:
+    metrics_registry.gauge(
+        "status_push_subscriptions",
+        "Число подписок на события статусов уведомлений",
+        lambda: {(): notification_status_hub.subscriptions},
+    )
@@ -0,0 +1,176 @@
+"""
+Модуль обработчика персистентной очереди отправки.
+
+Очередью служит сама таблица notifications: обработчик
+захватывает пачки строк со статусом "pending" через
+SELECT ... FOR UPDATE SKIP LOCKED и передает их диспетчеру.
+Несколько обработчиков (процессов или узлов) могут
+разбирать таблицу параллельно, не отправляя одно
+уведомление дважды.
+"""
+import asyncio
+import logging
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from schemas.notifications import NotificationSchema
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import DispatcherOverloadedError
+from service.notifications.repository import NotificationRepository
+
+logger = logging.getLogger(__name__)
+
+# доля срока аренды, через которую продлевается аренда уведомлений
+# в очереди диспетчера: запас на задержки опроса и записи в БД
+LEASE_RENEW_SHARE = 0.5
+
+
+class QueueWorker:
+    """
+    Обработчик очереди уведомлений в БД
+    """
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            dispatcher: NotificationDispatcher,
+            batch_size: int,
+            poll_interval: float,
+            lease: float,
+    ):
+        """
+        :param session_factory: фабрика сессий БД
+        :param dispatcher: диспетчер, выполняющий отправку
+        :param batch_size: максимум строк, захватываемых за раз
+        :param poll_interval: пауза между опросами пустой очереди
+        :param lease: срок аренды захваченных строк в секундах
+        """
+        self._session_factory = session_factory
+        self._dispatcher = dispatcher
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._lease = lease
+        self._stopping = asyncio.Event()
+        self._renew_at = 0.0
+
+    async def run(self):
+        """
+        Основной цикл: для каждого канала и приоритета захватывается
+        не больше строк, чем есть места в очереди диспетчера. Очереди
+        приоритетов заполняются независимо, поэтому массовая рассылка
+        в БД не мешает захвату срочных уведомлений
+        """
+        logger.info(
+            "обработчик очереди запущен: batch_size=%i",
+            self._batch_size,
+        )
+        self._renew_at = time.monotonic() + self._lease * LEASE_RENEW_SHARE
+        while not self._stopping.is_set():
+            if time.monotonic() >= self._renew_at:
+                await self._renew_leases()
+            saturated = False
+            for notification_type, stats in self._dispatcher.stats().items():
+                for priority, lane in stats.lanes.items():
+                    limit = min(
+                        self._batch_size,
+                        lane.queue_capacity - lane.queue_depth,
+                    )
+                    if limit <= 0:
+                        continue
+                    claimed = await self._claim(
+                        notification_type,
+                        priority,
+                        limit,
+                    )
+                    for notification_schema in claimed:
+                        self._submit(notification_schema)
+                    saturated = saturated or len(claimed) == limit
+
+            if not saturated:
+                await self._wait_stopping(self._poll_interval)
+            else:
+                await asyncio.sleep(0)
+
+        logger.info("обработчик очереди остановлен")
+
+    def stop(self):
+        """
+        Запрос остановки: новые строки не захватываются,
+        принятые уведомления дорабатывает диспетчер
+        """
+        self._stopping.set()
+
+    async def _renew_leases(self):
+        """
+        Продление аренды уведомлений, ожидающих в очереди диспетчера:
+        очередь низкого приоритета может разбираться дольше срока
+        аренды, и без продления строки захватывались бы повторно
+        """
+        self._renew_at = time.monotonic() + self._lease * LEASE_RENEW_SHARE
+        ids = self._dispatcher.held_ids
+        if not ids:
+            return
+        try:
+            async with self._session_factory() as session:
+                renewed = await NotificationRepository(session).extend_leases(
+                    ids,
+                    lease=self._lease,
+                )
+        except Exception as unexpected_error:
+            logger.error(
+                "ошибка продления аренды уведомлений: %s",
+                unexpected_error
+            )
+            return
+        logger.debug("продлена аренда %i уведомлений", renewed)
+
+    def _submit(self, notification_schema: NotificationSchema):
+        """
+        Постановка захваченного уведомления в очередь диспетчера.
+
+        Место в очереди проверяется до захвата, а пока строки
+        захватываются, очередь могут заполнить API, планировщик
+        или сводки. Тогда уведомление остается в БД и будет
+        отправлено после истечения аренды.
+        """
+        try:
+            self._dispatcher.submit(notification_schema)
+        except DispatcherOverloadedError as err:
+            logger.warning(
+                "уведомление id=%i отложено до истечения аренды: %s",
+                notification_schema.id_notification,
+                err
+            )
+
+    async def _claim(
+            self,
+            notification_type: str,
+            priority: str,
+            limit: int,
+    ):
+        """
+        Захват пачки уведомлений одного канала и приоритета
+        """
+        try:
+            async with self._session_factory() as session:
+                return await NotificationRepository(session).claim_pending(
+                    limit=limit,
+                    lease=self._lease,
+                    notification_type=notification_type,
+                    priority=priority,
+                )
+        except Exception as unexpected_error:
+            logger.error(
+                "ошибка захвата уведомлений из очереди: %s",
+                unexpected_error
+            )
+            return []
+
+    async def _wait_stopping(self, timeout: float):
+        """
+        Пауза, прерываемая запросом остановки
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
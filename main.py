@@ -1,6 +1,7 @@
 """
 Точка входа
 """
+import asyncio
 import logging
 import time
 from contextlib import asynccontextmanager
@@ -10,10 +11,23 @@ from fastapi import FastAPI
 from starlette.requests import Request
 from starlette.responses import Response
 
+from api.monitoring import metrics_router, monitoring_router
 from api.notifications import notifications_router
 from core.config import app_config
-from core.db import engine
-from models.notifications import BaseModel
+from core.db import dispatch_session_factory, dispose_engines, init_db
+from core.metrics import http_request_duration
+from core.tasks import (
+    notification_coalescer,
+    notification_dispatcher,
+    status_flusher,
+)
+from core.worker import QueueWorker
+from service.notifications.notification_sender import (
+    notification_handler_factory
+)
+from service.notifications.partitions import PartitionManager
+from service.notifications.scheduler import NotificationScheduler
+from service.notifications.status_hub import notification_status_hub
 
 logger = logging.getLogger(__name__)
 
@@ -27,21 +41,79 @@ async def lifespan(fastapi_app: FastAPI):
         app_config.app_port
     )
     logger.debug("config: %s", app_config)
-    async with engine.begin() as conn:
-        await conn.run_sync(BaseModel.metadata.create_all)
+    await init_db()
+    await notification_handler_factory.start()
+    status_flusher.start()
+    notification_coalescer.start()
+    notification_dispatcher.start()
+    # события статусов, записанных другими процессами, приходят
+    # через LISTEN и раздаются подписчикам этого экземпляра
+    if notification_status_hub is not None:
+        notification_status_hub.start()
+    # обслуживание партиций запускается во всех процессах,
+    # выполняет его тот, кто первым захватит advisory lock
+    partition_manager = PartitionManager(
+        session_factory=dispatch_session_factory,
+        premake_months=app_config.partition_premake_months,
+        retention_months=app_config.partition_retention_months,
+        archive_dir=app_config.partition_archive_dir,
+        interval=app_config.partition_maintenance_interval,
+    )
+    partition_manager_task = asyncio.create_task(partition_manager.run())
+
+    # в режиме inline API сам подбирает из очереди уведомления,
+    # оставшиеся в "pending" после рестарта,
+    # и передает в отправку запланированные уведомления
+    background = []
+    if app_config.dispatch_mode == "inline":
+        background = [
+            QueueWorker(
+                session_factory=dispatch_session_factory,
+                dispatcher=notification_dispatcher,
+                batch_size=app_config.worker_batch_size,
+                poll_interval=app_config.worker_poll_interval,
+                lease=app_config.dispatch_lease,
+            ),
+            NotificationScheduler(
+                session_factory=dispatch_session_factory,
+                dispatcher=notification_dispatcher,
+                horizon=app_config.scheduler_horizon,
+                max_entries=app_config.scheduler_max_entries,
+                batch_size=app_config.worker_batch_size,
+                poll_interval=app_config.worker_poll_interval,
+                lease=app_config.dispatch_lease,
+            ),
+        ]
+    background_tasks = [
+        asyncio.create_task(component.run()) for component in background
+    ]
     yield
     logger.info("graceful shutdown")
-    await engine.dispose()
+    partition_manager.stop()
+    await partition_manager_task
+    for component in background:
+        component.stop()
+    await asyncio.gather(*background_tasks)
+    notification_coalescer.stop()
+    await notification_dispatcher.stop()
+    await status_flusher.stop()
+    if notification_status_hub is not None:
+        await notification_status_hub.stop()
+    await notification_handler_factory.close()
+    await dispose_engines()
 
 
 app = FastAPI(title="Notification Service API", lifespan=lifespan)
 app.include_router(notifications_router)
+app.include_router(monitoring_router)
+app.include_router(metrics_router)
 
 
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next) -> Response:
     """
     Middleware для логирования входящих запросов
+    и учета их длительности в метриках
     """
     start_time = time.perf_counter()
 
@@ -50,6 +122,16 @@ async def logging_middleware(request: Request, call_next) -> Response:
     process_time = time.perf_counter() - start_time
     process_time_ms = process_time * 1000
 
+    # шаблон пути (/api/notifications/{user_id}) вместо самого пути,
+    # чтобы число рядов метрики не зависело от параметров
+    route = request.scope.get("route")
+    http_request_duration.observe(
+        process_time,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code),
+    )
+
     logger.info(
         "%s %s %s %.1fms",
         request.method,
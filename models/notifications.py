@@ -2,11 +2,64 @@
 Модель сущности уведомления
 notifications
 """
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, mapped_column, Mapped
-from sqlalchemy import CheckConstraint, Index, Integer, Text
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    CheckConstraint,
+    DateTime,
+    Index,
+    Integer,
+    SmallInteger,
+    Text,
+    event,
+    func,
+    text,
+)
 
 BaseModel = declarative_base()
 
+# партиции notifications: по месяцу created_at, имя notifications_pYYYY_MM
+PARTITION_PREFIX = "notifications_p"
+DEFAULT_PARTITION = "notifications_default"
+
+# число строк-шардов счетчика на пару (тип, статус): параллельные
+# транзакции обновляют разные строки и не ждут друг друга
+STATUS_COUNT_SHARDS = 16
+
+
+def partitions_ddl(months_ahead: int) -> DDL:
+    """
+    DDL создания месячных партиций notifications с текущего месяца
+    на months_ahead месяцев вперед (существующие пропускаются)
+
+    :param months_ahead: число создаваемых будущих партиций
+    :return: DDL блок
+    """
+    # в DDL символ % экранируется как %%
+    return DDL(f"""
+DO $$
+DECLARE
+    month_start timestamptz;
+BEGIN
+    FOR offset_months IN 0..{int(months_ahead)} LOOP
+        month_start := date_trunc('month', now())
+            + make_interval(months => offset_months);
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %%I PARTITION OF notifications '
+            'FOR VALUES FROM (%%L) TO (%%L)',
+            '{PARTITION_PREFIX}' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            month_start + interval '1 month'
+        );
+    END LOOP;
+END $$;
+""")
+
 
 class Notification(BaseModel):
     """
@@ -23,7 +76,26 @@ class Notification(BaseModel):
             "status IN ('pending', 'sent', 'failed')",
             name="notification_status_check",
         ),
-        Index("idx_status", "status"),
+        CheckConstraint(
+            "priority IN ('high', 'normal', 'low')",
+            name="notification_priority_check",
+        ),
+        CheckConstraint(
+            "message IS NOT NULL OR id_template IS NOT NULL",
+            name="notification_message_check",
+        ),
+        # рабочий набор очереди: индекс не содержит отправленных
+        # уведомлений, поэтому его размер пропорционален очереди,
+        # а не всей истории
+        Index(
+            "idx_working_set",
+            "status",
+            "notification_type",
+            "priority",
+            "id_notification",
+            postgresql_where=text("status IN ('pending', 'failed')"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     id_notification: Mapped[int] = mapped_column(
@@ -32,15 +104,33 @@ class Notification(BaseModel):
         autoincrement=True,
         comment="ID уведомления"
     )
+    # ключ партиционирования входит в первичный ключ,
+    # как того требует Postgres для партиционированных таблиц
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        server_default=func.now(),
+        comment="Время создания уведомления",
+    )
     user_id: Mapped[int] = mapped_column(
         Integer,
         nullable=False,
         comment="ID пользователя"
     )
-    message: Mapped[str] = mapped_column(
+    message: Mapped[Optional[str]] = mapped_column(
         Text,
-        nullable=False,
-        comment="Текст уведомления"
+        nullable=True,
+        comment="Текст уведомления, NULL если текст берется из шаблона"
+    )
+    id_template: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True,
+        comment="ID шаблона текста рассылки",
+    )
+    params: Mapped[Optional[dict]] = mapped_column(
+        JSONB,
+        nullable=True,
+        comment="Параметры подстановки в шаблон для получателя",
     )
     notification_type: Mapped[str] = mapped_column(
         Text,
@@ -52,3 +142,233 @@ class Notification(BaseModel):
         nullable=False,
         comment="Статус нотификации (pending, sent, failed)",
     )
+    priority: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+        default="normal",
+        server_default="normal",
+        comment="Приоритет отправки (high, normal, low)",
+    )
+    send_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Запрошенное время отправки запланированного уведомления",
+    )
+    locked_until: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Срок аренды уведомления обработчиком очереди",
+    )
+    attempts: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Число неудачных попыток отправки",
+    )
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Время, раньше которого повторная отправка не выполняется",
+    )
+
+
+class NotificationTemplate(BaseModel):
+    """
+    Шаблоны текста рассылок
+    notification_templates.
+
+    Текст рассылки хранится один раз, а строки notifications
+    ссылаются на него по id_template. Шаблон может содержать
+    подстановки $name, значения которых берутся из params строки.
+    """
+    __tablename__ = "notification_templates"
+
+    id_template: Mapped[int] = mapped_column(
+        Integer,
+        primary_key=True,
+        autoincrement=True,
+        comment="ID шаблона",
+    )
+    body: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+        comment="Текст шаблона",
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        comment="Время создания шаблона",
+    )
+
+
+class NotificationIdempotencyKey(BaseModel):
+    """
+    Ключи идемпотентности создания уведомлений
+    notification_idempotency_keys.
+
+    Хранятся отдельно от партиционированной notifications: уникальный
+    индекс партиционированной таблицы обязан включать created_at
+    и не гарантировал бы уникальность ключа между партициями.
+    """
+    __tablename__ = "notification_idempotency_keys"
+
+    idempotency_key: Mapped[str] = mapped_column(
+        Text,
+        primary_key=True,
+        comment="Ключ идемпотентности запроса на создание",
+    )
+    id_notification: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True,
+        comment="ID созданного уведомления",
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        comment="Время создания ключа",
+    )
+
+
+class NotificationStatusCount(BaseModel):
+    """
+    Счетчики уведомлений по типу и статусу
+    notification_status_counts.
+
+    Поддерживаются триггером на notifications: каждый INSERT, UPDATE
+    и DELETE добавляет к счетчикам разность по своим строкам. Число
+    по паре (тип, статус) - сумма count по всем шардам.
+    """
+    __tablename__ = "notification_status_counts"
+
+    notification_type: Mapped[str] = mapped_column(
+        Text,
+        primary_key=True,
+        comment="Тип нотификации (telegram, email)",
+    )
+    status: Mapped[str] = mapped_column(
+        Text,
+        primary_key=True,
+        comment="Статус нотификации (pending, sent, failed)",
+    )
+    shard: Mapped[int] = mapped_column(
+        SmallInteger,
+        primary_key=True,
+        comment="Шард счетчика",
+    )
+    count: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Слагаемое числа уведомлений",
+    )
+
+
+# триггер уровня выражения с таблицами переходов: один UPSERT
+# счетчиков на выражение, а не на строку. Строки, у которых статус
+# не изменился (захват очереди, перенос попытки), дают нулевую
+# разность и не пишутся. Шард выбирается по pid соединения
+STATUS_COUNTS_FUNCTION_DDL = f"""
+CREATE OR REPLACE FUNCTION count_notification_statuses()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO notification_status_counts AS c
+            (notification_type, status, shard, count)
+        SELECT notification_type, status,
+            pg_backend_pid() %% {STATUS_COUNT_SHARDS}, count(*)
+        FROM new_rows
+        GROUP BY notification_type, status
+        ON CONFLICT (notification_type, status, shard)
+        DO UPDATE SET count = c.count + EXCLUDED.count;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO notification_status_counts AS c
+            (notification_type, status, shard, count)
+        SELECT notification_type, status,
+            pg_backend_pid() %% {STATUS_COUNT_SHARDS}, sum(delta)
+        FROM (
+            SELECT notification_type, status, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT notification_type, status, -1 FROM old_rows
+        ) deltas
+        GROUP BY notification_type, status
+        HAVING sum(delta) <> 0
+        ON CONFLICT (notification_type, status, shard)
+        DO UPDATE SET count = c.count + EXCLUDED.count;
+    ELSE
+        INSERT INTO notification_status_counts AS c
+            (notification_type, status, shard, count)
+        SELECT notification_type, status,
+            pg_backend_pid() %% {STATUS_COUNT_SHARDS}, -count(*)
+        FROM old_rows
+        GROUP BY notification_type, status
+        ON CONFLICT (notification_type, status, shard)
+        DO UPDATE SET count = c.count + EXCLUDED.count;
+    END IF;
+    RETURN NULL;
+END $$;
+"""
+STATUS_COUNTS_TRIGGERS = {
+    "notifications_count_insert": ("INSERT", "NEW TABLE AS new_rows"),
+    "notifications_count_update": (
+        "UPDATE",
+        "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    ),
+    "notifications_count_delete": ("DELETE", "OLD TABLE AS old_rows"),
+}
+
+
+# партиция по умолчанию и ближайшие месячные партиции создаются
+# вместе с таблицей, дальше их поддерживает PartitionManager
+event.listen(
+    Notification.__table__,
+    "after_create",
+    DDL(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        "PARTITION OF notifications DEFAULT"
+    ),
+)
+event.listen(
+    Notification.__table__,
+    "after_create",
+    partitions_ddl(months_ahead=1),
+)
+event.listen(
+    Notification.__table__,
+    "after_create",
+    DDL(STATUS_COUNTS_FUNCTION_DDL),
+)
+for trigger_name, (operation, transition_tables) in (
+        STATUS_COUNTS_TRIGGERS.items()
+):
+    event.listen(
+        Notification.__table__,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER {trigger_name} AFTER {operation} "
+            f"ON notifications REFERENCING {transition_tables} "
+            "FOR EACH STATEMENT "
+            "EXECUTE FUNCTION count_notification_statuses()"
+        ),
+    )
+
+
+# индекс для истории пользователя: фильтр по user_id и статусу
+# с keyset-пагинацией по убыванию id превращается в range scan
+Index(
+    "idx_user_status_id",
+    Notification.user_id,
+    Notification.status,
+    Notification.id_notification.desc(),
+)
+
+# запланированные уведомления по времени отправки: планировщик
+# подгружает ближайший интервал, не читая остальные
+Index(
+    "idx_scheduled",
+    Notification.next_attempt_at,
+    postgresql_where=text("status = 'pending' AND send_at IS NOT NULL"),
+)
@@ -0,0 +1,78 @@
+"""
+Схемы для мониторинга
+"""
+from typing import Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class DispatcherLaneStatsSchema(BaseModel):
+    """
+    схема состояния очереди приоритета в канале диспетчера
+    """
+    queue_depth: int = Field(ge=0)
+    queue_capacity: int = Field(ge=1)
+    weight: int = Field(ge=1)
+
+
+class DispatcherChannelStatsSchema(BaseModel):
+    """
+    схема состояния канала диспетчера отправки
+    """
+    queue_depth: int = Field(ge=0)
+    queue_capacity: int = Field(ge=1)
+    in_flight: int = Field(ge=0)
+    concurrency: int = Field(ge=1)
+    lanes: Dict[str, DispatcherLaneStatsSchema] = Field(default_factory=dict)
+
+
+class CacheStatsSchema(BaseModel):
+    """
+    схема счетчиков кэша истории уведомлений
+    """
+    hits: int = Field(ge=0)
+    misses: int = Field(ge=0)
+    invalidations: int = Field(ge=0)
+    entries: Optional[int] = Field(default=None, ge=0)
+    size_bytes: Optional[int] = Field(default=None, ge=0)
+
+
+class RateLimiterStatsSchema(BaseModel):
+    """
+    схема счетчиков ограничителя скорости отправки по каналу
+    """
+    acquired: int = Field(ge=0)
+    throttled: int = Field(ge=0)
+    wait_seconds: float = Field(ge=0)
+    deferred: int = Field(default=0, ge=0)
+
+
+class CircuitBreakerStatsSchema(BaseModel):
+    """
+    схема состояния circuit breaker канала отправки
+    """
+    state: Literal["closed", "open", "half_open"]
+    window_calls: int = Field(ge=0)
+    window_failures: int = Field(ge=0)
+    open_count: int = Field(ge=0)
+    retry_after: float = Field(ge=0)
+
+
+class DbPoolStatsSchema(BaseModel):
+    """
+    схема использования пула соединений БД
+    """
+    size: int = Field(ge=0)
+    max_overflow: int = Field(ge=0)
+    checked_out: int = Field(ge=0)
+    checked_in: int = Field(ge=0)
+    overflow: int = Field(ge=0)
+
+
+class NotificationStatusCountsSchema(BaseModel):
+    """
+    схема числа уведомлений канала по статусам
+    """
+    pending: int = Field(default=0, ge=0)
+    sent: int = Field(default=0, ge=0)
+    failed: int = Field(default=0, ge=0)
@@ -1,9 +1,14 @@
 """
 Схемы для уведомлений
 """
-from typing import Literal
+from datetime import datetime
+from typing import Dict, Iterator, List, Literal, Optional, Sequence
 
-from pydantic import BaseModel, Field
+from pydantic import AwareDatetime, BaseModel, Field, model_validator
+
+# приоритеты отправки в порядке убывания
+Priority = Literal["high", "normal", "low"]
+PRIORITIES = ("high", "normal", "low")
 
 
 class BaseNotificationSchema(BaseModel):
@@ -22,6 +27,99 @@ class CreateNotificationSchema(BaseNotificationSchema):
         "email",
         "telegram",
     ] = Field(alias="type")
+    priority: Priority = Field(
+        default="normal",
+        description="Приоритет отправки: high для срочных уведомлений "
+                    "(коды подтверждения), low для массовых рассылок",
+    )
+    send_at: Optional[AwareDatetime] = Field(
+        default=None,
+        description="Время отправки с часовым поясом, "
+                    "по умолчанию - сразу",
+    )
+
+
+class UserIdRangeSchema(BaseModel):
+    """
+    схема диапазона id получателей [start, stop)
+    """
+    start: int = Field(ge=1)
+    stop: int = Field(ge=2, description="Граница диапазона, не включается")
+
+    @model_validator(mode="after")
+    def validate_bounds(self) -> "UserIdRangeSchema":
+        """Диапазон не должен быть пустым"""
+        if self.stop <= self.start:
+            raise ValueError("stop должен быть больше start")
+        return self
+
+
+class CreateBroadcastSchema(BaseNotificationSchema):
+    """
+    схема создания рассылки: один текст (шаблон с подстановками
+    $name) для списка или диапазона получателей
+    """
+    notification_type: Literal[
+        "email",
+        "telegram",
+    ] = Field(alias="type")
+    priority: Priority = Field(
+        default="low",
+        description="Приоритет отправки, для рассылок по умолчанию low",
+    )
+    send_at: Optional[AwareDatetime] = Field(
+        default=None,
+        description="Время отправки с часовым поясом, "
+                    "по умолчанию - сразу",
+    )
+    user_ids: Optional[List[int]] = Field(
+        default=None,
+        min_length=1,
+        description="id получателей",
+    )
+    user_id_range: Optional[UserIdRangeSchema] = Field(
+        default=None,
+        description="Диапазон id получателей",
+    )
+    params: Optional[Dict[int, Dict[str, str]]] = Field(
+        default=None,
+        description="Подстановки в шаблон по id получателя",
+    )
+
+    @model_validator(mode="after")
+    def validate_recipients(self) -> "CreateBroadcastSchema":
+        """Получатели задаются либо списком, либо диапазоном"""
+        if (self.user_ids is None) == (self.user_id_range is None):
+            raise ValueError("нужно указать либо user_ids, либо user_id_range")
+        if self.user_ids is not None and min(self.user_ids) < 1:
+            raise ValueError("user_ids должны быть не меньше 1")
+        return self
+
+    @property
+    def recipient_count(self) -> int:
+        """Число получателей"""
+        if self.user_id_range is not None:
+            return self.user_id_range.stop - self.user_id_range.start
+        return len(self.user_ids)
+
+    def recipient_chunks(self, chunk_size: int) -> Iterator[Sequence[int]]:
+        """
+        id получателей частями не больше chunk_size, диапазон
+        не разворачивается в список целиком
+        """
+        if self.user_id_range is not None:
+            for start in range(
+                    self.user_id_range.start,
+                    self.user_id_range.stop,
+                    chunk_size
+            ):
+                yield range(
+                    start,
+                    min(start + chunk_size, self.user_id_range.stop)
+                )
+        else:
+            for start in range(0, len(self.user_ids), chunk_size):
+                yield self.user_ids[start:start + chunk_size]
 
 
 class NotificationSchema(BaseNotificationSchema):
@@ -35,3 +133,60 @@ class NotificationSchema(BaseNotificationSchema):
         "telegram",
     ] = Field(serialization_alias="type")
     status: str
+    priority: Priority = Field(default="normal")
+    send_at: Optional[datetime] = Field(default=None)
+
+    @property
+    def notification_ids(self) -> List[int]:
+        """id строк notifications, которым назначается результат отправки"""
+        return [self.id_notification]
+
+
+class NotificationDigestSchema(NotificationSchema):
+    """
+    схема сводки: несколько уведомлений одного получателя
+    и канала, отправляемых одним сообщением
+    """
+    coalesced_ids: List[int] = Field(min_length=1)
+
+    @property
+    def notification_ids(self) -> List[int]:
+        """id всех уведомлений, вошедших в сводку"""
+        return self.coalesced_ids
+
+
+class NotificationStatusEventSchema(BaseModel):
+    """
+    схема события смены статуса уведомления
+    """
+    id_notification: int = Field(ge=1)
+    user_id: int = Field(ge=1)
+    status: str
+
+
+class NotificationPageSchema(BaseModel):
+    """
+    схема страницы истории уведомлений
+    """
+    items: List[NotificationSchema]
+    next_cursor: Optional[int] = Field(
+        default=None,
+        description="before_id для следующей страницы, "
+                    "null если страница последняя",
+    )
+
+
+class BroadcastCreatedSchema(BaseModel):
+    """
+    схема результата создания рассылки
+    """
+    id_template: int = Field(ge=1)
+    created: int = Field(ge=0)
+
+
+class BatchCreatedSchema(BaseModel):
+    """
+    схема результата пакетного создания уведомлений
+    """
+    created: int = Field(ge=0)
+    ids: List[int]
@@ -0,0 +1,289 @@
+"""
+Модуль кэша истории уведомлений пользователей
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from core.config import app_config
+from schemas.monitoring import CacheStatsSchema
+from schemas.notifications import NotificationPageSchema
+
+logger = logging.getLogger(__name__)
+
+# примерный размер служебных данных одного уведомления в странице, байт
+ITEM_OVERHEAD_BYTES = 200
+
+# сколько секунд помнить момент инвалидации пользователя
+INVALIDATION_MEMORY_SECONDS = 60.0
+
+
+class CacheBackend(ABC):
+    """
+    Абстрактное хранилище кэша.
+
+    Записи привязаны к пользователю, чтобы при изменении его
+    уведомлений можно было сбросить все его страницы разом.
+    Методы асинхронные, чтобы за интерфейсом можно было
+    держать общее для всех экземпляров хранилище (например Redis).
+    """
+    @abstractmethod
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Возвращает значение, если запись есть и не истекла
+
+        :param key: ключ записи
+        :return: значение или None
+        """
+
+    @abstractmethod
+    async def set(
+            self,
+            user_id: int,
+            key: Hashable,
+            value: Any,
+            size: int
+    ):
+        """
+        Сохраняет значение
+
+        :param user_id: пользователь, к которому относится запись
+        :param key: ключ записи
+        :param value: значение
+        :param size: оценка размера значения в байтах
+        """
+
+    @abstractmethod
+    async def invalidate_user(self, user_id: int):
+        """
+        Удаляет все записи пользователя
+
+        :param user_id: id пользователя
+        """
+
+
+class _Entry:
+    """
+    Запись in-memory кэша
+    """
+    __slots__ = ("user_id", "value", "size", "expires_at")
+
+    def __init__(self, user_id: int, value: Any, size: int, expires_at: float):
+        self.user_id = user_id
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """
+    Кэш в памяти процесса с вытеснением LRU,
+    временем жизни записей и ограничением по памяти
+    """
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        """
+        :param ttl: время жизни записи в секундах
+        :param max_entries: максимум записей
+        :param max_bytes: максимум суммарного размера записей
+        """
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._user_keys: Dict[int, Set[Hashable]] = {}
+        self._bytes = 0
+
+    @property
+    def size(self) -> int:
+        """
+        Число записей
+        """
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        """
+        Оценка занятой памяти в байтах
+        """
+        return self._bytes
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    async def set(
+            self,
+            user_id: int,
+            key: Hashable,
+            value: Any,
+            size: int
+    ):
+        self._remove(key)
+        if size > self._max_bytes:
+            return
+        self._entries[key] = _Entry(
+            user_id=user_id,
+            value=value,
+            size=size,
+            expires_at=time.monotonic() + self._ttl,
+        )
+        self._user_keys.setdefault(user_id, set()).add(key)
+        self._bytes += size
+        while (
+                len(self._entries) > self._max_entries
+                or self._bytes > self._max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate_user(self, user_id: int):
+        for key in self._user_keys.pop(user_id, ()):
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def _remove(self, key: Hashable):
+        """
+        Удаляет запись и ссылку на неё из индекса пользователя
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        user_keys = self._user_keys.get(entry.user_id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._user_keys[entry.user_id]
+
+
+class NotificationHistoryCache:
+    """
+    Кэш страниц истории уведомлений перед
+    NotificationRepository.get_by_user_id со счетчиками попаданий
+    """
+    def __init__(self, backend: CacheBackend):
+        """
+        :param backend: хранилище кэша
+        """
+        self._backend = backend
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        # момент последней инвалидации пользователя: страница,
+        # загрузка которой началась раньше, не кэшируется
+        self._invalidated_at: OrderedDict[int, float] = OrderedDict()
+        # поколение входит в ключ: сброс всего кэша только меняет
+        # поколение, а старые записи вытесняются по LRU и TTL
+        self._generation = 0
+        self._all_invalidated_at = 0.0
+
+    async def get_or_load(
+            self,
+            user_id: int,
+            notification_type: Optional[str],
+            status: Optional[str],
+            limit: int,
+            before_id: Optional[int],
+            loader: Callable[[], Awaitable[NotificationPageSchema]],
+    ) -> NotificationPageSchema:
+        """
+        Возвращает страницу из кэша или загружает её через loader
+
+        :param loader: корутина загрузки страницы из БД
+        :return: страница истории уведомлений
+        """
+        key = (
+            self._generation,
+            user_id,
+            notification_type,
+            status,
+            limit,
+            before_id,
+        )
+        page = await self._backend.get(key)
+        if page is not None:
+            self._hits += 1
+            return page
+
+        self._misses += 1
+        started_at = time.monotonic()
+        page = await loader()
+        invalidated_at = max(
+            self._invalidated_at.get(user_id, 0.0),
+            self._all_invalidated_at,
+        )
+        if invalidated_at < started_at:
+            await self._backend.set(user_id, key, page, _page_size(page))
+        return page
+
+    def invalidate_all(self):
+        """
+        Сбрасывает кэш всех пользователей за O(1), например после
+        рассылки, когда перебирать получателей слишком дорого
+        """
+        self._generation += 1
+        self._all_invalidated_at = time.monotonic()
+        self._invalidations += 1
+
+    async def invalidate_users(self, user_ids: Set[int]):
+        """
+        Сбрасывает кэш пользователей, чьи уведомления изменились
+
+        :param user_ids: id пользователей
+        """
+        now = time.monotonic()
+        for user_id in user_ids:
+            await self._backend.invalidate_user(user_id)
+            self._invalidated_at[user_id] = now
+            self._invalidated_at.move_to_end(user_id)
+            self._invalidations += 1
+        while self._invalidated_at:
+            user_id, invalidated_at = next(iter(self._invalidated_at.items()))
+            if now - invalidated_at < INVALIDATION_MEMORY_SECONDS:
+                break
+            del self._invalidated_at[user_id]
+
+    def stats(self) -> CacheStatsSchema:
+        """
+        Счетчики попаданий, промахов и инвалидаций
+        """
+        entries = None
+        size_bytes = None
+        if isinstance(self._backend, InMemoryCacheBackend):
+            entries = self._backend.size
+            size_bytes = self._backend.bytes
+        return CacheStatsSchema(
+            hits=self._hits,
+            misses=self._misses,
+            invalidations=self._invalidations,
+            entries=entries,
+            size_bytes=size_bytes,
+        )
+
+
+def _page_size(page: NotificationPageSchema) -> int:
+    """
+    Оценка размера страницы в памяти
+    """
+    return sum(
+        len(item.message) + ITEM_OVERHEAD_BYTES for item in page.items
+    ) + ITEM_OVERHEAD_BYTES
+
+
+notification_history_cache: Optional[NotificationHistoryCache] = None
+if app_config.history_cache_enabled:
+    notification_history_cache = NotificationHistoryCache(
+        InMemoryCacheBackend(
+            ttl=app_config.history_cache_ttl,
+            max_entries=app_config.history_cache_max_entries,
+            max_bytes=app_config.history_cache_max_bytes,
+        )
+    )
@@ -0,0 +1,180 @@
+"""
+Модуль объединения уведомлений в сводки.
+
+Если один источник отправляет получателю много уведомлений
+за несколько секунд, каждое из них становится отдельным вызовом
+провайдера. Объединитель стоит между диспетчером и отправкой:
+уведомления канала с включенным окном накапливаются по
+(user_id, тип) и через window секунд или при накоплении max_count
+уходят одной сводкой, а результат отправки сводки назначается
+каждой исходной строке.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from schemas.notifications import (
+    PRIORITIES,
+    NotificationDigestSchema,
+    NotificationSchema,
+)
+from service.notifications.exceptions import DispatcherOverloadedError
+
+logger = logging.getLogger(__name__)
+
+# разделитель текстов уведомлений в сводке
+DIGEST_SEPARATOR = "\n\n"
+
+# (id пользователя, тип уведомления)
+_Key = Tuple[int, str]
+
+
+class NotificationCoalescer:
+    """
+    Объединитель уведомлений одного получателя и канала.
+
+    Используется как process диспетчера. Сводка после окна не
+    отправляется сама, а снова ставится в очередь диспетчера,
+    поэтому ограничения конкурентности и приоритеты каналов
+    сохраняются. Срочные (high) уведомления и уже собранные сводки
+    передаются в отправку сразу.
+
+    Накопленные уведомления остаются захваченными арендой в БД:
+    если процесс упадет до отправки сводки, их подберет обработчик
+    очереди после истечения аренды, поэтому окно должно быть
+    намного меньше срока аренды.
+    """
+    def __init__(
+            self,
+            process: Callable[[List[NotificationSchema]], Awaitable[None]],
+            submit: Callable[[NotificationSchema], None],
+            windows: Dict[str, float],
+            max_count: int,
+    ):
+        """
+        :param process: корутина отправки пачки уведомлений одного типа
+        :param submit: постановка сводки в очередь диспетчера
+        :param windows: окно накопления в секундах для каждого типа
+         уведомления, 0 - не объединять
+        :param max_count: число уведомлений, при котором сводка
+         отправляется не дожидаясь окна
+        """
+        self._process = process
+        self._submit = submit
+        self._windows = windows
+        self._max_count = max_count
+        self._buffers: Dict[_Key, List[NotificationSchema]] = {}
+        self._timers: Dict[_Key, asyncio.TimerHandle] = {}
+        self._stopping = False
+
+    @property
+    def buffered(self) -> int:
+        """
+        Число накопленных уведомлений
+        """
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+    def start(self):
+        """
+        Включает накопление уведомлений
+        """
+        self._stopping = False
+
+    def stop(self):
+        """
+        Ставит все накопленные сводки в очередь диспетчера
+        и выключает накопление: диспетчер дожидается их отправки
+        при своей остановке
+        """
+        self._stopping = True
+        for key in list(self._buffers):
+            self._flush(key)
+
+    async def process(self, notifications: List[NotificationSchema]):
+        """
+        Обработка пачки от диспетчера: уведомления каналов
+        с окном накапливаются, остальные отправляются сразу
+
+        :param notifications: схемы уведомлений одного типа
+        """
+        passed = []
+        for notification in notifications:
+            if (
+                    self._stopping
+                    or isinstance(notification, NotificationDigestSchema)
+                    or notification.priority == "high"
+                    or not self._windows.get(notification.notification_type)
+            ):
+                passed.append(notification)
+            else:
+                self._add(notification)
+        if passed:
+            await self._process(passed)
+
+    def _add(self, notification: NotificationSchema):
+        """
+        Добавление уведомления в сводку получателя, первое
+        уведомление запускает отсчет окна
+        """
+        key = notification.user_id, notification.notification_type
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = []
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self._windows[notification.notification_type],
+                self._flush,
+                key,
+            )
+        buffer.append(notification)
+        if len(buffer) >= self._max_count:
+            self._flush(key)
+
+    def _flush(self, key: _Key):
+        """
+        Постановка сводки в очередь диспетчера. Если очередь
+        заполнена, уведомления остаются в БД и будут отправлены
+        обработчиком очереди после истечения аренды
+        """
+        self._timers.pop(key).cancel()
+        digest = _digest(self._buffers.pop(key))
+        try:
+            self._submit(digest)
+        except DispatcherOverloadedError as err:
+            logger.warning(
+                "сводка уведомлений id=%s отложена до истечения аренды: %s",
+                digest.coalesced_ids,
+                err
+            )
+            return
+        logger.debug(
+            "уведомления id=%s объединены в сводку",
+            digest.coalesced_ids,
+        )
+
+
+def _digest(
+        notifications: List[NotificationSchema]
+) -> NotificationDigestSchema:
+    """
+    Сводка из уведомлений одного получателя и канала: тексты
+    в порядке поступления, приоритет - наивысший из исходных
+    """
+    first = notifications[0]
+    return NotificationDigestSchema(
+        id_notification=first.id_notification,
+        user_id=first.user_id,
+        message=DIGEST_SEPARATOR.join(
+            notification.message for notification in notifications
+        ),
+        notification_type=first.notification_type,
+        status=first.status,
+        priority=min(
+            (notification.priority for notification in notifications),
+            key=PRIORITIES.index,
+        ),
+        coalesced_ids=[
+            id_notification
+            for notification in notifications
+            for id_notification in notification.notification_ids
+        ],
+    )
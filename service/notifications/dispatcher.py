@@ -0,0 +1,330 @@
+"""
+Модуль диспетчера отправки уведомлений
+с ограничением конкурентности по каналам
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from core.metrics import notification_queue_wait
+from schemas.monitoring import (
+    DispatcherChannelStatsSchema,
+    DispatcherLaneStatsSchema,
+)
+from schemas.notifications import (
+    PRIORITIES,
+    NotificationDigestSchema,
+    NotificationSchema,
+)
+from service.notifications.exceptions import DispatcherOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    """
+    Очередь одного приоритета в канале: уведомления
+    с моментом постановки в очередь
+    """
+    __slots__ = ("weight", "items", "current_weight")
+
+    def __init__(self, weight: int):
+        self.weight = weight
+        self.items: Deque[Tuple[float, NotificationSchema]] = deque()
+        self.current_weight = 0
+
+
+class _Channel:
+    """
+    Состояние канала отправки: очереди приоритетов
+    и фиксированный набор воркеров
+    """
+    def __init__(
+            self,
+            concurrency: int,
+            queue_size: int,
+            batch_size: int,
+            weights: Dict[str, int],
+    ):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.lanes = {
+            priority: _Lane(weight) for priority, weight in weights.items()
+        }
+        self.size = 0
+        self.unfinished = 0
+        self.not_empty = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.workers: List[asyncio.Task] = []
+        self.in_flight = 0
+
+    def put(self, notification: NotificationSchema, lane: _Lane):
+        lane.items.append((time.monotonic(), notification))
+        self.size += 1
+        self.unfinished += 1
+        self.idle.clear()
+        self.not_empty.set()
+
+    def take(self) -> Tuple[str, float, NotificationSchema]:
+        """
+        Следующее уведомление по smooth weighted round-robin среди
+        непустых очередей: из каждых W выборов (W - сумма их весов)
+        очередь с весом w получает w, выборы чередуются равномерно,
+        поэтому низкий приоритет не голодает
+        """
+        selected_priority, selected, total = None, None, 0
+        for priority, lane in self.lanes.items():
+            if not lane.items:
+                continue
+            lane.current_weight += lane.weight
+            total += lane.weight
+            if (
+                    selected is None
+                    or lane.current_weight > selected.current_weight
+            ):
+                selected_priority, selected = priority, lane
+        selected.current_weight -= total
+        self.size -= 1
+        enqueued_at, notification = selected.items.popleft()
+        return selected_priority, enqueued_at, notification
+
+    def done(self, count: int):
+        self.unfinished -= count
+        if not self.unfinished:
+            self.idle.set()
+
+
+class NotificationDispatcher:
+    """
+    Диспетчер отправки уведомлений.
+
+    Для каждого канала (типа уведомления) держит ограниченные очереди
+    приоритетов и фиксированное число воркеров, поэтому число
+    одновременно отправляемых пачек не превышает concurrency канала,
+    а при заполнении очереди приоритета новые уведомления этого
+    приоритета отклоняются (backpressure).
+
+    Воркер собирает пачку до batch_size уже ожидающих уведомлений,
+    выбирая очередь для каждого по весам приоритетов (weighted fair
+    scheduling): срочные уведомления не ждут, пока разойдется
+    массовая рассылка, а рассылка продолжает идти в доле своего веса.
+
+    Диспетчер помнит id принятых и еще не обработанных уведомлений:
+    повторно захваченное уведомление, которое уже ждет в очереди,
+    не ставится второй раз, а обработчик очереди продлевает аренду
+    этих строк (held_ids), пока они ждут отправки.
+    """
+    def __init__(
+            self,
+            process: Callable[[List[NotificationSchema]], Awaitable[None]],
+            concurrency: Dict[str, int],
+            queue_size: int,
+            batch_size: Optional[Dict[str, int]] = None,
+            weights: Optional[Dict[str, int]] = None,
+    ):
+        """
+        :param process: корутина обработки пачки уведомлений одного типа
+        :param concurrency: число воркеров для каждого типа уведомления
+        :param queue_size: емкость очереди каждого приоритета в канале
+        :param batch_size: максимальный размер пачки для каждого типа
+         уведомления (по умолчанию 1)
+        :param weights: веса приоритетов, по умолчанию равные
+        """
+        self._process = process
+        self._concurrency = concurrency
+        self._queue_size = queue_size
+        self._batch_size = batch_size or {}
+        self._weights = weights or dict.fromkeys(PRIORITIES, 1)
+        self._channels: Dict[str, _Channel] = {}
+        # id принятых уведомлений: сводка ставится, пока исходные
+        # уведомления еще обрабатываются, поэтому id считаются
+        self._held: Counter = Counter()
+
+    @property
+    def held_ids(self) -> List[int]:
+        """
+        id уведомлений в очередях и в процессе отправки
+        """
+        return list(self._held)
+
+    @property
+    def priorities(self) -> Tuple[str, ...]:
+        """
+        Приоритеты, для которых есть очереди
+        """
+        return tuple(self._weights)
+
+    def start(self):
+        """
+        Создает очереди и запускает воркеры каналов
+        в текущем event loop
+        """
+        self._channels = {
+            notification_type: _Channel(
+                concurrency=concurrency,
+                queue_size=self._queue_size,
+                batch_size=self._batch_size.get(notification_type, 1),
+                weights=self._weights,
+            )
+            for notification_type, concurrency in self._concurrency.items()
+        }
+        for notification_type, channel in self._channels.items():
+            channel.workers = [
+                asyncio.create_task(self._worker(notification_type, channel))
+                for _ in range(channel.concurrency)
+            ]
+        logger.info(
+            "диспетчер отправки запущен: %s, веса приоритетов %s",
+            self._concurrency,
+            self._weights,
+        )
+
+    async def stop(self):
+        """
+        Дожидается отправки всех принятых уведомлений
+        и останавливает воркеры
+        """
+        channels = list(self._channels.values())
+        for channel in channels:
+            await channel.idle.wait()
+        self._channels = {}
+        for channel in channels:
+            for worker in channel.workers:
+                worker.cancel()
+            await asyncio.gather(*channel.workers, return_exceptions=True)
+        logger.info("диспетчер отправки остановлен")
+
+    def free_slots(
+            self,
+            notification_type: str,
+            priority: str = "normal",
+    ) -> int:
+        """
+        Свободное место в очереди приоритета канала
+
+        :param notification_type: тип уведомления
+        :param priority: приоритет уведомления
+        :return: число уведомлений, которое можно принять
+        """
+        channel = self._get_channel(notification_type)
+        return channel.queue_size - len(
+            self._get_lane(channel, priority).items
+        )
+
+    def submit(self, notification: NotificationSchema):
+        """
+        Ставит уведомление в очередь его приоритета без ожидания.
+        Уведомление, которое уже принято и еще не обработано,
+        пропускается; сводки собираются из уже принятых уведомлений
+        и не проверяются
+
+        :param notification: схема уведомления
+        :raises DispatcherOverloadedError: очередь приоритета заполнена
+        """
+        channel = self._get_channel(notification.notification_type)
+        lane = self._get_lane(channel, notification.priority)
+        ids = notification.notification_ids
+        if (
+                not isinstance(notification, NotificationDigestSchema)
+                and notification.id_notification in self._held
+        ):
+            logger.debug("уведомления id=%s уже в очереди диспетчера", ids)
+            return
+        if len(lane.items) >= channel.queue_size:
+            raise DispatcherOverloadedError(
+                f"Очередь канала {notification.notification_type} "
+                f"с приоритетом {notification.priority} заполнена"
+            )
+        self._held.update(ids)
+        channel.put(notification, lane)
+
+    def stats(self) -> Dict[str, DispatcherChannelStatsSchema]:
+        """
+        Глубина очередей и число отправок в процессе по каналам
+        """
+        return {
+            notification_type: DispatcherChannelStatsSchema(
+                queue_depth=channel.size,
+                queue_capacity=channel.queue_size * len(channel.lanes),
+                in_flight=channel.in_flight,
+                concurrency=channel.concurrency,
+                lanes={
+                    priority: DispatcherLaneStatsSchema(
+                        queue_depth=len(lane.items),
+                        queue_capacity=channel.queue_size,
+                        weight=lane.weight,
+                    )
+                    for priority, lane in channel.lanes.items()
+                },
+            )
+            for notification_type, channel in self._channels.items()
+        }
+
+    def _get_channel(self, notification_type: str) -> _Channel:
+        """
+        Возвращает канал для указанного типа уведомления
+        """
+        channel = self._channels.get(notification_type)
+        if channel is None:
+            raise ValueError(
+                f"Канал для типа {notification_type} не запущен"
+            )
+        return channel
+
+    @staticmethod
+    def _get_lane(channel: _Channel, priority: str) -> _Lane:
+        """
+        Возвращает очередь указанного приоритета в канале
+        """
+        lane = channel.lanes.get(priority)
+        if lane is None:
+            raise ValueError(f"Очередь для приоритета {priority} не задана")
+        return lane
+
+    def _release(self, ids: List[int]):
+        """
+        Уведомления обработаны и могут быть приняты снова
+        """
+        for id_notification in ids:
+            self._held[id_notification] -= 1
+            if self._held[id_notification] <= 0:
+                del self._held[id_notification]
+
+    async def _worker(self, notification_type: str, channel: _Channel):
+        """
+        Воркер канала: собирает пачку из уже ожидающих
+        уведомлений по весам приоритетов и отправляет её целиком
+        """
+        while True:
+            while not channel.size:
+                channel.not_empty.clear()
+                await channel.not_empty.wait()
+            batch = []
+            now = time.monotonic()
+            while channel.size and len(batch) < channel.batch_size:
+                priority, enqueued_at, notification = channel.take()
+                notification_queue_wait.observe(
+                    now - enqueued_at,
+                    notification_type,
+                    priority,
+                )
+                batch.append(notification)
+            channel.in_flight += len(batch)
+            try:
+                await self._process(batch)
+            except Exception as unexpected_error:
+                logger.error(
+                    "непредвиденная ошибка диспетчера "
+                    "для уведомлений id=%s: %s",
+                    [notification.id_notification for notification in batch],
+                    unexpected_error
+                )
+            finally:
+                channel.in_flight -= len(batch)
+                for notification in batch:
+                    self._release(notification.notification_ids)
+                channel.done(len(batch))
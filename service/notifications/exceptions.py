@@ -7,3 +7,23 @@ class SendError(Exception):
     """
     Исключение при ошибке отправки во внешний сервис
     """
+
+
+class DispatcherOverloadedError(Exception):
+    """
+    Исключение при переполнении очереди диспетчера отправки
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    Исключение при разомкнутом circuit breaker канала:
+    отправка не выполнялась и должна быть отложена
+    """
+    def __init__(self, message: str, retry_after: float):
+        """
+        :param message: описание ошибки
+        :param retry_after: время до пробной отправки в секундах
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
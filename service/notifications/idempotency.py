@@ -0,0 +1,69 @@
+"""
+Модуль кэша ключей идемпотентности создания уведомлений
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from core.config import app_config
+from schemas.notifications import NotificationSchema
+
+
+class IdempotencyCache:
+    """
+    Короткоживущий кэш ключ идемпотентности -> созданное уведомление.
+
+    Повтор запроса с тем же ключом получает исходное уведомление без
+    обращения к БД. Источником истины остается уникальный индекс по
+    idempotency_key: кэш локален для процесса и забывает ключи через
+    ttl секунд или при вытеснении LRU.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        :param ttl: время жизни записи в секундах
+        :param max_entries: максимальное число записей
+        """
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[
+            str,
+            Tuple[float, NotificationSchema]
+        ] = OrderedDict()
+
+    def get(self, idempotency_key: str) -> Optional[NotificationSchema]:
+        """
+        Уведомление, созданное с этим ключом, если ключ еще помнится
+
+        :param idempotency_key: ключ идемпотентности
+        :return: уведомление или None
+        """
+        entry = self._entries.get(idempotency_key)
+        if entry is None:
+            return None
+        expires_at, notification = entry
+        if expires_at < time.monotonic():
+            del self._entries[idempotency_key]
+            return None
+        self._entries.move_to_end(idempotency_key)
+        return notification
+
+    def set(self, idempotency_key: str, notification: NotificationSchema):
+        """
+        Запоминает уведомление, созданное с этим ключом
+
+        :param idempotency_key: ключ идемпотентности
+        :param notification: созданное уведомление
+        """
+        self._entries[idempotency_key] = (
+            time.monotonic() + self._ttl,
+            notification,
+        )
+        self._entries.move_to_end(idempotency_key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+idempotency_cache = IdempotencyCache(
+    ttl=app_config.idempotency_cache_ttl,
+    max_entries=app_config.idempotency_cache_max_entries,
+)
@@ -6,12 +6,20 @@ import asyncio
 import logging
 import random
 from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from email.policy import SMTP
+from typing import Dict, List, Optional
 
-
-from core.config import app_config
+from core.config import app_config, smtp_config, telegram_config
+from schemas.monitoring import CircuitBreakerStatsSchema
 from schemas.notifications import NotificationSchema
-from service.notifications.exceptions import SendError
-from utils.retry import retry
+from service.notifications.exceptions import CircuitOpenError, SendError
+from service.notifications.transports import (
+    SmtpMessage,
+    SmtpTransport,
+    TelegramTransport,
+)
+from utils.circuit_breaker import CircuitBreaker
 
 logger = logging.getLogger(__name__)
 
@@ -30,16 +38,42 @@ class NotificationHandler(ABC):
         :return: результат отправки (True/False)
         """
 
+    async def send_batch(
+            self,
+            notifications: List[NotificationSchema]
+    ) -> List[bool]:
+        """
+        Отправка пачки уведомлений одного типа.
+
+        По умолчанию уведомления отправляются параллельно через send.
+        Обработчики, у которых провайдер умеет принимать пачки
+        или переиспользовать соединение, переопределяют метод.
+
+        :param notifications: схемы уведомлений
+        :return: результат отправки каждого уведомления
+        """
+        results = await asyncio.gather(
+            *(self.send(notification) for notification in notifications),
+            return_exceptions=True,
+        )
+        return [result is True for result in results]
+
+    async def start(self):
+        """
+        Открытие ресурсов обработчика (пулов соединений)
+        при старте приложения
+        """
+
+    async def close(self):
+        """
+        Освобождение ресурсов обработчика при остановке приложения
+        """
+
 
 class EmailHandler(NotificationHandler):
     """
     Обработчик для отправки уведомления по Email
     """
-    @retry(
-        app_config.max_retries,
-        app_config.retry_delay,
-        return_value_on_fail=False
-    )
     async def send(self, notification: NotificationSchema) -> bool:
         """
         Метод отправки уведомления по Email
@@ -58,11 +92,6 @@ class TelegramHandler(NotificationHandler):
     """
     Обработчик для отправки уведомления в Телеграм
     """
-    @retry(
-        app_config.max_retries,
-        app_config.retry_delay,
-        return_value_on_fail=False
-    )
     async def send(self, notification: NotificationSchema) -> bool:
         """
        Метод отправки уведомления в Телеграм
@@ -75,6 +104,182 @@ class TelegramHandler(NotificationHandler):
             raise SendError("Имитация ошибки отправки по телеграм")
         return True
 
+
+class SmtpEmailHandler(NotificationHandler):
+    """
+    Обработчик для отправки уведомления по Email через SMTP
+    """
+    def __init__(self, transport: SmtpTransport):
+        """
+        :param transport: SMTP транспорт с пулом соединений
+        """
+        self._transport = transport
+
+    async def start(self):
+        await self._transport.start()
+
+    async def close(self):
+        await self._transport.close()
+
+    def build_message(self, notification: NotificationSchema) -> SmtpMessage:
+        """
+        Формирует письмо для уведомления
+
+        :param notification: схема уведомления
+        :return: письмо с конвертом
+        """
+        recipient = smtp_config.recipient_template.format(
+            user_id=notification.user_id
+        )
+        email = EmailMessage(policy=SMTP)
+        email["From"] = smtp_config.sender
+        email["To"] = recipient
+        email["Subject"] = smtp_config.subject
+        email.set_content(notification.message)
+        return SmtpMessage(
+            sender=smtp_config.sender,
+            recipient=recipient,
+            content=email.as_bytes(),
+        )
+
+    async def send(self, notification: NotificationSchema) -> bool:
+        """
+        Метод отправки уведомления по Email
+
+        :param notification: схема уведомления
+        :return: результат отправки (True/False)
+        """
+        [success] = await self._transport.send(
+            [self.build_message(notification)]
+        )
+        if not success:
+            raise SendError("SMTP сервер отклонил письмо")
+        return True
+
+    async def send_batch(
+            self,
+            notifications: List[NotificationSchema]
+    ) -> List[bool]:
+        """
+        Отправка пачки писем: письма группируются по SMTP сессиям
+
+        :param notifications: схемы уведомлений
+        :return: результат отправки каждого уведомления
+        """
+        return await self._transport.send([
+            self.build_message(notification)
+            for notification in notifications
+        ])
+
+
+class TelegramBotHandler(NotificationHandler):
+    """
+    Обработчик для отправки уведомления через Telegram Bot API
+    """
+    def __init__(self, transport: TelegramTransport):
+        """
+        :param transport: транспорт Bot API с пулом соединений
+        """
+        self._transport = transport
+
+    async def start(self):
+        await self._transport.start()
+
+    async def close(self):
+        await self._transport.close()
+
+    async def send(self, notification: NotificationSchema) -> bool:
+        """
+        Метод отправки уведомления в Телеграм,
+        id пользователя используется как chat_id
+
+        :param notification: схема уведомления
+        :return: результат отправки (True/False)
+        """
+        await self._transport.send_message(
+            chat_id=notification.user_id,
+            text=notification.message,
+        )
+        return True
+
+
+class CircuitBreakerHandler(NotificationHandler):
+    """
+    Обработчик-обертка с circuit breaker канала.
+
+    Пока цепь разомкнута, отправка не выполняется и сразу
+    завершается CircuitOpenError, чтобы не нагружать недоступного
+    провайдера и не занимать слоты диспетчера.
+    """
+    def __init__(
+            self,
+            notification_type: str,
+            handler: NotificationHandler,
+            breaker: CircuitBreaker,
+    ):
+        """
+        :param notification_type: тип уведомления (канал)
+        :param handler: обработчик канала
+        :param breaker: circuit breaker канала
+        """
+        self._notification_type = notification_type
+        self._handler = handler
+        self.breaker = breaker
+
+    async def start(self):
+        await self._handler.start()
+
+    async def close(self):
+        await self._handler.close()
+
+    async def send(self, notification: NotificationSchema) -> bool:
+        """
+        Отправка одного уведомления через send_batch
+
+        :param notification: схема уведомления
+        :return: результат отправки (True/False)
+        """
+        [success] = await self.send_batch([notification])
+        return success
+
+    async def send_batch(
+            self,
+            notifications: List[NotificationSchema]
+    ) -> List[bool]:
+        """
+        Отправка пачки, если цепь канала замкнута
+        или пачка пропущена как пробная
+
+        :param notifications: схемы уведомлений
+        :return: результат отправки каждого уведомления
+        :raises CircuitOpenError: цепь разомкнута, отправка не выполнялась
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"Канал {self._notification_type} недоступен",
+                retry_after=self.breaker.retry_after(),
+            )
+        state = self.breaker.state
+        try:
+            results = await self._handler.send_batch(notifications)
+        except Exception:
+            self.breaker.record(successes=0, failures=len(notifications))
+            raise
+        failures = results.count(False)
+        self.breaker.record(
+            successes=len(results) - failures,
+            failures=failures,
+        )
+        if self.breaker.state != state:
+            logger.warning(
+                "circuit breaker канала %s: %s -> %s",
+                self._notification_type,
+                state,
+                self.breaker.state,
+            )
+        return results
+
+
 class NotificationHandlerFactory:
     """
     Фабрика создания обработчиков уведомлений
@@ -85,15 +290,23 @@ class NotificationHandlerFactory:
     def register_handler(
             self,
             notification_type: str,
-            handler: NotificationHandler
+            handler: NotificationHandler,
+            breaker: Optional[CircuitBreaker] = None,
     ):
         """
         Регистрирует обработчик для указанного типа уведомлений
 
         :param notification_type: тип уведомления
         :param handler: обработчик
+        :param breaker: circuit breaker, которым оборачивается обработчик
         :return: None
         """
+        if breaker is not None:
+            handler = CircuitBreakerHandler(
+                notification_type,
+                handler,
+                breaker,
+            )
         self._handlers[notification_type] = handler
 
     def get_handler(self, notification_type: str) -> NotificationHandler:
@@ -110,7 +323,72 @@ class NotificationHandlerFactory:
             )
         return handler
 
+    async def start(self):
+        """
+        Открывает ресурсы всех обработчиков
+        """
+        for handler in self._handlers.values():
+            await handler.start()
+
+    async def close(self):
+        """
+        Освобождает ресурсы всех обработчиков
+        """
+        for handler in self._handlers.values():
+            await handler.close()
+
+    def circuit_stats(self) -> Dict[str, CircuitBreakerStatsSchema]:
+        """
+        Состояние circuit breaker по каналам
+        """
+        stats = {}
+        for notification_type, handler in self._handlers.items():
+            if not isinstance(handler, CircuitBreakerHandler):
+                continue
+            calls, failures = handler.breaker.window_calls()
+            stats[notification_type] = CircuitBreakerStatsSchema(
+                state=handler.breaker.state,
+                window_calls=calls,
+                window_failures=failures,
+                open_count=handler.breaker.open_count,
+                retry_after=handler.breaker.retry_after(),
+            )
+        return stats
+
+
+def _circuit_breaker() -> CircuitBreaker:
+    """
+    Circuit breaker канала с настройками из конфигурации
+    """
+    return CircuitBreaker(
+        failure_rate=app_config.circuit_failure_rate,
+        min_calls=app_config.circuit_min_calls,
+        window=app_config.circuit_window,
+        open_timeout=app_config.circuit_open_timeout,
+        half_open_calls=app_config.circuit_half_open_calls,
+    )
+
 
 notification_handler_factory = NotificationHandlerFactory()
-notification_handler_factory.register_handler("email", EmailHandler())
-notification_handler_factory.register_handler("telegram", TelegramHandler())
+if app_config.notification_transport == "real":
+    notification_handler_factory.register_handler(
+        "email",
+        SmtpEmailHandler(SmtpTransport(smtp_config)),
+        breaker=_circuit_breaker(),
+    )
+    notification_handler_factory.register_handler(
+        "telegram",
+        TelegramBotHandler(TelegramTransport(telegram_config)),
+        breaker=_circuit_breaker(),
+    )
+else:
+    notification_handler_factory.register_handler(
+        "email",
+        EmailHandler(),
+        breaker=_circuit_breaker(),
+    )
+    notification_handler_factory.register_handler(
+        "telegram",
+        TelegramHandler(),
+        breaker=_circuit_breaker(),
+    )
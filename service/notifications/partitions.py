@@ -0,0 +1,286 @@
+"""
+Модуль обслуживания партиций таблицы notifications.
+
+Таблица партиционирована по месяцу created_at. Менеджер заранее
+создает партиции на ближайшие месяцы, а партиции старше окна
+хранения отсоединяет от таблицы, при необходимости выгружает
+в сжатый NDJSON и удаляет, поэтому запросы к истории затрагивают
+только актуальные партиции.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from typing import IO, Dict, List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.config import app_config
+from models.notifications import (
+    PARTITION_PREFIX,
+    NotificationIdempotencyKey,
+    NotificationTemplate,
+    partitions_ddl,
+)
+
+logger = logging.getLogger(__name__)
+
+# ключ advisory lock: обслуживание выполняет один процесс из всех
+# запущенных API и обработчиков очереди
+MAINTENANCE_LOCK_KEY = 0x6E6F7469
+
+# месячные партиции (в том числе уже отсоединенные, но не удаленные
+# после сбоя) и признак того, что партиция присоединена к notifications
+PARTITIONS_QUERY = text("""
+SELECT c.relname, i.inhparent IS NOT NULL
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_inherits i
+    ON i.inhrelid = c.oid AND i.inhparent = 'notifications'::regclass
+WHERE c.relkind = 'r'
+    AND n.nspname = current_schema()
+    AND c.relname LIKE :pattern
+ORDER BY c.relname
+""")
+
+# суффикс YYYY_MM первой партиции, которая еще хранится
+RETENTION_CUTOFF_QUERY = text("""
+SELECT to_char(
+    date_trunc('month', now()) - make_interval(months => :months),
+    'YYYY_MM'
+)
+""")
+
+
+class PartitionManager:
+    """
+    Периодическое обслуживание партиций notifications
+    """
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            premake_months: int,
+            retention_months: int,
+            archive_dir: Optional[str] = None,
+            interval: float = 3600.0,
+            chunk_size: int = app_config.export_chunk_size,
+    ):
+        """
+        :param session_factory: фабрика сессий БД
+        :param premake_months: на сколько месяцев вперед создавать
+         партиции
+        :param retention_months: сколько месяцев, кроме текущего,
+         хранить партиции (0 - хранить бессрочно)
+        :param archive_dir: каталог для выгрузки удаляемых партиций,
+         None - удалять без выгрузки
+        :param interval: пауза между запусками обслуживания в секундах
+        :param chunk_size: число строк, читаемых из БД за раз
+         при выгрузке
+        """
+        self._session_factory = session_factory
+        self._premake_months = premake_months
+        self._retention_months = retention_months
+        self._archive_dir = archive_dir
+        self._interval = interval
+        self._chunk_size = chunk_size
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """
+        Основной цикл: обслуживание раз в interval секунд
+        до запроса остановки
+        """
+        logger.info(
+            "обслуживание партиций запущено: premake=%i, retention=%i",
+            self._premake_months,
+            self._retention_months,
+        )
+        while not self._stopping.is_set():
+            try:
+                await self.maintain()
+            except Exception as unexpected_error:
+                logger.error(
+                    "ошибка обслуживания партиций: %s",
+                    unexpected_error
+                )
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("обслуживание партиций остановлено")
+
+    def stop(self):
+        """
+        Запрос остановки цикла обслуживания
+        """
+        self._stopping.set()
+
+    async def maintain(self) -> List[str]:
+        """
+        Создание будущих партиций и удаление устаревших.
+        Если обслуживание уже выполняет другой процесс, ничего
+        не делает
+
+        :return: имена удаленных партиций
+        """
+        async with self._session_factory() as lock_session:
+            locked = await lock_session.scalar(
+                select(func.pg_try_advisory_lock(MAINTENANCE_LOCK_KEY))
+            )
+            if not locked:
+                logger.debug("обслуживание партиций выполняет другой процесс")
+                return []
+            try:
+                await self.ensure_partitions()
+                return await self.apply_retention()
+            finally:
+                await lock_session.execute(
+                    select(func.pg_advisory_unlock(MAINTENANCE_LOCK_KEY))
+                )
+
+    async def ensure_partitions(self):
+        """
+        Создание партиций с текущего месяца на premake_months вперед
+        """
+        async with self._session_factory() as session:
+            await session.execute(partitions_ddl(self._premake_months))
+            await session.commit()
+
+    async def expired_partitions(self) -> Dict[str, bool]:
+        """
+        Партиции старше окна хранения
+
+        :return: имя партиции и признак того, что она еще
+         присоединена к notifications
+        """
+        if not self._retention_months:
+            return {}
+        async with self._session_factory() as session:
+            cutoff = await session.scalar(
+                RETENTION_CUTOFF_QUERY,
+                {"months": self._retention_months},
+            )
+            result = await session.execute(
+                PARTITIONS_QUERY,
+                {"pattern": PARTITION_PREFIX.replace("_", "\\_") + "%"},
+            )
+            return {
+                name: attached
+                for name, attached in result.tuples()
+                if name[len(PARTITION_PREFIX):] < cutoff
+            }
+
+    async def apply_retention(self) -> List[str]:
+        """
+        Отсоединение, выгрузка и удаление устаревших партиций,
+        удаление ключей идемпотентности и шаблонов рассылок старше
+        окна хранения
+
+        Партиция отсоединяется до выгрузки, чтобы выгрузка не держала
+        блокировку notifications; отсоединенная, но не удаленная
+        после сбоя партиция будет выгружена при следующем запуске.
+
+        :return: имена удаленных партиций
+        """
+        dropped = []
+        for name, attached in (await self.expired_partitions()).items():
+            if attached:
+                await self._execute(
+                    f'ALTER TABLE notifications DETACH PARTITION "{name}"'
+                )
+            if self._archive_dir is not None:
+                path = await self._archive(name)
+                logger.info("партиция %s выгружена в %s", name, path)
+            await self._drop(name)
+            logger.info("партиция %s удалена", name)
+            dropped.append(name)
+
+        if self._retention_months:
+            cutoff = func.date_trunc("month", func.now()) - func.make_interval(
+                0, self._retention_months
+            )
+            async with self._session_factory() as session:
+                await session.execute(
+                    delete(NotificationIdempotencyKey).where(
+                        NotificationIdempotencyKey.created_at < cutoff
+                    )
+                )
+                # строки рассылки создаются чуть позже шаблона и могут
+                # попасть в следующий месяц, поэтому шаблоны хранятся
+                # на месяц дольше
+                await session.execute(
+                    delete(NotificationTemplate).where(
+                        NotificationTemplate.created_at
+                        < cutoff - func.make_interval(0, 1)
+                    )
+                )
+                await session.commit()
+        return dropped
+
+    async def _execute(self, statement: str):
+        """
+        Выполнение DDL в отдельной транзакции
+        """
+        async with self._session_factory() as session:
+            await session.execute(text(statement))
+            await session.commit()
+
+    async def _drop(self, name: str):
+        """
+        Удаление отсоединенной партиции. DROP TABLE не вызывает
+        триггеры, поэтому ее строки вычитаются из счетчиков
+        статусов в той же транзакции
+        """
+        async with self._session_factory() as session:
+            await session.execute(text(
+                "INSERT INTO notification_status_counts AS c "
+                "(notification_type, status, shard, count) "
+                "SELECT notification_type, status, 0, -count(*) "
+                f'FROM "{name}" GROUP BY notification_type, status '
+                "ON CONFLICT (notification_type, status, shard) "
+                "DO UPDATE SET count = c.count + EXCLUDED.count"
+            ))
+            await session.execute(text(f'DROP TABLE "{name}"'))
+            await session.commit()
+
+    async def _archive(self, name: str) -> str:
+        """
+        Выгрузка партиции в archive_dir/<name>.ndjson.gz:
+        строки читаются порциями и пишутся во временный файл,
+        который переименовывается после успешной выгрузки.
+        Текст рассылок берется из шаблона, чтобы выгрузка
+        не зависела от notification_templates
+
+        :param name: имя партиции
+        :return: путь к файлу выгрузки
+        """
+        os.makedirs(self._archive_dir, exist_ok=True)
+        path = os.path.join(self._archive_dir, f"{name}.ndjson.gz")
+        tmp_path = f"{path}.tmp"
+        archive: IO[bytes] = await asyncio.to_thread(gzip.open, tmp_path, "wb")
+        try:
+            async with self._session_factory() as session:
+                result = await session.stream(
+                    text(
+                        "SELECT (to_jsonb(p) || jsonb_build_object("
+                        "'message', coalesce(p.message, t.body)))::text "
+                        f'FROM "{name}" p '
+                        "LEFT JOIN notification_templates t "
+                        "USING (id_template) "
+                        "ORDER BY p.id_notification"
+                    ),
+                    execution_options={"yield_per": self._chunk_size},
+                )
+                async for rows in result.scalars().partitions():
+                    await asyncio.to_thread(
+                        archive.write,
+                        "".join(f"{row}\n" for row in rows).encode(),
+                    )
+        except BaseException:
+            await asyncio.to_thread(archive.close)
+            os.remove(tmp_path)
+            raise
+        await asyncio.to_thread(archive.close)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,173 @@
+"""
+Модуль ограничения скорости отправки уведомлений
+по каналам и получателям
+"""
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from core.config import app_config
+from schemas.monitoring import RateLimiterStatsSchema
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _ChannelStats:
+    """
+    Счетчики ожидания лимитера по каналу
+    """
+    __slots__ = ("acquired", "throttled", "wait_seconds", "deferred")
+
+    def __init__(self):
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.deferred = 0
+
+
+class NotificationRateLimiter:
+    """
+    Ограничитель скорости отправки.
+
+    Перед вызовом обработчика отправка ждет токен в ведре
+    канала. Лимит на получателя проверяется без ожидания в ведре
+    пары (канал, user_id): ожидание одного получателя не должно
+    занимать слот диспетчера, поэтому такая отправка откладывается
+    в БД. Ведра получателей хранятся в LRU ограниченного размера.
+    """
+    def __init__(
+            self,
+            channel_limits: Dict[str, Tuple[float, int]],
+            user_limit: Optional[Tuple[float, int]] = None,
+            max_users: int = 100000,
+    ):
+        """
+        :param channel_limits: (скорость в секунду, емкость) для каналов,
+         каналы без записи не ограничиваются
+        :param user_limit: (скорость в секунду, емкость) для получателя,
+         None - без ограничения
+        :param max_users: максимум хранимых ведер получателей
+        """
+        self._channel_buckets = {
+            notification_type: TokenBucket(rate, burst)
+            for notification_type, (rate, burst) in channel_limits.items()
+        }
+        self._user_limit = user_limit
+        self._max_users = max_users
+        self._user_buckets: OrderedDict[Tuple[str, int], TokenBucket] = (
+            OrderedDict()
+        )
+        self._stats: Dict[str, _ChannelStats] = {}
+
+    def try_acquire_user(self, notification_type: str, user_id: int) -> float:
+        """
+        Проверка лимита получателя без ожидания
+
+        :param notification_type: тип уведомления
+        :param user_id: id получателя
+        :return: 0, если отправка разрешена, иначе через сколько
+         секунд ее можно повторить
+        """
+        if self._user_limit is None:
+            return 0.0
+        retry_after = self._user_bucket(
+            notification_type,
+            user_id
+        ).try_acquire()
+        if retry_after:
+            stats = self._stats.setdefault(notification_type, _ChannelStats())
+            stats.deferred += 1
+            logger.debug(
+                "отправка %s уведомления user_id=%i отложена лимитом "
+                "получателя на %.3fs",
+                notification_type,
+                user_id,
+                retry_after
+            )
+        return retry_after
+
+    async def acquire(self, notification_type: str, user_id: int) -> float:
+        """
+        Ожидание разрешения канала на отправку одного уведомления
+
+        :param notification_type: тип уведомления
+        :param user_id: id получателя
+        :return: время ожидания в секундах
+        """
+        waited = 0.0
+        channel_bucket = self._channel_buckets.get(notification_type)
+        if channel_bucket is not None:
+            waited = await channel_bucket.acquire()
+
+        stats = self._stats.setdefault(notification_type, _ChannelStats())
+        stats.acquired += 1
+        if waited:
+            stats.throttled += 1
+            stats.wait_seconds += waited
+            logger.debug(
+                "отправка %s уведомления user_id=%i ждала лимитер %.3fs",
+                notification_type,
+                user_id,
+                waited
+            )
+        return waited
+
+    def stats(self) -> Dict[str, RateLimiterStatsSchema]:
+        """
+        Время, проведенное в ожидании лимитера, и число
+        отложенных лимитом получателя отправок по каналам
+        """
+        return {
+            notification_type: RateLimiterStatsSchema(
+                acquired=stats.acquired,
+                throttled=stats.throttled,
+                wait_seconds=stats.wait_seconds,
+                deferred=stats.deferred,
+            )
+            for notification_type, stats in self._stats.items()
+        }
+
+    def _user_bucket(self, notification_type: str, user_id: int):
+        """
+        Ведро получателя, вытесняются давно не использованные
+        """
+        key = (notification_type, user_id)
+        bucket = self._user_buckets.get(key)
+        if bucket is None:
+            rate, burst = self._user_limit
+            bucket = self._user_buckets[key] = TokenBucket(rate, burst)
+            if len(self._user_buckets) > self._max_users:
+                self._user_buckets.popitem(last=False)
+        else:
+            self._user_buckets.move_to_end(key)
+        return bucket
+
+
+def _limit(rate: float, burst: int) -> Optional[Tuple[float, int]]:
+    """
+    Лимит из конфигурации, нулевая скорость отключает ограничение
+    """
+    return (rate, burst) if rate > 0 else None
+
+
+notification_rate_limiter = NotificationRateLimiter(
+    channel_limits={
+        notification_type: limit
+        for notification_type, limit in (
+            ("email", _limit(
+                app_config.email_rate_limit,
+                app_config.email_rate_burst
+            )),
+            ("telegram", _limit(
+                app_config.telegram_rate_limit,
+                app_config.telegram_rate_burst
+            )),
+        )
+        if limit is not None
+    },
+    user_limit=_limit(
+        app_config.user_rate_limit,
+        app_config.user_rate_burst
+    ),
+)
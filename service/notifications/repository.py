@@ -3,53 +3,423 @@
 для уведомлений
 """
 import logging
-from typing import List, Optional, Literal
+import random
+from datetime import datetime, timedelta, timezone
+from string import Template
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from fastapi import Depends
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import (
+    DateTime,
+    Float,
+    Integer,
+    Text,
+    any_,
+    bindparam,
+    case,
+    cast,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert as pg_insert
 
+from core.config import app_config
 from core.db import get_session
-from models.notifications import Notification
-from schemas.notifications import CreateNotificationSchema
+from models.notifications import (
+    Notification,
+    NotificationIdempotencyKey,
+    NotificationStatusCount,
+    NotificationTemplate,
+)
+from schemas.monitoring import NotificationStatusCountsSchema
+from schemas.notifications import (
+    BroadcastCreatedSchema,
+    CreateBroadcastSchema,
+    CreateNotificationSchema,
+    NotificationPageSchema,
+    NotificationSchema,
+    NotificationStatusEventSchema,
+)
+from service.notifications.cache import (
+    NotificationHistoryCache,
+    notification_history_cache,
+)
+from service.notifications.status_hub import StatusHub
 
 logger = logging.getLogger(__name__)
 
+# текст рассылки хранится в шаблоне: коррелированный подзапрос
+# по первичному ключу шаблона работает и в SELECT, и в RETURNING
+NOTIFICATION_MESSAGE = func.coalesce(
+    Notification.message,
+    select(NotificationTemplate.body)
+    .where(NotificationTemplate.id_template == Notification.id_template)
+    .scalar_subquery(),
+).label("message")
+
+# колонки, из которых строится NotificationSchema: запросы выбирают
+# только их, без гидратации ORM-объектов и служебных колонок
+# (params - подстановки в шаблон, в схему не попадают)
+NOTIFICATION_COLUMNS = (
+    Notification.id_notification,
+    Notification.user_id,
+    NOTIFICATION_MESSAGE,
+    Notification.notification_type,
+    Notification.status,
+    Notification.priority,
+    Notification.send_at,
+    Notification.params,
+)
+NOTIFICATION_FIELDS = tuple(column.key for column in NOTIFICATION_COLUMNS)
+
+# запрос собирается один раз: ключ кэша компиляции у готового
+# объекта запоминается, значения передаются параметрами
+INSERT_NOTIFICATION = insert(Notification).returning(*NOTIFICATION_COLUMNS)
+INSERT_IDEMPOTENCY_KEY = (
+    pg_insert(NotificationIdempotencyKey)
+    .on_conflict_do_nothing(
+        index_elements=[NotificationIdempotencyKey.idempotency_key]
+    )
+    .returning(NotificationIdempotencyKey.idempotency_key)
+)
+
 
 class NotificationRepository:
     """
     Слой работы с БД с уведомлениями
     """
-    def __init__(self, session: AsyncSession):
+    def __init__(
+            self,
+            session: AsyncSession,
+            cache: Optional[NotificationHistoryCache] = None,
+            status_hub: Optional[StatusHub] = None,
+    ):
+        """
+        :param session: сессия БД
+        :param cache: кэш истории, который читается в get_by_user_id
+         и сбрасывается при изменении уведомлений пользователя
+        :param status_hub: хаб, в который публикуются события
+         смены статусов
+        """
         self.session = session
+        self.cache = cache
+        self.status_hub = status_hub
 
     async def create(
             self,
-            create_schema: CreateNotificationSchema
-    ) -> Notification:
+            create_schema: CreateNotificationSchema,
+            lease: Optional[float] = None,
+    ) -> NotificationSchema:
         """
-        Создание уведомления
+        Создание уведомления одним INSERT ... RETURNING,
+        без ORM-объекта и unit of work
+
+        :param create_schema: схема создания уведомления
+        :param lease: срок аренды в секундах, если уведомление
+         отправляется самим API и не должно забираться очередью
+         (запланированные уведомления создаются без аренды)
+        :return: созданное уведомление
         """
-        notification = Notification(
-            user_id=create_schema.user_id,
-            message=create_schema.message,
-            notification_type=create_schema.notification_type,
-            status="pending",
+        result = await self.session.execute(
+            INSERT_NOTIFICATION,
+            _insert_params(create_schema, _lease_expiration(lease)),
         )
-        self.session.add(notification)
+        [notification] = _to_schemas(result.tuples())
         await self.session.commit()
+        await self._invalidate_users({notification.user_id})
         return notification
 
+    async def create_idempotent(
+            self,
+            create_schema: CreateNotificationSchema,
+            idempotency_key: str,
+            lease: Optional[float] = None,
+    ) -> Tuple[NotificationSchema, bool]:
+        """
+        Создание уведомления с ключом идемпотентности.
+
+        Ключ вставляется в notification_idempotency_keys через
+        INSERT ... ON CONFLICT DO NOTHING в той же транзакции, что
+        и уведомление. Если ключ уже есть (в том числе его вставил
+        параллельный запрос - тогда вставка ждет его коммита),
+        возвращается ранее созданное уведомление.
+
+        :param create_schema: схема создания уведомления
+        :param idempotency_key: ключ идемпотентности
+        :param lease: срок аренды в секундах (см. create)
+        :return: уведомление и признак того, что оно создано сейчас
+        """
+        result = await self.session.execute(
+            INSERT_IDEMPOTENCY_KEY,
+            {"idempotency_key": idempotency_key},
+        )
+        if result.scalar_one_or_none() is None:
+            result = await self.session.execute(
+                select(*NOTIFICATION_COLUMNS).where(
+                    Notification.id_notification == (
+                        select(NotificationIdempotencyKey.id_notification)
+                        .where(
+                            NotificationIdempotencyKey.idempotency_key
+                            == idempotency_key
+                        )
+                        .scalar_subquery()
+                    )
+                )
+            )
+            [existing] = _to_schemas(result.tuples())
+            await self.session.commit()
+            return existing, False
+
+        result = await self.session.execute(
+            INSERT_NOTIFICATION,
+            _insert_params(create_schema, _lease_expiration(lease)),
+        )
+        [notification] = _to_schemas(result.tuples())
+        await self.session.execute(
+            update(NotificationIdempotencyKey)
+            .where(
+                NotificationIdempotencyKey.idempotency_key == idempotency_key
+            )
+            .values(id_notification=notification.id_notification)
+        )
+        await self.session.commit()
+        await self._invalidate_users({notification.user_id})
+        return notification, True
+
+    async def create_many(
+            self,
+            create_schemas: List[CreateNotificationSchema],
+            chunk_size: int = app_config.batch_chunk_size,
+            lease: Optional[float] = None,
+    ) -> List[NotificationSchema]:
+        """
+        Пакетное создание уведомлений.
+
+        Каждый чанк вставляется одним INSERT ... VALUES (...), (...)
+        RETURNING, вся пачка фиксируется одним коммитом.
+
+        :param create_schemas: схемы создания уведомлений
+        :param chunk_size: число строк в одном INSERT
+        :param lease: срок аренды в секундах (см. create)
+        :return: созданные уведомления
+        """
+        locked_until = _lease_expiration(lease)
+        created: List[NotificationSchema] = []
+        for start in range(0, len(create_schemas), chunk_size):
+            chunk = create_schemas[start:start + chunk_size]
+            query = (
+                insert(Notification)
+                .values([
+                    _insert_params(create_schema, locked_until)
+                    for create_schema in chunk
+                ])
+                .returning(*NOTIFICATION_COLUMNS)
+            )
+            result = await self.session.execute(query)
+            created.extend(_to_schemas(result.tuples()))
+        await self.session.commit()
+        await self._invalidate_users({schema.user_id for schema in created})
+        return created
+
+    async def create_broadcast(
+            self,
+            broadcast: CreateBroadcastSchema,
+            chunk_size: int = app_config.broadcast_chunk_size,
+    ) -> BroadcastCreatedSchema:
+        """
+        Создание рассылки.
+
+        Текст сохраняется один раз в notification_templates, а строки
+        получателей ссылаются на него по id_template и хранят только
+        числа (и params, если заданы подстановки). Получатели
+        разворачиваются на стороне БД через INSERT ... SELECT из
+        generate_series (диапазон) или unnest (список) частями по
+        chunk_size строк, вся рассылка фиксируется одним коммитом.
+        Уведомления создаются без аренды, отправку выполняет
+        обработчик очереди.
+
+        :param broadcast: схема рассылки
+        :param chunk_size: число получателей в одном INSERT
+        :return: id шаблона и число созданных уведомлений
+        """
+        id_template = await self.session.scalar(
+            insert(NotificationTemplate)
+            .values(body=broadcast.message)
+            .returning(NotificationTemplate.id_template)
+        )
+        created = 0
+        for user_ids in broadcast.recipient_chunks(chunk_size):
+            result = await self.session.execute(
+                _broadcast_insert(broadcast, id_template, user_ids)
+            )
+            created += result.rowcount
+        await self.session.commit()
+        # получателей может быть до BROADCAST_MAX_RECIPIENTS, поэтому
+        # кэш сбрасывается целиком, а не по каждому получателю
+        if self.cache is not None:
+            self.cache.invalidate_all()
+        return BroadcastCreatedSchema(id_template=id_template, created=created)
+
+    async def claim_pending(
+            self,
+            limit: int,
+            lease: float,
+            notification_type: Optional[str] = None,
+            priority: Optional[str] = None,
+            ids: Optional[List[int]] = None,
+    ) -> List[NotificationSchema]:
+        """
+        Захват пачки ожидающих отправки уведомлений для обработчика очереди.
+
+        Строки выбираются через SELECT ... FOR UPDATE SKIP LOCKED,
+        поэтому параллельные обработчики не блокируют друг друга и
+        не получают одни и те же строки. Захваченным строкам
+        выставляется срок аренды: если обработчик упадет, не успев
+        обновить статус, уведомление снова станет доступно после его
+        истечения. Уведомления с отложенной повторной попыткой
+        захватываются только после наступления next_attempt_at.
+
+        :param limit: максимальный размер пачки
+        :param lease: срок аренды в секундах
+        :param notification_type: захватывать только уведомления этого типа
+        :param priority: захватывать только уведомления этого приоритета
+        :param ids: захватывать только уведомления с этими id
+        :return: захваченные уведомления
+        """
+        claimable = select(Notification.id_notification).where(
+            Notification.status == "pending",
+            or_(
+                Notification.locked_until.is_(None),
+                Notification.locked_until < func.now(),
+            ),
+            or_(
+                Notification.next_attempt_at.is_(None),
+                Notification.next_attempt_at <= func.now(),
+            ),
+        )
+        if notification_type:
+            claimable = claimable.where(
+                Notification.notification_type == notification_type
+            )
+        if priority:
+            claimable = claimable.where(Notification.priority == priority)
+        if ids is not None:
+            claimable = claimable.where(
+                Notification.id_notification == any_(
+                    bindparam("ids", ids, type_=ARRAY(Integer))
+                )
+            )
+        claimable = (
+            claimable
+            .order_by(Notification.id_notification)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        query = (
+            update(Notification)
+            .where(Notification.id_notification.in_(claimable))
+            .values(locked_until=func.now() + timedelta(seconds=lease))
+            .returning(*NOTIFICATION_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(query)
+        claimed = _to_schemas(result.tuples())
+        await self.session.commit()
+        return claimed
+
+    async def extend_leases(self, ids: List[int], lease: float) -> int:
+        """
+        Продление аренды уведомлений, которые еще ждут отправки
+        в очереди диспетчера, чтобы их не захватили повторно
+
+        :param ids: id уведомлений
+        :param lease: новый срок аренды в секундах от текущего момента
+        :return: число уведомлений с продленной арендой
+        """
+        query = (
+            update(Notification)
+            .where(
+                Notification.id_notification == any_(
+                    bindparam("ids", ids, type_=ARRAY(Integer))
+                ),
+                Notification.status == "pending",
+            )
+            .values(locked_until=func.now() + timedelta(seconds=lease))
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(query)
+        await self.session.commit()
+        return result.rowcount
+
+    async def get_scheduled(
+            self,
+            after: Optional[datetime],
+            until: datetime,
+            limit: int,
+    ) -> List[Tuple[int, datetime, str, str]]:
+        """
+        Запланированные уведомления, время отправки которых
+        наступает в интервале (after, until], по возрастанию времени.
+
+        Запрос идет по частичному индексу idx_scheduled, поэтому
+        его стоимость зависит от числа уведомлений в интервале,
+        а не от числа всех запланированных.
+
+        :param after: нижняя граница (не включается), None - без нее
+        :param until: верхняя граница
+        :param limit: максимум строк
+        :return: (id, время отправки, тип, приоритет)
+        """
+        query = select(
+            Notification.id_notification,
+            Notification.next_attempt_at,
+            Notification.notification_type,
+            Notification.priority,
+        ).where(
+            Notification.status == "pending",
+            Notification.send_at.is_not(None),
+            Notification.next_attempt_at <= until,
+        )
+        if after is not None:
+            query = query.where(Notification.next_attempt_at > after)
+        result = await self.session.execute(
+            query.order_by(Notification.next_attempt_at).limit(limit)
+        )
+        rows = result.tuples().all()
+        await self.session.commit()
+        return rows
+
     async def get(self, id_notification) -> Optional[Notification]:
         """
         Метод возвращает модель уведомления,
         если запись существует в БД
 
+        Первичный ключ партиционированной таблицы включает created_at,
+        поэтому уведомление ищется запросом по id, а не session.get.
+
         :param id_notification: id уведомления
         :return: уведомление, если существует
         """
-        return await self.session.get(Notification, id_notification)
+        return await self.session.scalar(
+            select(Notification).where(
+                Notification.id_notification == id_notification
+            )
+        )
 
     async def update_status(
             self,
@@ -82,14 +452,254 @@ class NotificationRepository:
                 "неверный статус уведомления"
             ) from err
 
+    async def update_statuses(
+            self,
+            statuses: Dict[str, List[int]],
+    ) -> int:
+        """
+        Пакетное обновление статусов уведомлений.
+
+        Для каждого статуса выполняется один
+        UPDATE ... WHERE id_notification = ANY($1),
+        все обновления фиксируются одним коммитом
+        вместе с NOTIFY событий смены статусов.
+
+        :param statuses: id уведомлений, сгруппированные по статусу
+        :return: число обновленных строк
+        """
+        events = []
+        for status, ids in statuses.items():
+            if not ids:
+                continue
+            query = (
+                update(Notification)
+                .where(
+                    Notification.id_notification == any_(
+                        bindparam("ids", ids, type_=ARRAY(Integer))
+                    )
+                )
+                .values(status=status)
+                .returning(Notification.id_notification, Notification.user_id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(query)
+            events.extend(
+                NotificationStatusEventSchema(
+                    id_notification=id_notification,
+                    user_id=user_id,
+                    status=status,
+                )
+                for id_notification, user_id in result.tuples()
+            )
+        await self._commit_statuses(events)
+        return len(events)
+
+    async def schedule_retries(
+            self,
+            ids: List[int],
+            max_attempts: int,
+            base_delay: float,
+            max_delay: float,
+    ) -> Dict[str, int]:
+        """
+        Планирование повторной отправки неудачных уведомлений.
+
+        Одним UPDATE увеличивает attempts, снимает аренду и выставляет
+        next_attempt_at = now() + min(max_delay, base_delay * 2^attempts)
+        со случайным множителем от 0.5 до 1 (jitter), чтобы повторы
+        после сбоя провайдера не приходили одновременно. Уведомления,
+        исчерпавшие max_attempts попыток, получают статус "failed".
+
+        :param ids: id неудачно отправленных уведомлений
+        :param max_attempts: максимальное число попыток отправки
+        :param base_delay: задержка перед первым повтором в секундах
+        :param max_delay: максимальная задержка в секундах
+        :return: число уведомлений по итоговому статусу
+         ("pending" - повтор запланирован, "failed" - попытки исчерпаны)
+        """
+        attempts = Notification.attempts + 1
+        exhausted = attempts >= max_attempts
+        delay = func.least(
+            bindparam("max_delay", max_delay, type_=Float),
+            bindparam("base_delay", base_delay, type_=Float)
+            * func.power(2, Notification.attempts),
+        ) * (0.5 + func.random() / 2)
+        query = (
+            update(Notification)
+            .where(
+                Notification.id_notification == any_(
+                    bindparam("ids", ids, type_=ARRAY(Integer))
+                )
+            )
+            .values(
+                attempts=attempts,
+                status=case((exhausted, "failed"), else_="pending"),
+                next_attempt_at=case(
+                    (exhausted, None),
+                    else_=func.now() + func.make_interval(
+                        0, 0, 0, 0, 0, 0, delay
+                    ),
+                ),
+                locked_until=None,
+            )
+            .returning(
+                Notification.id_notification,
+                Notification.user_id,
+                Notification.status,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(query)
+        events = [
+            NotificationStatusEventSchema(
+                id_notification=id_notification,
+                user_id=user_id,
+                status=status,
+            )
+            for id_notification, user_id, status in result.tuples()
+        ]
+        await self._commit_statuses(events)
+
+        scheduled: Dict[str, int] = {"pending": 0, "failed": 0}
+        for event in events:
+            scheduled[event.status] += 1
+        return scheduled
+
+    async def defer(self, ids: List[int], delay: float) -> int:
+        """
+        Откладывание уведомлений, отправка которых не выполнялась
+        (например, цепь канала разомкнута). Число попыток не меняется.
+
+        :param ids: id уведомлений
+        :param delay: задержка в секундах
+        :return: число отложенных уведомлений
+        """
+        query = (
+            update(Notification)
+            .where(
+                Notification.id_notification == any_(
+                    bindparam("ids", ids, type_=ARRAY(Integer))
+                ),
+                Notification.status == "pending",
+            )
+            .values(
+                next_attempt_at=func.now() + timedelta(seconds=delay),
+                locked_until=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(query)
+        await self.session.commit()
+        return result.rowcount
+
+    async def status_counts(self) -> Dict[str, NotificationStatusCountsSchema]:
+        """
+        Число уведомлений по типу и статусу.
+
+        Читается из notification_status_counts, которую поддерживает
+        триггер на notifications, поэтому стоимость запроса зависит
+        от числа шардов счетчика, а не от размера таблицы.
+
+        :return: счетчики статусов по типам уведомлений
+        """
+        result = await self.session.execute(
+            select(
+                NotificationStatusCount.notification_type,
+                NotificationStatusCount.status,
+                func.sum(NotificationStatusCount.count),
+            ).group_by(
+                NotificationStatusCount.notification_type,
+                NotificationStatusCount.status,
+            )
+        )
+        counts: Dict[str, Dict[str, int]] = {}
+        for notification_type, status, count in result.tuples():
+            counts.setdefault(notification_type, {})[status] = count
+        return {
+            notification_type: NotificationStatusCountsSchema(**by_status)
+            for notification_type, by_status in counts.items()
+        }
+
     async def get_by_user_id(
         self,
         user_id: int,
         notification_type: Optional[str] = None,
         status: Optional[str] = None,
-    ) -> List[Notification]:
-        """Получение уведомлений пользователя с фильтрацией"""
-        query = select(Notification).where(Notification.user_id == user_id)
+        limit: int = app_config.page_default_limit,
+        before_id: Optional[int] = None,
+    ) -> NotificationPageSchema:
+        """
+        Получение страницы уведомлений пользователя с фильтрацией.
+
+        Keyset-пагинация по убыванию id: следующая страница
+        запрашивается с before_id = next_cursor текущей.
+
+        :param user_id: id пользователя
+        :param notification_type: фильтр по типу уведомления
+        :param status: фильтр по статусу
+        :param limit: размер страницы
+        :param before_id: вернуть уведомления с id меньше указанного
+        :return: страница уведомлений и курсор следующей страницы
+        """
+        if self.cache is None:
+            return await self._load_page(
+                user_id, notification_type, status, limit, before_id
+            )
+        return await self.cache.get_or_load(
+            user_id=user_id,
+            notification_type=notification_type,
+            status=status,
+            limit=limit,
+            before_id=before_id,
+            loader=lambda: self._load_page(
+                user_id, notification_type, status, limit, before_id
+            ),
+        )
+
+    async def stream_by_user_id(
+        self,
+        user_id: int,
+        status: Optional[str] = None,
+        chunk_size: int = app_config.export_chunk_size,
+    ) -> AsyncIterator[List[NotificationSchema]]:
+        """
+        Потоковое чтение всей истории пользователя.
+
+        Строки читаются серверным курсором по chunk_size за раз,
+        поэтому память не зависит от размера истории.
+
+        :param user_id: id пользователя
+        :param status: фильтр по статусу
+        :param chunk_size: число строк, читаемых из курсора за раз
+        :return: асинхронный итератор чанков уведомлений
+        """
+        query = select(*NOTIFICATION_COLUMNS).where(
+            Notification.user_id == user_id
+        )
+        if status:
+            query = query.where(Notification.status == status)
+        query = query.order_by(
+            Notification.id_notification.desc()
+        ).execution_options(yield_per=chunk_size)
+
+        result = await self.session.stream(query)
+        async for rows in result.partitions():
+            yield _to_schemas(rows)
+
+    async def _load_page(
+        self,
+        user_id: int,
+        notification_type: Optional[str],
+        status: Optional[str],
+        limit: int,
+        before_id: Optional[int],
+    ) -> NotificationPageSchema:
+        """
+        Загрузка страницы уведомлений пользователя из БД
+        """
+        query = select(*NOTIFICATION_COLUMNS).where(
+            Notification.user_id == user_id
+        )
 
         if notification_type:
             query = query.where(
@@ -99,12 +709,149 @@ class NotificationRepository:
         if status:
             query = query.where(Notification.status == status)
 
+        if before_id is not None:
+            query = query.where(Notification.id_notification < before_id)
+
+        # лишняя строка показывает, есть ли следующая страница
         query = query.order_by(
             Notification.id_notification.desc()
-        )
+        ).limit(limit + 1)
 
         result = await self.session.execute(query)
-        return list(result.scalars().all())
+        items = _to_schemas(result.tuples())
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = items[-1].id_notification
+        return NotificationPageSchema(items=items, next_cursor=next_cursor)
+
+    async def _commit_statuses(
+            self,
+            events: List[NotificationStatusEventSchema],
+    ):
+        """
+        Коммит записанных статусов: NOTIFY событий в той же транзакции,
+        после коммита - сброс кэша истории и публикация событий
+        подпискам процесса
+        """
+        if self.status_hub is not None and events:
+            await self.status_hub.notify(self.session, events)
+        await self.session.commit()
+        await self._invalidate_users({event.user_id for event in events})
+        if self.status_hub is not None:
+            self.status_hub.publish(events)
+
+    async def _invalidate_users(self, user_ids):
+        """
+        Сброс кэша истории пользователей после изменения их уведомлений
+        """
+        if self.cache is not None and user_ids:
+            await self.cache.invalidate_users(user_ids)
+
+
+def _to_schemas(rows: Iterable[tuple]) -> List[NotificationSchema]:
+    """
+    Строки из NOTIFICATION_COLUMNS в схемы уведомлений.
+
+    Кортежи сопоставляются с именами полей напрямую: так дешевле,
+    чем гидратация ORM-объектов или чтение через RowMapping.
+    Если у строки есть params, они подставляются в текст шаблона.
+    """
+    schemas = []
+    for row in rows:
+        values = dict(zip(NOTIFICATION_FIELDS, row))
+        params = values.pop("params")
+        if params:
+            values["message"] = Template(values["message"]).safe_substitute(
+                params
+            )
+        schemas.append(NotificationSchema.model_validate(values))
+    return schemas
+
+
+def _broadcast_insert(
+        broadcast: CreateBroadcastSchema,
+        id_template: int,
+        user_ids: Sequence[int],
+):
+    """
+    INSERT ... SELECT строк рассылки для части получателей
+    """
+    if isinstance(user_ids, range):
+        recipients = func.generate_series(user_ids.start, user_ids.stop - 1)
+    else:
+        recipients = func.unnest(
+            bindparam("user_ids", list(user_ids), type_=ARRAY(Integer))
+        )
+    user_id = recipients.column_valued("user_id")
+    columns = {
+        "user_id": user_id,
+        "id_template": literal(id_template),
+        "notification_type": literal(broadcast.notification_type),
+        "priority": literal(broadcast.priority),
+        "status": literal("pending"),
+    }
+    if broadcast.params:
+        chunk_params = {
+            str(recipient): broadcast.params[recipient]
+            for recipient in user_ids
+            if recipient in broadcast.params
+        }
+        if chunk_params:
+            columns["params"] = bindparam(
+                "params",
+                chunk_params,
+                type_=JSONB,
+            ).op("->", return_type=JSONB)(cast(user_id, Text))
+    if broadcast.send_at is not None:
+        send_at = literal(broadcast.send_at, DateTime(timezone=True))
+        columns["send_at"] = send_at
+        columns["next_attempt_at"] = send_at + func.make_interval(
+            0, 0, 0, 0, 0, 0, func.random() * app_config.schedule_spread
+        )
+    return insert(Notification).from_select(
+        list(columns),
+        select(*columns.values()),
+    )
+
+
+def _insert_params(
+        create_schema: CreateNotificationSchema,
+        locked_until: Optional[datetime],
+) -> dict:
+    """
+    Значения колонок новой строки уведомления.
+
+    Запланированное уведомление (send_at) создается без аренды,
+    а первая попытка назначается на send_at со случайным сдвигом
+    в пределах SCHEDULE_SPREAD секунд, чтобы уведомления,
+    запланированные на одно время, не уходили в одну секунду
+    """
+    next_attempt_at = None
+    if create_schema.send_at is not None:
+        locked_until = None
+        next_attempt_at = create_schema.send_at + timedelta(
+            seconds=random.uniform(0, app_config.schedule_spread)
+        )
+    return {
+        "user_id": create_schema.user_id,
+        "message": create_schema.message,
+        "notification_type": create_schema.notification_type,
+        "priority": create_schema.priority,
+        "status": "pending",
+        "locked_until": locked_until,
+        "send_at": create_schema.send_at,
+        "next_attempt_at": next_attempt_at,
+    }
+
+
+def _lease_expiration(lease: Optional[float]) -> Optional[datetime]:
+    """
+    Момент истечения аренды, отсчитанный от текущего времени
+    """
+    if lease is None:
+        return None
+    return datetime.now(timezone.utc) + timedelta(seconds=lease)
 
 
 def get_notification_repository(
@@ -115,4 +862,4 @@ def get_notification_repository(
     использование: repo = Depends(get_notification_repository)
     :return: Зависимость (Depends) FastAPI
     """
-    return NotificationRepository(session)
+    return NotificationRepository(session, cache=notification_history_cache)
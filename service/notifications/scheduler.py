@@ -0,0 +1,219 @@
+"""
+Модуль планировщика отложенной отправки уведомлений.
+
+Запланированные уведомления хранятся в notifications со статусом
+"pending" и временем отправки в next_attempt_at (send_at со случайным
+сдвигом). Планировщик держит в памяти кучу уведомлений ближайших
+horizon секунд, подгружая следующий интервал по индексу idx_scheduled,
+и в назначенный момент захватывает их арендой и передает диспетчеру.
+
+Уведомления, которые планировщик не увидел (созданные внутри уже
+загруженного интервала, вытесненные при переполнении кучи или
+при остановленном планировщике), после наступления времени отправки
+захватывает обработчик очереди.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.metrics import notification_schedule_lag
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import DispatcherOverloadedError
+from service.notifications.repository import NotificationRepository
+
+logger = logging.getLogger(__name__)
+
+# пауза перед повтором, если очередь диспетчера заполнена
+OVERLOAD_PAUSE = 0.1
+
+# (время отправки в секундах epoch, id, тип, приоритет)
+_Entry = Tuple[float, int, str, str]
+
+
+class NotificationScheduler:
+    """
+    Планировщик отложенной отправки уведомлений
+    """
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            dispatcher: NotificationDispatcher,
+            horizon: float,
+            max_entries: int,
+            batch_size: int,
+            poll_interval: float,
+            lease: float,
+    ):
+        """
+        :param session_factory: фабрика сессий БД
+        :param dispatcher: диспетчер, выполняющий отправку
+        :param horizon: на сколько секунд вперед загружать уведомления
+        :param max_entries: максимум уведомлений в памяти
+        :param batch_size: максимум уведомлений, захватываемых за раз
+        :param poll_interval: пауза между загрузками из БД
+        :param lease: срок аренды захваченных строк в секундах
+        """
+        self._session_factory = session_factory
+        self._dispatcher = dispatcher
+        self._horizon = horizon
+        self._max_entries = max_entries
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._lease = lease
+        self._heap: List[_Entry] = []
+        self._ids: Set[int] = set()
+        self._loaded_until: Optional[datetime] = None
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """
+        Основной цикл: загрузка ближайшего интервала раз в
+        poll_interval секунд и ожидание ближайшего времени отправки
+        """
+        logger.info(
+            "планировщик отправки запущен: horizon=%.0fs",
+            self._horizon,
+        )
+        next_load = 0.0
+        while not self._stopping.is_set():
+            if time.time() >= next_load:
+                await self._load()
+                next_load = time.time() + self._poll_interval
+
+            if (
+                    self._heap
+                    and self._heap[0][0] <= time.time()
+                    and not await self._release()
+            ):
+                timeout = OVERLOAD_PAUSE
+            else:
+                wake_at = next_load
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                timeout = wake_at - time.time()
+            await self._wait_stopping(timeout)
+
+        logger.info("планировщик отправки остановлен")
+
+    def stop(self):
+        """
+        Запрос остановки: загруженные, но не наступившие
+        уведомления отправит обработчик очереди
+        """
+        self._stopping.set()
+
+    async def _load(self):
+        """
+        Загрузка уведомлений со временем отправки после уже
+        загруженного интервала и до now + horizon
+        """
+        until = datetime.now(timezone.utc) + timedelta(seconds=self._horizon)
+        limit = self._max_entries - len(self._heap)
+        if limit <= 0:
+            return
+        try:
+            async with self._session_factory() as session:
+                rows = await NotificationRepository(session).get_scheduled(
+                    after=self._loaded_until,
+                    until=until,
+                    limit=limit,
+                )
+        except Exception as unexpected_error:
+            logger.error(
+                "ошибка загрузки запланированных уведомлений: %s",
+                unexpected_error
+            )
+            return
+
+        for id_notification, send_at, notification_type, priority in rows:
+            if id_notification in self._ids:
+                continue
+            self._ids.add(id_notification)
+            heapq.heappush(self._heap, (
+                send_at.timestamp(),
+                id_notification,
+                notification_type,
+                priority,
+            ))
+        # при упоре в лимит остаток интервала загрузится в следующий раз
+        self._loaded_until = rows[-1][1] if len(rows) == limit else until
+        if rows:
+            logger.debug("загружено %i запланированных уведомлений", len(rows))
+
+    async def _release(self) -> bool:
+        """
+        Захват наступивших уведомлений и передача их диспетчеру
+        с учетом свободного места в очередях
+
+        :return: False, если ни одно наступившее уведомление
+         не поместилось в очереди диспетчера
+        """
+        now = time.time()
+        due: List[_Entry] = []
+        postponed: List[_Entry] = []
+        reserved: Counter = Counter()
+        while (
+                self._heap
+                and self._heap[0][0] <= now
+                and len(due) < self._batch_size
+        ):
+            entry = heapq.heappop(self._heap)
+            lane = entry[2], entry[3]
+            if self._dispatcher.free_slots(*lane) - reserved[lane] > 0:
+                reserved[lane] += 1
+                due.append(entry)
+            else:
+                postponed.append(entry)
+        for entry in postponed:
+            heapq.heappush(self._heap, entry)
+        if not due:
+            return False
+
+        self._ids.difference_update(entry[1] for entry in due)
+        try:
+            async with self._session_factory() as session:
+                claimed = await NotificationRepository(session).claim_pending(
+                    limit=len(due),
+                    lease=self._lease,
+                    ids=[entry[1] for entry in due],
+                )
+        except Exception as unexpected_error:
+            logger.error(
+                "ошибка захвата запланированных уведомлений: %s",
+                unexpected_error
+            )
+            return True
+
+        released_at = time.time()
+        send_at = {entry[1]: entry[0] for entry in due}
+        for notification_schema in claimed:
+            lag = released_at - send_at[notification_schema.id_notification]
+            notification_schedule_lag.observe(max(lag, 0))
+            # место в очереди могли занять, пока строки захватывались:
+            # тогда уведомление отправит обработчик очереди
+            # после истечения аренды
+            try:
+                self._dispatcher.submit(notification_schema)
+            except DispatcherOverloadedError as err:
+                logger.warning(
+                    "запланированное уведомление id=%i отложено "
+                    "до истечения аренды: %s",
+                    notification_schema.id_notification,
+                    err
+                )
+        return True
+
+    async def _wait_stopping(self, timeout: float):
+        """
+        Пауза, прерываемая запросом остановки
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,210 @@
+"""
+Модуль пакетной записи статусов отправленных уведомлений
+"""
+import asyncio
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, List, Literal, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.config import app_config
+from core.metrics import notification_retries
+from service.notifications.cache import NotificationHistoryCache
+from service.notifications.repository import NotificationRepository
+from service.notifications.status_hub import StatusHub
+
+logger = logging.getLogger(__name__)
+
+
+class StatusFlusher:
+    """
+    Накапливает результаты отправки (id, статус) и записывает их
+    пачкой: одна сессия и один UPDATE на статус вместо сессии,
+    SELECT и коммита на каждое уведомление.
+
+    Неудачные отправки ("retry") не получают статус сразу:
+    для них одним UPDATE планируется повторная попытка с
+    экспоненциальной задержкой, которую выполнит обработчик очереди.
+    Неотправленные уведомления ("deferred") откладываются на
+    defer_delay или переданное с результатом число секунд без
+    увеличения числа попыток, одним UPDATE на каждую задержку.
+
+    Сброс происходит при накоплении max_batch результатов
+    или раз в flush_interval секунд.
+    """
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            max_batch: int,
+            flush_interval: float,
+            cache: Optional[NotificationHistoryCache] = None,
+            status_hub: Optional[StatusHub] = None,
+            max_attempts: int = app_config.max_retries,
+            retry_delay: float = app_config.retry_delay,
+            retry_max_delay: float = app_config.retry_max_delay,
+            defer_delay: float = app_config.circuit_open_timeout,
+    ):
+        """
+        :param session_factory: фабрика сессий БД
+        :param max_batch: число результатов, при котором сброс
+         запускается не дожидаясь интервала
+        :param flush_interval: максимальная задержка записи в секундах
+        :param cache: кэш истории, сбрасываемый для пользователей
+         с обновленными статусами
+        :param status_hub: хаб, в который публикуются события
+         смены статусов
+        :param max_attempts: максимальное число попыток отправки
+        :param retry_delay: задержка перед первым повтором в секундах
+        :param retry_max_delay: максимальная задержка повтора в секундах
+        :param defer_delay: задержка отложенной отправки в секундах
+        """
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._cache = cache
+        self._status_hub = status_hub
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._retry_max_delay = retry_max_delay
+        self._defer_delay = defer_delay
+        self._pending: Dict[str, List[int]] = defaultdict(list)
+        # отложенные уведомления по задержке в секундах
+        self._deferred: Dict[float, List[int]] = defaultdict(list)
+        self._size = 0
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        """
+        Запускает периодический сброс в текущем event loop
+        """
+        self._stopping = False
+        self._flush_requested = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Останавливает периодический сброс и записывает остаток
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def add(
+            self,
+            id_notification: int,
+            status: Literal["sent", "failed", "retry", "deferred"],
+            delay: Optional[float] = None,
+    ):
+        """
+        Добавляет результат отправки в буфер
+
+        :param id_notification: id уведомления
+        :param status: итоговый статус, "retry" для неудачной
+         отправки, которую нужно повторить, или "deferred" для
+         невыполненной отправки, которую нужно отложить
+        :param delay: задержка "deferred" в секундах, округляется
+         вверх до целых, None - defer_delay
+        """
+        if status == "deferred":
+            delay = self._defer_delay if delay is None else math.ceil(delay)
+            self._deferred[delay].append(id_notification)
+        else:
+            self._pending[status].append(id_notification)
+        self._size += 1
+        if (
+                self._size >= self._max_batch
+                and self._flush_requested is not None
+        ):
+            self._flush_requested.set()
+
+    async def flush(self):
+        """
+        Записывает накопленные статусы в БД.
+
+        При ошибке записи результаты возвращаются в буфер
+        и будут записаны при следующем сбросе.
+        """
+        if not self._size:
+            return
+        statuses = dict(self._pending)
+        deferred = dict(self._deferred)
+        self._pending = defaultdict(list)
+        self._deferred = defaultdict(list)
+        self._size = 0
+        retry_ids = statuses.pop("retry", [])
+        try:
+            async with self._session_factory() as session:
+                repository = NotificationRepository(
+                    session,
+                    cache=self._cache,
+                    status_hub=self._status_hub,
+                )
+                updated = await repository.update_statuses(statuses)
+                logger.debug("записано статусов уведомлений: %i", updated)
+                if retry_ids:
+                    scheduled = await repository.schedule_retries(
+                        retry_ids,
+                        max_attempts=self._max_attempts,
+                        base_delay=self._retry_delay,
+                        max_delay=self._retry_max_delay,
+                    )
+                    retry_ids = []
+                    notification_retries.inc(
+                        "scheduled",
+                        amount=scheduled["pending"],
+                    )
+                    notification_retries.inc(
+                        "exhausted",
+                        amount=scheduled["failed"],
+                    )
+                    logger.info(
+                        "запланировано повторов отправки: %i, "
+                        "исчерпали попытки: %i",
+                        scheduled["pending"],
+                        scheduled["failed"],
+                    )
+                for delay in list(deferred):
+                    count = await repository.defer(
+                        deferred.pop(delay),
+                        delay=delay,
+                    )
+                    logger.info(
+                        "отложено уведомлений на %ss: %i",
+                        delay,
+                        count,
+                    )
+        except Exception as unexpected_error:
+            logger.error(
+                "ошибка записи статусов уведомлений: %s",
+                unexpected_error
+            )
+            if retry_ids:
+                statuses["retry"] = retry_ids
+            for status, ids in statuses.items():
+                self._pending[status].extend(ids)
+                self._size += len(ids)
+            for delay, ids in deferred.items():
+                self._deferred[delay].extend(ids)
+                self._size += len(ids)
+
+    async def _run(self):
+        """
+        Цикл сброса по размеру буфера или по таймеру
+        """
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(),
+                    self._flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
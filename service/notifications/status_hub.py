@@ -0,0 +1,297 @@
+"""
+Модуль рассылки событий смены статусов уведомлений подписчикам.
+
+Репозиторий после записи статусов публикует события в хаб процесса,
+который раздает их подпискам пользователей (WebSocket клиентам),
+а в той же транзакции отправляет их через NOTIFY: хабы других
+экземпляров API получают события через LISTEN, поэтому клиент видит
+статусы, записанные любым процессом, в том числе обработчиком очереди.
+Полученные так события сбрасывают и кэш истории пользователей процесса.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_config, pg_config
+from schemas.notifications import NotificationStatusEventSchema
+from service.notifications.cache import (
+    NotificationHistoryCache,
+    notification_history_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+# канал LISTEN/NOTIFY событий статусов
+STATUS_CHANNEL = "notification_status"
+
+# число событий в одном NOTIFY: размер сообщения ограничен 8000 байт
+NOTIFY_CHUNK_SIZE = 100
+
+
+class StatusSubscription:
+    """
+    Подписка на события статусов уведомлений пользователя.
+
+    Очередь подписки ограничена: если клиент не успевает
+    забирать события, подписка закрывается с признаком
+    overflowed, и клиент должен переподключиться и перечитать
+    историю, а не получать события с пропусками.
+    """
+    def __init__(self, user_id: int, queue_size: int):
+        """
+        :param user_id: id пользователя
+        :param queue_size: максимум непрочитанных событий
+        """
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size + 1)
+        self._queue_size = queue_size
+        self._closed = False
+
+    def put(self, event: NotificationStatusEventSchema):
+        """
+        Добавление события без ожидания
+        """
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._queue_size:
+            self.overflowed = True
+            self.close()
+            return
+        self._queue.put_nowait(event)
+
+    def close(self):
+        """
+        Закрытие подписки: get вернет None после уже
+        полученных событий (при переполнении - сразу)
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.overflowed:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[NotificationStatusEventSchema]:
+        """
+        Следующее событие
+
+        :return: событие или None, если подписка закрыта
+        """
+        return await self._queue.get()
+
+
+class StatusHub:
+    """
+    Хаб событий смены статусов уведомлений
+    """
+    def __init__(
+            self,
+            dsn: str,
+            queue_size: int,
+            reconnect_delay: float,
+            channel: str = STATUS_CHANNEL,
+            cache: Optional[NotificationHistoryCache] = None,
+    ):
+        """
+        :param dsn: DSN соединения для LISTEN
+        :param queue_size: максимум непрочитанных событий подписки
+        :param reconnect_delay: пауза перед переподключением LISTEN
+         и между проверками соединения в секундах
+        :param channel: канал LISTEN/NOTIFY
+        :param cache: кэш истории, который сбрасывается для
+         пользователей из событий других экземпляров
+        """
+        self._dsn = dsn
+        self._queue_size = queue_size
+        self._reconnect_delay = reconnect_delay
+        self._channel = channel
+        # события своего процесса уже разосланы напрямую,
+        # по этому идентификатору они пропускаются при LISTEN
+        self._origin = uuid.uuid4().hex
+        self._subscriptions: Dict[int, Set[StatusSubscription]] = (
+            defaultdict(set)
+        )
+        self._cache = cache
+        # ссылки на задачи сброса кэша, чтобы их не собрал GC
+        self._invalidations: Set[asyncio.Task] = set()
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriptions(self) -> int:
+        """
+        Число активных подписок
+        """
+        return sum(len(items) for items in self._subscriptions.values())
+
+    def start(self):
+        """
+        Запускает получение событий других экземпляров
+        в текущем event loop
+        """
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """
+        Останавливает получение событий и закрывает подписки
+        """
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._invalidations:
+            await asyncio.gather(*self._invalidations)
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+
+    @asynccontextmanager
+    async def subscribe(
+            self,
+            user_id: int,
+    ) -> AsyncIterator[StatusSubscription]:
+        """
+        Подписка на события статусов уведомлений пользователя
+        на время контекста
+
+        :param user_id: id пользователя
+        """
+        subscription = StatusSubscription(user_id, self._queue_size)
+        self._subscriptions[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self._subscriptions.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[user_id]
+
+    def publish(self, events: List[NotificationStatusEventSchema]):
+        """
+        Передача событий подпискам процесса
+
+        :param events: события смены статусов
+        """
+        for event in events:
+            for subscription in self._subscriptions.get(event.user_id, ()):
+                subscription.put(event)
+
+    async def notify(
+            self,
+            session: AsyncSession,
+            events: List[NotificationStatusEventSchema],
+    ):
+        """
+        Отправка событий другим экземплярам через NOTIFY в текущей
+        транзакции: они будут доставлены только после коммита
+
+        :param session: сессия, в которой записаны статусы
+        :param events: события смены статусов
+        """
+        for start in range(0, len(events), NOTIFY_CHUNK_SIZE):
+            payload = json.dumps(
+                {
+                    "origin": self._origin,
+                    "events": [
+                        [event.id_notification, event.user_id, event.status]
+                        for event in events[start:start + NOTIFY_CHUNK_SIZE]
+                    ],
+                },
+                separators=(",", ":"),
+            )
+            await session.execute(
+                select(func.pg_notify(self._channel, payload))
+            )
+
+    async def _listen(self):
+        """
+        Цикл LISTEN с переподключением при потере соединения.
+        События, отправленные, пока соединения не было, теряются:
+        клиент перечитывает историю при переподключении
+        """
+        logger.info("получение событий статусов запущено")
+        while not self._stopping.is_set():
+            try:
+                connection = await asyncpg.connect(self._dsn)
+            except Exception as unexpected_error:
+                logger.error(
+                    "ошибка подключения для событий статусов: %s",
+                    unexpected_error
+                )
+                await self._wait_stopping(self._reconnect_delay)
+                continue
+            try:
+                await connection.add_listener(self._channel, self._on_notify)
+                while (
+                        not self._stopping.is_set()
+                        and not connection.is_closed()
+                ):
+                    await self._wait_stopping(self._reconnect_delay)
+            except Exception as unexpected_error:
+                logger.error(
+                    "ошибка получения событий статусов: %s",
+                    unexpected_error
+                )
+            finally:
+                if not connection.is_closed():
+                    await connection.close()
+        logger.info("получение событий статусов остановлено")
+
+    def _on_notify(self, _connection, _pid, _channel, payload: str):
+        """
+        Разбор NOTIFY другого экземпляра, сброс кэша истории
+        получателей и передача событий подпискам
+        """
+        try:
+            message = json.loads(payload)
+            if message["origin"] == self._origin:
+                return
+            events = [
+                NotificationStatusEventSchema(
+                    id_notification=id_notification,
+                    user_id=user_id,
+                    status=status,
+                )
+                for id_notification, user_id, status in message["events"]
+            ]
+        except (ValueError, KeyError, TypeError) as err:
+            logger.warning("некорректное событие статусов: %s", err)
+            return
+        if self._cache is not None:
+            task = asyncio.create_task(self._cache.invalidate_users(
+                {event.user_id for event in events}
+            ))
+            self._invalidations.add(task)
+            task.add_done_callback(self._invalidations.discard)
+        self.publish(events)
+
+    async def _wait_stopping(self, timeout: float):
+        """
+        Пауза, прерываемая запросом остановки
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+notification_status_hub: Optional[StatusHub] = None
+if app_config.status_push_enabled:
+    notification_status_hub = StatusHub(
+        dsn=pg_config.dsn,
+        queue_size=app_config.status_push_queue_size,
+        reconnect_delay=app_config.status_push_reconnect_delay,
+        cache=notification_history_cache,
+    )
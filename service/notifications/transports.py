@@ -0,0 +1,463 @@
+"""
+Модуль транспортов для отправки уведомлений
+во внешние сервисы с переиспользованием соединений
+"""
+import asyncio
+import base64
+import logging
+import re
+import socket
+import ssl
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from core.config import SmtpConfig, TelegramConfig
+from service.notifications.exceptions import SendError
+
+logger = logging.getLogger(__name__)
+
+CRLF = b"\r\n"
+
+# точка в начале строки тела письма удваивается (RFC 5321, 4.5.2)
+_LEADING_DOT = re.compile(rb"^\.", re.MULTILINE)
+
+
+class TelegramTransport:
+    """
+    Транспорт Telegram Bot API.
+
+    Все запросы идут через один httpx.AsyncClient с пулом
+    keep-alive соединений, который создается при старте
+    приложения и закрывается при остановке.
+    """
+    def __init__(
+            self,
+            config: TelegramConfig,
+            transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        :param config: конфигурация Telegram Bot API
+        :param transport: транспорт httpx (для подмены в тестах)
+        """
+        self._config = config
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """
+        Создает пул соединений
+        """
+        if (
+                self._config.token is None
+                or not self._config.token.get_secret_value()
+        ):
+            raise ValueError("Не задан TELEGRAM_TOKEN")
+        self._client = httpx.AsyncClient(
+            base_url=(
+                f"{self._config.api_url}/"
+                f"bot{self._config.token.get_secret_value()}/"
+            ),
+            limits=httpx.Limits(
+                max_connections=self._config.pool_size,
+                max_keepalive_connections=self._config.pool_size,
+                keepalive_expiry=self._config.keepalive,
+            ),
+            timeout=self._config.timeout,
+            transport=self._transport,
+        )
+
+    async def close(self):
+        """
+        Закрывает пул соединений
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send_message(self, chat_id: int, text: str):
+        """
+        Отправка сообщения методом sendMessage
+
+        :param chat_id: id чата получателя
+        :param text: текст сообщения
+        :raises SendError: Bot API вернул ошибку
+        """
+        if self._client is None:
+            raise SendError("Транспорт Telegram не запущен")
+        try:
+            response = await self._client.post(
+                "sendMessage",
+                json={"chat_id": chat_id, "text": text},
+            )
+            payload = response.json()
+        except (httpx.HTTPError, ValueError) as err:
+            raise SendError(f"Ошибка запроса к Telegram: {err}") from err
+        if response.status_code != 200 or not payload.get("ok"):
+            raise SendError(
+                f"Telegram ответил {response.status_code}: "
+                f"{payload.get('description')}"
+            )
+
+
+class SmtpMessage(NamedTuple):
+    """
+    Письмо для отправки: конверт и содержимое
+    """
+    sender: str
+    recipient: str
+    content: bytes
+
+
+class SmtpConnection:
+    """
+    Асинхронное SMTP соединение.
+
+    Если сервер поддерживает PIPELINING (RFC 2920), команды
+    конверта и окончание данных предыдущего письма отправляются
+    одной записью, и на каждое письмо уходит один обмен с сервером.
+    """
+    def __init__(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter,
+            timeout: float,
+    ):
+        self._reader = reader
+        self._writer = writer
+        self._timeout = timeout
+        self.pipelining = False
+
+    @classmethod
+    async def open(cls, config: SmtpConfig) -> "SmtpConnection":
+        """
+        Открывает соединение: приветствие, EHLO и авторизация
+
+        :param config: конфигурация SMTP
+        :return: готовое к отправке соединение
+        """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                config.host,
+                config.port,
+                ssl=ssl.create_default_context() if config.use_tls else None,
+            ),
+            config.timeout,
+        )
+        connection = cls(reader, writer, config.timeout)
+        try:
+            await connection._expect(220)
+            code, lines = await connection._command(
+                f"EHLO {socket.getfqdn()}"
+            )
+            if code != 250:
+                raise SendError(f"SMTP сервер отклонил EHLO: {code}")
+            extensions = {
+                line.split()[0].upper() for line in lines[1:] if line
+            }
+            connection.pipelining = "PIPELINING" in extensions
+            if config.username:
+                credentials = (
+                    f"\0{config.username}\0"
+                    f"{config.password.get_secret_value()}"
+                    if config.password else f"\0{config.username}\0"
+                )
+                code, _ = await connection._command(
+                    "AUTH PLAIN "
+                    + base64.b64encode(credentials.encode()).decode()
+                )
+                if code != 235:
+                    raise SendError(f"Ошибка SMTP авторизации: {code}")
+        except BaseException:
+            connection.abort()
+            raise
+        return connection
+
+    async def send_messages(self, messages: List[SmtpMessage]) -> List[bool]:
+        """
+        Отправка нескольких писем в рамках одной SMTP сессии
+
+        :param messages: письма
+        :return: результат отправки каждого письма
+        """
+        if not self.pipelining:
+            return [await self._send_sequential(msg) for msg in messages]
+
+        results = [False] * len(messages)
+        outgoing = b""
+        # индекс письма, ответ на окончание данных которого ожидается
+        awaiting_data: Optional[int] = None
+        need_reset = False
+        for index, message in enumerate(messages):
+            if need_reset:
+                outgoing += b"RSET" + CRLF
+            outgoing += _envelope(message)
+            await self._write(outgoing)
+            outgoing = b""
+
+            if awaiting_data is not None:
+                code, _ = await self._read_reply()
+                if awaiting_data >= 0:
+                    results[awaiting_data] = code == 250
+                awaiting_data = None
+            if need_reset:
+                await self._read_reply()
+                need_reset = False
+
+            mail_code, _ = await self._read_reply()
+            rcpt_code, _ = await self._read_reply()
+            data_code, _ = await self._read_reply()
+            accepted = mail_code == 250 and rcpt_code in (250, 251)
+            if data_code == 354:
+                outgoing = (
+                    _stuff(message.content) if accepted else b""
+                ) + b"." + CRLF
+                awaiting_data = index if accepted else -1
+            else:
+                need_reset = mail_code == 250
+
+        if outgoing:
+            await self._write(outgoing)
+            code, _ = await self._read_reply()
+            if awaiting_data is not None and awaiting_data >= 0:
+                results[awaiting_data] = code == 250
+        if need_reset:
+            await self._command("RSET")
+        return results
+
+    async def noop(self) -> bool:
+        """
+        Проверка, что соединение живо
+        """
+        try:
+            code, _ = await self._command("NOOP")
+        except (SendError, OSError, asyncio.TimeoutError):
+            return False
+        return code == 250
+
+    async def quit(self):
+        """
+        Корректное закрытие сессии
+        """
+        try:
+            await self._command("QUIT")
+        except (SendError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.abort()
+
+    def abort(self):
+        """
+        Закрытие соединения без QUIT
+        """
+        self._writer.close()
+
+    async def _send_sequential(self, message: SmtpMessage) -> bool:
+        """
+        Отправка одного письма без PIPELINING
+        """
+        for command, expected in (
+                (f"MAIL FROM:<{message.sender}>", (250,)),
+                (f"RCPT TO:<{message.recipient}>", (250, 251)),
+                ("DATA", (354,)),
+        ):
+            code, _ = await self._command(command)
+            if code not in expected:
+                await self._command("RSET")
+                return False
+        await self._write(_stuff(message.content) + b"." + CRLF)
+        code, _ = await self._read_reply()
+        return code == 250
+
+    async def _command(self, command: str) -> Tuple[int, List[str]]:
+        """
+        Отправка команды и чтение ответа
+        """
+        await self._write(command.encode() + CRLF)
+        return await self._read_reply()
+
+    async def _expect(self, expected: int):
+        """
+        Чтение ответа с проверкой кода
+        """
+        code, lines = await self._read_reply()
+        if code != expected:
+            raise SendError(f"SMTP сервер ответил {code}: {lines}")
+
+    async def _write(self, data: bytes):
+        """
+        Запись в сокет с ожиданием отправки буфера
+        """
+        self._writer.write(data)
+        await asyncio.wait_for(self._writer.drain(), self._timeout)
+
+    async def _read_reply(self) -> Tuple[int, List[str]]:
+        """
+        Чтение (возможно многострочного) ответа сервера
+
+        :return: код ответа и строки текста
+        """
+        lines = []
+        while True:
+            raw_line = await asyncio.wait_for(
+                self._reader.readline(),
+                self._timeout
+            )
+            if not raw_line:
+                raise SendError("SMTP сервер закрыл соединение")
+            line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+            lines.append(line[4:])
+            if len(line) < 4 or line[3] != "-":
+                try:
+                    return int(line[:3]), lines
+                except ValueError as err:
+                    raise SendError(
+                        f"Некорректный ответ SMTP: {line}"
+                    ) from err
+
+
+class SmtpConnectionPool:
+    """
+    Пул SMTP соединений с ограничением размера и keep-alive.
+
+    Соединение, простоявшее дольше keepalive, перед повторным
+    использованием проверяется командой NOOP. Соединение, на котором
+    произошла ошибка, закрывается и не возвращается в пул.
+    """
+    def __init__(self, config: SmtpConfig):
+        """
+        :param config: конфигурация SMTP
+        """
+        self._config = config
+        self._idle: List[Tuple[SmtpConnection, float]] = []
+        self._semaphore = asyncio.Semaphore(config.pool_size)
+        self.opened = 0
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[SmtpConnection]:
+        """
+        Выдает соединение из пула или открывает новое
+        """
+        async with self._semaphore:
+            connection = await self._take_idle()
+            if connection is None:
+                connection = await SmtpConnection.open(self._config)
+                self.opened += 1
+            try:
+                yield connection
+            except BaseException:
+                connection.abort()
+                raise
+            self._idle.append((connection, time.monotonic()))
+
+    async def close(self):
+        """
+        Закрывает все простаивающие соединения
+        """
+        idle, self._idle = self._idle, []
+        await asyncio.gather(
+            *(connection.quit() for connection, _ in idle)
+        )
+
+    async def _take_idle(self) -> Optional[SmtpConnection]:
+        """
+        Возвращает живое простаивающее соединение, если оно есть
+        """
+        while self._idle:
+            connection, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self._config.keepalive:
+                return connection
+            if await connection.noop():
+                return connection
+            connection.abort()
+        return None
+
+
+class SmtpTransport:
+    """
+    SMTP транспорт для email уведомлений.
+
+    Письма отправляются через пул постоянных соединений,
+    несколько писем уходят в одной SMTP сессии.
+    """
+    def __init__(self, config: SmtpConfig):
+        """
+        :param config: конфигурация SMTP
+        """
+        self._config = config
+        self._pool: Optional[SmtpConnectionPool] = None
+
+    @property
+    def pool(self) -> Optional[SmtpConnectionPool]:
+        """
+        Пул соединений (None, пока транспорт не запущен)
+        """
+        return self._pool
+
+    async def start(self):
+        """
+        Создает пул соединений
+        """
+        self._pool = SmtpConnectionPool(self._config)
+
+    async def close(self):
+        """
+        Закрывает соединения пула
+        """
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def send(self, messages: List[SmtpMessage]) -> List[bool]:
+        """
+        Отправка писем: по messages_per_connection писем
+        на соединение, соединения используются параллельно
+
+        :param messages: письма
+        :return: результат отправки каждого письма
+        """
+        if self._pool is None:
+            raise SendError("SMTP транспорт не запущен")
+        step = self._config.messages_per_connection
+        chunks = await asyncio.gather(*(
+            self._send_chunk(messages[start:start + step])
+            for start in range(0, len(messages), step)
+        ))
+        return [result for chunk in chunks for result in chunk]
+
+    async def _send_chunk(self, messages: List[SmtpMessage]) -> List[bool]:
+        """
+        Отправка части писем через одно соединение пула.
+
+        Ошибка соединения помечает неотправленными только письма
+        этой части, остальные части не затрагиваются.
+        """
+        try:
+            async with self._pool.connection() as connection:
+                return await connection.send_messages(messages)
+        except (SendError, OSError, asyncio.TimeoutError) as err:
+            logger.warning("ошибка SMTP соединения: %s", err)
+            return [False] * len(messages)
+
+
+def _envelope(message: SmtpMessage) -> bytes:
+    """
+    Команды конверта письма для конвейерной отправки
+    """
+    return (
+        f"MAIL FROM:<{message.sender}>\r\n"
+        f"RCPT TO:<{message.recipient}>\r\n"
+        "DATA\r\n"
+    ).encode()
+
+
+def _stuff(content: bytes) -> bytes:
+    """
+    Подготовка тела письма к передаче после DATA
+    """
+    content = _LEADING_DOT.sub(b"..", content)
+    if not content.endswith(CRLF):
+        content += CRLF
+    return content
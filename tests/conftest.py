@@ -0,0 +1,36 @@
+"""
+Общие фикстуры тестов
+"""
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from core.config import pg_config
+from models.notifications import BaseModel
+
+
+@pytest.fixture(scope="session")
+def db_engine():
+    """
+    движок тестовой БД с созданной схемой. Без пула соединений,
+    поэтому движок можно использовать в разных asyncio.run
+    """
+    engine = create_async_engine(pg_config.async_url, poolclass=NullPool)
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+    asyncio.run(create_schema())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    """
+    фабрика сессий тестовой БД
+    """
+    return async_sessionmaker(db_engine, expire_on_commit=False)
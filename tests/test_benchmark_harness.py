@@ -0,0 +1,20 @@
+"""
+Тесты сводной статистики бенчмарков
+"""
+from benchmarks.harness import percentile, summarize
+
+
+def test_summarize_percentiles():
+    """
+    перцентили считаются с интерполяцией, задержки в миллисекундах
+    """
+    samples = [index / 1000 for index in range(1, 101)]
+
+    summary = summarize(samples, elapsed=2.0)
+
+    assert percentile(sorted(samples), 0.5) == 0.0505
+    assert summary["count"] == 100
+    assert summary["throughput_per_s"] == 50
+    assert summary["p50_ms"] == 50.5
+    assert summary["p99_ms"] == 99.01
+    assert summary["max_ms"] == 100
@@ -0,0 +1,99 @@
+"""
+Тесты кэша истории уведомлений
+"""
+import asyncio
+
+from schemas.notifications import NotificationPageSchema
+from service.notifications.cache import (
+    InMemoryCacheBackend,
+    NotificationHistoryCache,
+)
+
+
+def test_in_memory_backend_evicts_lru_and_expired():
+    """
+    LRU-вытеснение по числу записей и истечение по TTL
+    """
+    async def scenario():
+        backend = InMemoryCacheBackend(ttl=60, max_entries=2, max_bytes=100)
+        await backend.set(1, "a", "A", size=10)
+        await backend.set(1, "b", "B", size=10)
+        await backend.get("a")
+        await backend.set(2, "c", "C", size=10)
+        evicted = await backend.get("b")
+
+        await backend.set(2, "big", "X", size=1000)
+        too_big = await backend.get("big")
+
+        expiring = InMemoryCacheBackend(
+            ttl=0.01,
+            max_entries=10,
+            max_bytes=100
+        )
+        await expiring.set(1, "a", "A", size=10)
+        await asyncio.sleep(0.02)
+        expired = await expiring.get("a")
+        return evicted, await backend.get("a"), too_big, expired
+
+    evicted, kept, too_big, expired = asyncio.run(scenario())
+
+    assert evicted is None
+    assert kept == "A"
+    assert too_big is None
+    assert expired is None
+
+
+def test_history_cache_counts_and_invalidates():
+    """
+    повторное чтение берется из кэша, а инвалидация пользователя
+    заставляет загрузить страницу заново
+    """
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return NotificationPageSchema(items=[], next_cursor=None)
+
+    async def scenario():
+        cache = NotificationHistoryCache(
+            InMemoryCacheBackend(ttl=60, max_entries=10, max_bytes=10000)
+        )
+        for _ in range(2):
+            await cache.get_or_load(1, None, None, 50, None, loader)
+        await cache.invalidate_users({1})
+        await cache.get_or_load(1, None, None, 50, None, loader)
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert len(loads) == 2
+    assert (stats.hits, stats.misses, stats.invalidations) == (1, 2, 1)
+    assert stats.entries == 1
+
+
+def test_history_cache_invalidate_all():
+    """
+    сброс всего кэша заставляет загрузить заново страницы
+    всех пользователей
+    """
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return NotificationPageSchema(items=[], next_cursor=None)
+
+    async def scenario():
+        cache = NotificationHistoryCache(
+            InMemoryCacheBackend(ttl=60, max_entries=10, max_bytes=10000)
+        )
+        for user_id in (1, 2):
+            await cache.get_or_load(user_id, None, None, 50, None, loader)
+        cache.invalidate_all()
+        for user_id in (1, 2, 1):
+            await cache.get_or_load(user_id, None, None, 50, None, loader)
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert len(loads) == 4
+    assert (stats.hits, stats.misses, stats.invalidations) == (1, 4, 1)
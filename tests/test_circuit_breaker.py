@@ -0,0 +1,79 @@
+"""
+Тесты circuit breaker каналов отправки
+"""
+import asyncio
+
+import pytest
+
+from schemas.notifications import NotificationSchema
+from service.notifications.exceptions import CircuitOpenError, SendError
+from service.notifications.notification_sender import (
+    NotificationHandler,
+    NotificationHandlerFactory,
+)
+from utils.circuit_breaker import CircuitBreaker
+
+
+class FlakyHandler(NotificationHandler):
+    """
+    обработчик, который падает, пока провайдер "недоступен"
+    """
+    def __init__(self):
+        self.available = False
+        self.calls = 0
+
+    async def send(self, notification: NotificationSchema) -> bool:
+        self.calls += 1
+        if not self.available:
+            raise SendError("provider is down")
+        return True
+
+
+def test_circuit_opens_and_recovers():
+    """
+    после превышения доли ошибок отправки не выполняются,
+    по истечении таймаута пробная отправка замыкает цепь
+    """
+    notifications = [
+        NotificationSchema(
+            id_notification=id_notification,
+            user_id=1,
+            message="test",
+            notification_type="email",
+            status="pending",
+        )
+        for id_notification in range(1, 5)
+    ]
+    inner = FlakyHandler()
+    factory = NotificationHandlerFactory()
+    factory.register_handler(
+        "email",
+        inner,
+        breaker=CircuitBreaker(
+            failure_rate=0.5,
+            min_calls=4,
+            window=60,
+            open_timeout=0.1,
+        ),
+    )
+    handler = factory.get_handler("email")
+
+    async def scenario():
+        failed = await handler.send_batch(notifications)
+        with pytest.raises(CircuitOpenError):
+            await handler.send_batch(notifications)
+        opened = factory.circuit_stats()["email"]
+
+        await asyncio.sleep(0.15)
+        inner.available = True
+        recovered = await handler.send_batch(notifications[:1])
+        return failed, opened, recovered
+
+    failed, opened, recovered = asyncio.run(scenario())
+
+    assert failed == [False] * 4
+    assert opened.state == "open"
+    assert opened.open_count == 1
+    assert inner.calls == 5
+    assert recovered == [True]
+    assert factory.circuit_stats()["email"].state == "closed"
@@ -0,0 +1,96 @@
+"""
+Тесты объединения уведомлений в сводки
+"""
+import asyncio
+from typing import List
+
+from schemas.notifications import NotificationSchema
+from service.notifications.coalescer import NotificationCoalescer
+from service.notifications.dispatcher import NotificationDispatcher
+
+
+def _notification(
+        id_notification: int,
+        user_id: int,
+        priority: str = "normal",
+) -> NotificationSchema:
+    """
+    схема уведомления для тестов
+    """
+    return NotificationSchema(
+        id_notification=id_notification,
+        user_id=user_id,
+        message=f"test {id_notification}",
+        notification_type="telegram",
+        status="pending",
+        priority=priority,
+    )
+
+
+async def _coalesce(window: float, stop_after: float):
+    """
+    отправляет уведомления двум получателям через объединитель
+    и возвращает отправленные пачки
+    """
+    sent = []
+
+    async def process(notifications: List[NotificationSchema]):
+        sent.extend(
+            (notification.notification_ids, notification.message)
+            for notification in notifications
+        )
+
+    coalescer = NotificationCoalescer(
+        process=process,
+        submit=lambda digest: dispatcher.submit(digest),
+        windows={"telegram": window},
+        max_count=3,
+    )
+    dispatcher = NotificationDispatcher(
+        process=coalescer.process,
+        concurrency={"telegram": 1},
+        queue_size=10,
+    )
+    coalescer.start()
+    dispatcher.start()
+    for notification in (
+        _notification(1, user_id=1),
+        _notification(2, user_id=1),
+        _notification(3, user_id=1, priority="high"),
+        _notification(4, user_id=2),
+        _notification(5, user_id=2),
+        _notification(6, user_id=2),
+        _notification(7, user_id=2),
+    ):
+        dispatcher.submit(notification)
+    await asyncio.sleep(stop_after)
+    buffered = coalescer.buffered
+    coalescer.stop()
+    await dispatcher.stop()
+    return sent, buffered
+
+
+def test_coalescer_merges_by_window_and_count():
+    """
+    уведомления получателя объединяются по окну и по числу,
+    срочные уведомления отправляются сразу
+    """
+    sent, buffered = asyncio.run(_coalesce(window=0.1, stop_after=0.3))
+
+    assert buffered == 0
+    assert sent == [
+        ([3], "test 3"),
+        ([4, 5, 6], "test 4\n\ntest 5\n\ntest 6"),
+        ([1, 2], "test 1\n\ntest 2"),
+        ([7], "test 7"),
+    ]
+
+
+def test_coalescer_flushes_on_stop():
+    """
+    накопленные сводки отправляются при остановке, не дожидаясь окна
+    """
+    sent, buffered = asyncio.run(_coalesce(window=60, stop_after=0.05))
+
+    assert buffered == 3
+    assert sorted(ids for ids, _ in sent) == [[1, 2], [3], [4, 5, 6], [7]]
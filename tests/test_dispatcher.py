@@ -0,0 +1,226 @@
+"""
+Тесты диспетчера отправки
+"""
+import asyncio
+from typing import List
+
+import pytest
+
+from schemas.notifications import NotificationSchema
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import (
+    DispatcherOverloadedError,
+    SendError,
+)
+from service.notifications.notification_sender import NotificationHandler
+
+
+def _notification(
+        id_notification: int,
+        priority: str = "normal",
+) -> NotificationSchema:
+    """
+    схема уведомления для тестов
+    """
+    return NotificationSchema(
+        id_notification=id_notification,
+        user_id=1,
+        message="test",
+        notification_type="telegram",
+        status="pending",
+        priority=priority,
+    )
+
+
+async def _fill_dispatcher():
+    """
+    заполняет очередь диспетчера, пока воркер занят
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def process(notifications: List[NotificationSchema]):
+        await release.wait()
+        processed.extend(
+            notification.id_notification for notification in notifications
+        )
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"telegram": 1},
+        queue_size=2,
+    )
+    dispatcher.start()
+    dispatcher.submit(_notification(1))
+    await asyncio.sleep(0)
+    dispatcher.submit(_notification(2))
+    dispatcher.submit(_notification(3))
+    stats = dispatcher.stats()["telegram"]
+
+    with pytest.raises(DispatcherOverloadedError):
+        dispatcher.submit(_notification(4))
+
+    release.set()
+    await dispatcher.stop()
+    return stats, processed
+
+
+def test_dispatcher_backpressure():
+    """
+    воркер канала обрабатывает одно уведомление за раз,
+    переполненная очередь отклоняет новые уведомления,
+    а остановка дожидается всех принятых
+    """
+    stats, processed = asyncio.run(_fill_dispatcher())
+
+    assert stats.in_flight == 1
+    assert stats.queue_depth == 2
+    assert processed == [1, 2, 3]
+
+
+async def _collect_batches():
+    """
+    ставит в очередь уведомления, пока воркер занят,
+    и возвращает размеры пачек, переданных в process
+    """
+    release = asyncio.Event()
+    batches = []
+
+    async def process(notifications: List[NotificationSchema]):
+        await release.wait()
+        batches.append(len(notifications))
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"telegram": 1},
+        queue_size=10,
+        batch_size={"telegram": 3},
+    )
+    dispatcher.start()
+    for id_notification in range(1, 6):
+        dispatcher.submit(_notification(id_notification))
+        await asyncio.sleep(0)
+    release.set()
+    await dispatcher.stop()
+    return batches
+
+
+def test_dispatcher_groups_waiting_notifications():
+    """
+    ожидающие в очереди уведомления отправляются пачками
+    не больше batch_size
+    """
+    batches = asyncio.run(_collect_batches())
+
+    assert batches == [1, 3, 1]
+
+
+async def _submit_twice():
+    """
+    повторно ставит уведомления, которые ждут в очереди
+    или уже отправляются, и уведомление после отправки
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def process(notifications: List[NotificationSchema]):
+        await release.wait()
+        processed.extend(
+            notification.id_notification for notification in notifications
+        )
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"telegram": 1},
+        queue_size=10,
+    )
+    dispatcher.start()
+    dispatcher.submit(_notification(1))
+    await asyncio.sleep(0)
+    dispatcher.submit(_notification(2))
+    held = sorted(dispatcher.held_ids)
+    dispatcher.submit(_notification(1))
+    dispatcher.submit(_notification(2))
+    release.set()
+    await dispatcher.stop()
+    dispatcher.start()
+    dispatcher.submit(_notification(1))
+    await dispatcher.stop()
+    return held, processed
+
+
+def test_dispatcher_skips_held_notifications():
+    """
+    уведомление, повторно захваченное из БД, пока оно в очереди
+    или отправляется, не отправляется второй раз
+    """
+    held, processed = asyncio.run(_submit_twice())
+
+    assert held == [1, 2]
+    assert processed == [1, 2, 1]
+
+
+async def _drain_lanes():
+    """
+    ставит в очередь массовую рассылку и срочные уведомления,
+    пока воркер занят, и возвращает порядок обработки
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def process(notifications: List[NotificationSchema]):
+        await release.wait()
+        processed.extend(
+            notification.id_notification for notification in notifications
+        )
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"telegram": 1},
+        queue_size=10,
+        weights={"high": 3, "low": 1},
+    )
+    dispatcher.start()
+    dispatcher.submit(_notification(1, "low"))
+    await asyncio.sleep(0)
+    for id_notification in range(2, 7):
+        dispatcher.submit(_notification(id_notification, "low"))
+    for id_notification in range(101, 104):
+        dispatcher.submit(_notification(id_notification, "high"))
+    lanes = dispatcher.stats()["telegram"].lanes
+    release.set()
+    await dispatcher.stop()
+    return lanes, processed
+
+
+def test_dispatcher_weighted_fair_lanes():
+    """
+    срочные уведомления обходят массовую рассылку в доле своего веса,
+    но рассылка не останавливается полностью
+    """
+    lanes, processed = asyncio.run(_drain_lanes())
+
+    assert lanes["high"].queue_depth == 3
+    assert lanes["low"].queue_depth == 5
+    assert processed == [1, 101, 102, 2, 103, 3, 4, 5, 6]
+
+
+def test_handler_send_batch_default_fan_out():
+    """
+    send_batch по умолчанию отправляет через send
+    и возвращает результат по каждому уведомлению
+    """
+    class FlakyHandler(NotificationHandler):
+        """
+        обработчик отправляет только нечетные id, а на id=3 падает
+        """
+        async def send(self, notification: NotificationSchema) -> bool:
+            if notification.id_notification == 3:
+                raise SendError("network down")
+            return notification.id_notification % 2 == 1
+
+    results = asyncio.run(
+        FlakyHandler().send_batch([_notification(i) for i in range(1, 5)])
+    )
+
+    assert results == [True, False, False, False]
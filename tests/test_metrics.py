@@ -0,0 +1,136 @@
+"""
+Тесты метрик сервиса
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+from starlette import status
+
+from core.metrics import notifications_processed
+from core.tasks import send_notifications_background
+from main import app
+from schemas.notifications import NotificationSchema
+from utils.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    наблюдения попадают в заранее заданные корзины,
+    корзины выводятся накопительно
+    """
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "latency_seconds",
+        "test",
+        labels=("channel",),
+        buckets=(0.1, 1.0),
+    )
+    histogram.observe(0.05, "email")
+    histogram.observe(0.5, "email")
+    histogram.observe(3, "email")
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{channel="email",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{channel="email",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{channel="email",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{channel="email"} 3.55' in lines
+    assert 'latency_seconds_count{channel="email"} 3' in lines
+
+
+def test_metrics_endpoint():
+    """
+    длительность запросов учитывается по шаблону пути,
+    метрики пулов БД и диспетчера доступны на /metrics
+    """
+    with TestClient(app) as client:
+        client.get("/api/notifications/131")
+        response = client.get("/metrics")
+        pools = client.get("/api/monitoring/db-pools").json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/api/notifications/{user_id}",status="200"}'
+    ) in body
+    assert 'db_pool_checkout_seconds_count{pool="api"}' in body
+    assert 'db_pool_checked_out{pool="dispatch"}' in body
+    assert set(pools) == {"api", "dispatch"}
+    assert pools["api"]["checked_out"] == 0
+    assert 'dispatcher_queue_depth{channel="email"}' in body
+
+
+def test_failed_batch_counted_once():
+    """
+    непредвиденная ошибка отправки учитывается только как error,
+    а строки пачки планируются на повтор
+    """
+    notifications = [
+        NotificationSchema(
+            id_notification=id_notification,
+            user_id=146,
+            message="test",
+            notification_type="telegram",
+            status="pending",
+        )
+        for id_notification in (1, 2)
+    ]
+    error_before = notifications_processed.value("telegram", "error")
+    retry_before = notifications_processed.value("telegram", "retry")
+
+    with patch(
+            "core.tasks.notification_handler_factory.get_handler",
+            side_effect=RuntimeError("test"),
+    ), patch("core.tasks.status_flusher") as mock_flusher:
+        asyncio.run(send_notifications_background(notifications))
+
+    assert notifications_processed.value("telegram", "error") == (
+        error_before + 2
+    )
+    assert notifications_processed.value("telegram", "retry") == retry_before
+    assert [call.args for call in mock_flusher.add.call_args_list] == [
+        (1, "retry"),
+        (2, "retry"),
+    ]
+
+
+def test_throttled_user_deferred_without_sending():
+    """
+    уведомление получателя, превысившего лимит, откладывается
+    до появления токена и не передается обработчику
+    """
+    notifications = [
+        NotificationSchema(
+            id_notification=id_notification,
+            user_id=user_id,
+            message="test",
+            notification_type="telegram",
+            status="pending",
+        )
+        for id_notification, user_id in ((1, 148), (2, 149))
+    ]
+    throttled_before = notifications_processed.value("telegram", "throttled")
+
+    with patch(
+            "core.tasks.notification_rate_limiter.try_acquire_user",
+            side_effect=[0.0, 1.5],
+    ), patch(
+            "core.tasks.notification_handler_factory.get_handler",
+    ) as get_handler, patch("core.tasks.status_flusher") as mock_flusher:
+        get_handler.return_value.send_batch = AsyncMock(return_value=[True])
+        asyncio.run(send_notifications_background(notifications))
+
+    get_handler.return_value.send_batch.assert_awaited_once_with(
+        notifications[:1]
+    )
+    assert notifications_processed.value("telegram", "throttled") == (
+        throttled_before + 1
+    )
+    assert [call.args for call in mock_flusher.add.call_args_list] == [
+        (2, "deferred"),
+        (1, "sent"),
+    ]
+    assert mock_flusher.add.call_args_list[0].kwargs == {"delay": 1.5}
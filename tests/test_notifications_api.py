@@ -1,11 +1,15 @@
 """
 Тесты для API уведомлений
 """
-from unittest.mock import MagicMock, patch
+import json
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import patch
 import pytest
 from starlette import status
 from fastapi.testclient import TestClient
 from main import app
+from service.notifications.idempotency import IdempotencyCache
 
 
 @pytest.fixture
@@ -27,10 +31,9 @@ def test_create_notification_success(client):
         "type": "telegram"
     }
 
-    # мок фоновой задачи
-    with patch("api.notifications.BackgroundTasks") as MockBackgroundTasks:
-        mock_tasks = MagicMock()
-        MockBackgroundTasks.return_value = mock_tasks
+    # мок диспетчера отправки
+    with patch("api.notifications.notification_dispatcher") as mock_dispatcher:
+        mock_dispatcher.free_slots.return_value = 1
 
         response = client.post("/api/notifications/", json=request_data)
 
@@ -38,6 +41,7 @@ def test_create_notification_success(client):
     response_data = response.json()
     assert response_data["user_id"] == 123
     assert response_data["message"] == "Your code: 11111"
+    assert response_data["priority"] == "normal"
 
 
 def test_create_notification_validation_error(client):
@@ -68,3 +72,308 @@ def test_logical_error_empty_message(client):
     })
 
     assert response.status_code != 201, "пустое сообщение"
+
+
+def test_create_notifications_batch_json(client):
+    """
+    пакетное создание уведомлений из JSON массива
+    """
+    request_data = [
+        {"user_id": 124, "message": f"Campaign {i}", "type": "telegram"}
+        for i in range(3)
+    ]
+
+    response = client.post("/api/notifications/batch", json=request_data)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    response_data = response.json()
+    assert response_data["created"] == 3
+    assert len(set(response_data["ids"])) == 3
+
+
+def test_create_notifications_batch_ndjson(client):
+    """
+    пакетное создание уведомлений из NDJSON
+    """
+    body = "\n".join(
+        json.dumps({"user_id": 125, "message": f"Line {i}", "type": "email"})
+        for i in range(2)
+    )
+
+    response = client.post(
+        "/api/notifications/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["created"] == 2
+
+
+def test_create_notifications_batch_validation_error(client):
+    """
+    ошибка в одной строке NDJSON отклоняет всю пачку
+    """
+    body = "\n".join([
+        json.dumps({"user_id": 1, "message": "ok", "type": "telegram"}),
+        json.dumps({"user_id": 1, "message": "bad", "type": "sms"}),
+    ])
+
+    response = client.post(
+        "/api/notifications/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    assert response.json()["detail"][0]["loc"][:2] == ["body", 1]
+
+
+def test_create_notification_dispatcher_overloaded(client):
+    """
+    при заполненной очереди диспетчера уведомление не создается
+    """
+    request_data = {
+        "user_id": 127,
+        "message": "Your code: 33333",
+        "type": "telegram"
+    }
+
+    with patch("api.notifications.notification_dispatcher") as mock_dispatcher:
+        mock_dispatcher.free_slots.return_value = 0
+
+        response = client.post("/api/notifications/", json=request_data)
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert "Retry-After" in response.headers
+    mock_dispatcher.submit.assert_not_called()
+
+
+def test_create_scheduled_notification(client):
+    """
+    запланированное уведомление сохраняется без постановки
+    в очередь диспетчера, время без часового пояса отклоняется
+    """
+    request_data = {
+        "user_id": 131,
+        "message": "Good morning",
+        "type": "email",
+        "send_at": "2030-01-01T09:00:00+03:00",
+    }
+
+    with patch("api.notifications.notification_dispatcher") as mock_dispatcher:
+        mock_dispatcher.free_slots.return_value = 0
+
+        response = client.post("/api/notifications/", json=request_data)
+        naive_response = client.post(
+            "/api/notifications/",
+            json={**request_data, "send_at": "2030-01-01T09:00:00"},
+        )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert datetime.fromisoformat(response.json()["send_at"]) == datetime(
+        2030, 1, 1, 6, tzinfo=timezone.utc
+    )
+    mock_dispatcher.submit.assert_not_called()
+    assert naive_response.status_code == (
+        status.HTTP_422_UNPROCESSABLE_CONTENT
+    )
+
+
+def test_create_broadcast(client):
+    """
+    рассылка по диапазону получателей с подстановками
+    в шаблон, слишком большая рассылка отклоняется
+    """
+    request_data = {
+        "message": "Hi $name",
+        "type": "email",
+        "user_id_range": {"start": 132, "stop": 135},
+        "params": {"133": {"name": "Bob"}},
+        "send_at": "2030-01-01T09:00:00Z",
+    }
+
+    response = client.post("/api/notifications/broadcast", json=request_data)
+    with patch("api.notifications.app_config.broadcast_max_recipients", 2):
+        too_large_response = client.post(
+            "/api/notifications/broadcast",
+            json=request_data,
+        )
+    both_response = client.post(
+        "/api/notifications/broadcast",
+        json={**request_data, "user_ids": [132]},
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["created"] == 3
+    messages = [
+        client.get(f"/api/notifications/{user_id}").json()["items"][0]
+        for user_id in (132, 133)
+    ]
+    assert [item["message"] for item in messages] == ["Hi $name", "Hi Bob"]
+    assert all(item["priority"] == "low" for item in messages)
+    assert too_large_response.status_code == (
+        status.HTTP_413_CONTENT_TOO_LARGE
+    )
+    assert both_response.status_code == (
+        status.HTTP_422_UNPROCESSABLE_CONTENT
+    )
+
+
+def test_create_notification_idempotency_key(client):
+    """
+    повтор запроса с тем же ключом возвращает исходное уведомление
+    и не ставит его в очередь повторно, в том числе когда ключа
+    уже нет в кэше процесса
+    """
+    request_data = {
+        "user_id": 133,
+        "message": "Your code: 44444",
+        "type": "email"
+    }
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    with patch("api.notifications.notification_dispatcher") as mock_dispatcher:
+        mock_dispatcher.free_slots.return_value = 1
+
+        first = client.post(
+            "/api/notifications/",
+            json=request_data,
+            headers=headers,
+        )
+        cached = client.post(
+            "/api/notifications/",
+            json=request_data,
+            headers=headers,
+        )
+        with patch(
+                "api.notifications.idempotency_cache",
+                IdempotencyCache(ttl=60, max_entries=10),
+        ):
+            from_db = client.post(
+                "/api/notifications/",
+                json=request_data,
+                headers=headers,
+            )
+        conflict = client.post(
+            "/api/notifications/",
+            json={**request_data, "message": "Your code: 55555"},
+            headers=headers,
+        )
+
+    assert first.status_code == status.HTTP_201_CREATED
+    assert "Idempotent-Replayed" not in first.headers
+    for replay in (cached, from_db):
+        assert replay.status_code == status.HTTP_201_CREATED
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert replay.json() == first.json()
+    assert conflict.status_code == status.HTTP_409_CONFLICT
+    mock_dispatcher.submit.assert_called_once()
+
+
+def test_get_user_notifications_pagination(client):
+    """
+    keyset-пагинация истории уведомлений пользователя
+    """
+    user_id = 129
+    had_history = bool(
+        client.get(f"/api/notifications/{user_id}").json()["items"]
+    )
+    client.post(
+        "/api/notifications/batch",
+        json=[
+            {"user_id": user_id, "message": f"Page {i}", "type": "telegram"}
+            for i in range(3)
+        ],
+    )
+
+    first_page = client.get(
+        f"/api/notifications/{user_id}",
+        params={"limit": 2},
+    ).json()
+    second_page = client.get(
+        f"/api/notifications/{user_id}",
+        params={"limit": 2, "before_id": first_page["next_cursor"]},
+    ).json()
+
+    assert [item["message"] for item in first_page["items"]] == [
+        "Page 2",
+        "Page 1",
+    ]
+    assert first_page["next_cursor"] == first_page["items"][-1][
+        "id_notification"
+    ]
+    assert second_page["items"][0]["message"] == "Page 0"
+    assert second_page["items"][0]["type"] == "telegram"
+    if not had_history:
+        assert second_page["next_cursor"] is None
+
+
+def test_get_user_notifications_cache_invalidated_on_create(client):
+    """
+    закэшированная история сбрасывается при создании уведомления
+    """
+    user_id = 130
+    client.get(f"/api/notifications/{user_id}")
+    client.get(f"/api/notifications/{user_id}")
+
+    client.post("/api/notifications/", json={
+        "user_id": user_id,
+        "message": "Fresh",
+        "type": "telegram"
+    })
+    response = client.get(f"/api/notifications/{user_id}")
+
+    assert response.json()["items"][0]["message"] == "Fresh"
+    assert client.get("/api/monitoring/cache").json()["hits"] >= 1
+
+
+def test_export_user_notifications_ndjson(client):
+    """
+    выгрузка истории пользователя в NDJSON
+    """
+    user_id = 131
+    client.post(
+        "/api/notifications/batch",
+        json=[
+            {"user_id": user_id, "message": f"Export {i}", "type": "telegram"}
+            for i in range(3)
+        ],
+    )
+
+    response = client.get(f"/api/notifications/{user_id}/export")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) >= 3
+    assert lines[0]["user_id"] == user_id
+    assert lines[0]["type"] == "telegram"
+
+
+def test_push_user_statuses_websocket(client):
+    """
+    подписчик получает смену статуса уведомления без опроса истории
+    """
+    user_id = 132
+    with patch.multiple(
+            "core.tasks.app_config",
+            error_probability=0,
+            telegram_sleep=0,
+    ):
+        with client.websocket_connect(
+                f"/api/notifications/{user_id}/statuses"
+        ) as websocket:
+            created = client.post("/api/notifications/", json={
+                "user_id": user_id,
+                "message": "Pushed",
+                "type": "telegram",
+                "priority": "high",
+            }).json()
+            event = websocket.receive_json()
+
+    assert event == {
+        "id_notification": created["id_notification"],
+        "user_id": user_id,
+        "status": "sent",
+    }
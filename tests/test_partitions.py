@@ -0,0 +1,65 @@
+"""
+Тесты обслуживания партиций notifications
+"""
+import asyncio
+import gzip
+import json
+
+from sqlalchemy import text
+
+from service.notifications.partitions import PartitionManager
+
+
+async def _maintain(db_engine, session_factory, archive_dir):
+    """
+    создает устаревшую партицию с одним уведомлением
+    и запускает обслуживание
+    """
+    async with db_engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS notifications_p2001_01 "
+            "PARTITION OF notifications "
+            "FOR VALUES FROM ('2001-01-01') TO ('2001-02-01')"
+        ))
+        await conn.execute(text(
+            "INSERT INTO notifications "
+            "(user_id, message, notification_type, status, created_at) "
+            "VALUES (127, 'Archived', 'email', 'sent', '2001-01-15')"
+        ))
+
+    manager = PartitionManager(
+        session_factory=session_factory,
+        premake_months=2,
+        retention_months=12,
+        archive_dir=str(archive_dir),
+    )
+    dropped = await manager.maintain()
+
+    async with db_engine.connect() as conn:
+        partitions = set(await conn.scalars(text(
+            "SELECT relname FROM pg_class "
+            "WHERE relname LIKE 'notifications\\_p%' AND relkind = 'r'"
+        )))
+    return dropped, partitions
+
+
+def test_partition_retention_archives_and_drops(
+        db_engine,
+        session_factory,
+        tmp_path,
+):
+    dropped, partitions = asyncio.run(
+        _maintain(db_engine, session_factory, tmp_path)
+    )
+
+    assert dropped == ["notifications_p2001_01"]
+    assert "notifications_p2001_01" not in partitions
+    # текущий месяц и два следующих
+    assert len(partitions) >= 3
+
+    with gzip.open(tmp_path / "notifications_p2001_01.ndjson.gz") as archive:
+        rows = [json.loads(line) for line in archive]
+    assert [
+        (row["user_id"], row["message"], row["status"]) for row in rows
+    ] == [(127, "Archived", "sent")]
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,354 @@
+"""
+Тесты персистентной очереди отправки
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import select, update
+
+from core.worker import QueueWorker
+from models.notifications import Notification
+from schemas.monitoring import NotificationStatusCountsSchema
+from schemas.notifications import CreateNotificationSchema
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import DispatcherOverloadedError
+from service.notifications.repository import NotificationRepository
+
+
+async def _claim_concurrently(session_factory):
+    """
+    создает уведомления без аренды и захватывает их
+    двумя параллельными обработчиками
+    """
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=126,
+                message=f"Queued {i}",
+                type="telegram"
+            )
+            for i in range(10)
+        ])
+    created_ids = {schema.id_notification for schema in created}
+
+    async def claim():
+        async with session_factory() as session:
+            return await NotificationRepository(session).claim_pending(
+                limit=1000,
+                lease=60,
+            )
+
+    first, second = await asyncio.gather(claim(), claim())
+    first_ids = {schema.id_notification for schema in first}
+    second_ids = {schema.id_notification for schema in second}
+
+    async with session_factory() as session:
+        await session.execute(
+            update(Notification)
+            .where(Notification.id_notification.in_(created_ids))
+            .values(status="sent")
+        )
+        await session.commit()
+
+    async with session_factory() as session:
+        again = await NotificationRepository(session).claim_pending(
+            limit=1000,
+            lease=60,
+        )
+    return created_ids, first_ids, second_ids, again
+
+
+def test_claim_pending_skips_locked_rows(session_factory):
+    """
+    параллельные обработчики получают непересекающиеся пачки,
+    и каждое уведомление захватывается ровно один раз
+    """
+    created_ids, first_ids, second_ids, again = asyncio.run(
+        _claim_concurrently(session_factory)
+    )
+
+    assert not first_ids & second_ids
+    assert created_ids <= first_ids | second_ids
+    assert not created_ids & {schema.id_notification for schema in again}
+
+
+async def _retry_twice(session_factory):
+    """
+    планирует повтор уведомления, проверяет, что оно не захватывается
+    до next_attempt_at, и исчерпывает попытки вторым повтором
+    """
+
+    async def load(id_notification):
+        async with session_factory() as session:
+            result = await session.execute(
+                select(
+                    Notification.status,
+                    Notification.attempts,
+                    Notification.next_attempt_at,
+                    Notification.locked_until,
+                ).where(Notification.id_notification == id_notification)
+            )
+            return result.one()
+
+    async with session_factory() as session:
+        [created] = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=127,
+                message="Retried",
+                type="email"
+            )
+        ], lease=60)
+
+    retry_kwargs = {"max_attempts": 2, "base_delay": 60, "max_delay": 600}
+    async with session_factory() as session:
+        first = await NotificationRepository(session).schedule_retries(
+            [created.id_notification], **retry_kwargs
+        )
+    after_first = await load(created.id_notification)
+    async with session_factory() as session:
+        claimed = await NotificationRepository(session).claim_pending(
+            limit=1000,
+            lease=60,
+            notification_type="email",
+        )
+
+    async with session_factory() as session:
+        second = await NotificationRepository(session).schedule_retries(
+            [created.id_notification], **retry_kwargs
+        )
+    after_second = await load(created.id_notification)
+    return created, first, after_first, claimed, second, after_second
+
+
+def test_schedule_retries_backs_off_and_exhausts(session_factory):
+    """
+    неудачное уведомление откладывается с задержкой из диапазона
+    jitter и не захватывается раньше срока, после исчерпания
+    попыток получает статус failed
+    """
+    requested_at = datetime.now(timezone.utc)
+    created, first, after_first, claimed, second, after_second = asyncio.run(
+        _retry_twice(session_factory)
+    )
+
+    assert first == {"pending": 1, "failed": 0}
+    assert after_first.status == "pending"
+    assert after_first.attempts == 1
+    assert after_first.locked_until is None
+    delay = after_first.next_attempt_at - requested_at
+    assert timedelta(seconds=29) <= delay <= timedelta(seconds=61)
+    assert created.id_notification not in {
+        schema.id_notification for schema in claimed
+    }
+
+    assert second == {"pending": 0, "failed": 1}
+    assert after_second.status == "failed"
+    assert after_second.attempts == 2
+    assert after_second.next_attempt_at is None
+
+
+async def _count_statuses(session_factory):
+    """
+    снимает счетчики статусов до и после создания, захвата
+    и отправки пачки уведомлений
+    """
+
+    async def counts():
+        async with session_factory() as session:
+            return (
+                await NotificationRepository(session).status_counts()
+            ).get("email")
+
+    before = await counts()
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=128,
+                message=f"Counted {i}",
+                type="email"
+            )
+            for i in range(5)
+        ], lease=60)
+    async with session_factory() as session:
+        await NotificationRepository(session).update_statuses({
+            "sent": [schema.id_notification for schema in created[:3]],
+            "failed": [created[3].id_notification],
+        })
+    # смена аренды без смены статуса не меняет счетчики
+    async with session_factory() as session:
+        await session.execute(
+            update(Notification)
+            .where(
+                Notification.id_notification
+                == created[4].id_notification
+            )
+            .values(locked_until=None)
+        )
+        await session.commit()
+    return before, await counts()
+
+
+def test_status_counts_follow_status_changes(session_factory):
+    """
+    счетчики статусов обновляются триггером при вставке
+    и смене статуса
+    """
+    before, after = asyncio.run(_count_statuses(session_factory))
+    before = before or NotificationStatusCountsSchema()
+
+    assert after.pending - before.pending == 1
+    assert after.sent - before.sent == 3
+    assert after.failed - before.failed == 1
+
+
+async def _update_one_status(session_factory):
+    """
+    обновляет статус одного уведомления через модель
+    """
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create(
+            CreateNotificationSchema(
+                user_id=145,
+                message="Single",
+                type="email",
+            )
+        )
+    async with session_factory() as session:
+        repository = NotificationRepository(session)
+        await repository.update_status(created.id_notification, "sent")
+        await session.commit()
+    async with session_factory() as session:
+        repository = NotificationRepository(session)
+        return (
+            await repository.get(created.id_notification),
+            await repository.get(-1),
+        )
+
+
+def test_get_and_update_status_by_id(session_factory):
+    """
+    уведомление находится по id без created_at из первичного ключа
+    """
+    notification, missing = asyncio.run(_update_one_status(session_factory))
+
+    assert notification.status == "sent"
+    assert notification.message == "Single"
+    assert missing is None
+
+
+async def _run_worker_overloaded(session_factory):
+    """
+    запускает обработчик очереди, когда очередь диспетчера
+    заполняется между проверкой места и постановкой
+    """
+
+    async def process(_notifications):
+        pass
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"email": 1},
+        queue_size=10,
+    )
+    worker = QueueWorker(
+        session_factory=session_factory,
+        dispatcher=dispatcher,
+        batch_size=10,
+        poll_interval=0.05,
+        lease=1,
+    )
+    async with session_factory() as session:
+        await NotificationRepository(session).create(
+            CreateNotificationSchema(
+                user_id=143,
+                message="Overloaded",
+                type="email",
+            )
+        )
+    dispatcher.start()
+    with patch.object(
+            dispatcher,
+            "submit",
+            side_effect=DispatcherOverloadedError("full"),
+    ) as submit:
+        worker_task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.3)
+        worker.stop()
+        await worker_task
+    await dispatcher.stop()
+    return submit.call_count
+
+
+def test_queue_worker_survives_dispatcher_overload(session_factory):
+    """
+    переполнение очереди диспетчера после захвата не
+    останавливает обработчик очереди
+    """
+    assert asyncio.run(_run_worker_overloaded(session_factory)) >= 1
+
+
+async def _hold_past_lease(session_factory):
+    """
+    держит захваченные уведомления в заполненной очереди диспетчера
+    дольше срока аренды и пробует захватить их повторно
+    """
+    release = asyncio.Event()
+    processed = []
+
+    async def process(notifications):
+        await release.wait()
+        processed.extend(
+            notification.id_notification for notification in notifications
+        )
+
+    # одно уведомление отправляется, второе занимает очередь,
+    # поэтому обработчик очереди не захватывает строки заново
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"telegram": 1},
+        queue_size=1,
+    )
+    worker = QueueWorker(
+        session_factory=session_factory,
+        dispatcher=dispatcher,
+        batch_size=1,
+        poll_interval=0.05,
+        lease=0.4,
+    )
+    async with session_factory() as session:
+        await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=144,
+                message=f"Held {i}",
+                type="telegram",
+            )
+            for i in range(2)
+        ])
+    dispatcher.start()
+    worker_task = asyncio.create_task(worker.run())
+    await asyncio.sleep(1)
+    held = dispatcher.held_ids
+    async with session_factory() as session:
+        reclaimed = await NotificationRepository(session).claim_pending(
+            limit=len(held),
+            lease=60,
+            ids=held,
+        )
+    worker.stop()
+    await worker_task
+    release.set()
+    await dispatcher.stop()
+    return held, reclaimed, processed
+
+
+def test_queue_worker_renews_leases_of_held_notifications(session_factory):
+    """
+    аренда уведомлений, ожидающих в очереди диспетчера,
+    продлевается, и они не захватываются повторно
+    """
+    held, reclaimed, processed = asyncio.run(_hold_past_lease(session_factory))
+
+    assert len(held) == 2
+    assert reclaimed == []
+    assert sorted(processed[:2]) == sorted(held)
@@ -0,0 +1,44 @@
+"""
+Тесты ограничения скорости отправки
+"""
+import asyncio
+import time
+
+from service.notifications.rate_limiter import NotificationRateLimiter
+
+
+def test_rate_limiter_throttles_channel_and_defers_user():
+    """
+    после исчерпания ведра канала отправки ждут пополнения токенов,
+    лимит получателя проверяется без ожидания и возвращает время
+    до токена, не влияя на других получателей
+    """
+    limiter = NotificationRateLimiter(
+        channel_limits={"telegram": (100.0, 2)},
+        user_limit=(20.0, 1),
+    )
+
+    async def scenario():
+        started_at = time.monotonic()
+        await asyncio.gather(
+            *(limiter.acquire("telegram", user_id) for user_id in range(4))
+        )
+        channel_elapsed = time.monotonic() - started_at
+
+        await limiter.acquire("email", 1)
+        return channel_elapsed
+
+    channel_elapsed = asyncio.run(scenario())
+    user_delays = [limiter.try_acquire_user("telegram", 10) for _ in range(2)]
+    other_user_delay = limiter.try_acquire_user("telegram", 11)
+    stats = limiter.stats()
+
+    assert channel_elapsed >= 0.015
+    assert user_delays[0] == 0
+    assert 0.04 <= user_delays[1] <= 0.05
+    assert other_user_delay == 0
+    assert stats["telegram"].acquired == 4
+    assert stats["telegram"].throttled >= 2
+    assert stats["telegram"].wait_seconds > 0
+    assert stats["telegram"].deferred == 1
+    assert stats["email"].throttled == 0
@@ -0,0 +1,35 @@
+"""
+Тесты классов ответов API
+"""
+import json
+
+from api.responses import SchemaJSONResponse
+from schemas.notifications import NotificationPageSchema, NotificationSchema
+
+
+def test_schema_json_response_uses_aliases():
+    """
+    схема сериализуется в JSON с алиасами полей,
+    как при сериализации по response_model
+    """
+    page = NotificationPageSchema(
+        items=[
+            NotificationSchema(
+                id_notification=7,
+                user_id=3,
+                message='Ваш код: 1\n"ok"',
+                notification_type="email",
+                status="sent",
+            )
+        ],
+        next_cursor=7,
+    )
+
+    response = SchemaJSONResponse(page)
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == page.model_dump(
+        mode="json",
+        by_alias=True,
+    )
+    assert json.loads(response.body)["items"][0]["type"] == "email"
@@ -0,0 +1,195 @@
+"""
+Тесты планировщика отложенной отправки
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from core.config import app_config
+from models.notifications import Notification
+from schemas.notifications import CreateNotificationSchema, NotificationSchema
+from service.notifications.dispatcher import NotificationDispatcher
+from service.notifications.exceptions import DispatcherOverloadedError
+from service.notifications.repository import NotificationRepository
+from service.notifications.scheduler import NotificationScheduler
+
+
+async def _schedule_and_release(session_factory):
+    """
+    планирует уведомления на ближайшую секунду и на следующий день
+    и запускает планировщик, пока ближайшие не будут отправлены
+    """
+    released = {}
+
+    async def process(notifications: List[NotificationSchema]):
+        for notification in notifications:
+            released[notification.id_notification] = time.time()
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"email": 1},
+        queue_size=10,
+    )
+    scheduler = NotificationScheduler(
+        session_factory=session_factory,
+        dispatcher=dispatcher,
+        horizon=60,
+        max_entries=100,
+        batch_size=10,
+        poll_interval=0.2,
+        lease=60,
+    )
+    send_at = datetime.now(timezone.utc) + timedelta(seconds=1)
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=129,
+                message=f"Scheduled {i}",
+                type="email",
+                send_at=send_at if i < 3 else send_at + timedelta(days=1),
+            )
+            for i in range(4)
+        ], lease=60)
+    async with session_factory() as session:
+        early_claim = await NotificationRepository(session).claim_pending(
+            limit=1000,
+            lease=60,
+            ids=[schema.id_notification for schema in created],
+        )
+
+    dispatcher.start()
+    scheduler_task = asyncio.create_task(scheduler.run())
+    deadline = time.time() + 5
+    while len(released) < 3 and time.time() < deadline:
+        await asyncio.sleep(0.05)
+    scheduler.stop()
+    await scheduler_task
+    await dispatcher.stop()
+    return send_at, created, early_claim, released
+
+
+def test_scheduler_releases_due_notifications(session_factory):
+    """
+    запланированные уведомления не захватываются очередью раньше
+    времени и передаются в отправку планировщиком в срок
+    """
+    with patch.object(app_config, "schedule_spread", 0):
+        send_at, created, early_claim, released = asyncio.run(
+            _schedule_and_release(session_factory)
+        )
+
+    assert early_claim == []
+    assert all(schema.send_at == send_at for schema in created[:3])
+    assert set(released) == {
+        schema.id_notification for schema in created[:3]
+    }
+    for released_at in released.values():
+        assert send_at.timestamp() <= released_at < send_at.timestamp() + 1
+
+
+async def _spread(session_factory, count: int):
+    """
+    планирует уведомления на одно время и возвращает
+    назначенные им моменты отправки
+    """
+    send_at = datetime.now(timezone.utc) + timedelta(days=1)
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=130,
+                message=f"Spread {i}",
+                type="telegram",
+                send_at=send_at,
+            )
+            for i in range(count)
+        ])
+    async with session_factory() as session:
+        attempts_at = await session.scalars(
+            select(Notification.next_attempt_at).where(
+                Notification.id_notification.in_(
+                    [schema.id_notification for schema in created]
+                )
+            )
+        )
+        return send_at, list(attempts_at)
+
+
+def test_schedule_spread_smooths_send_times(session_factory):
+    """
+    уведомления, запланированные на одно время, распределяются
+    по окну SCHEDULE_SPREAD
+    """
+    with patch.object(app_config, "schedule_spread", 10):
+        send_at, attempts_at = asyncio.run(_spread(session_factory, 50))
+
+    offsets = [
+        (attempt_at - send_at).total_seconds() for attempt_at in attempts_at
+    ]
+    assert all(0 <= offset <= 10 for offset in offsets)
+    assert max(offsets) - min(offsets) > 5
+
+
+async def _release_overloaded(session_factory):
+    """
+    запускает планировщик, когда очередь диспетчера заполняется
+    между проверкой места и постановкой
+    """
+
+    async def process(_notifications):
+        pass
+
+    dispatcher = NotificationDispatcher(
+        process=process,
+        concurrency={"email": 1},
+        queue_size=10,
+    )
+    scheduler = NotificationScheduler(
+        session_factory=session_factory,
+        dispatcher=dispatcher,
+        horizon=60,
+        max_entries=100,
+        batch_size=10,
+        poll_interval=0.1,
+        lease=60,
+    )
+    async with session_factory() as session:
+        await NotificationRepository(session).create(
+            CreateNotificationSchema(
+                user_id=131,
+                message="Overloaded",
+                type="email",
+                send_at=datetime.now(timezone.utc),
+            )
+        )
+    dispatcher.start()
+    with patch.object(
+            dispatcher,
+            "submit",
+            side_effect=DispatcherOverloadedError("full"),
+    ) as submit:
+        scheduler_task = asyncio.create_task(scheduler.run())
+        deadline = time.time() + 5
+        while not submit.called and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.1)
+        running = not scheduler_task.done()
+        scheduler.stop()
+        await scheduler_task
+    await dispatcher.stop()
+    return submit.called, running
+
+
+def test_scheduler_survives_dispatcher_overload(session_factory):
+    """
+    переполнение очереди диспетчера после захвата
+    не останавливает планировщик
+    """
+    with patch.object(app_config, "schedule_spread", 0):
+        submitted, running = asyncio.run(_release_overloaded(session_factory))
+
+    assert submitted
+    assert running
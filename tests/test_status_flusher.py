@@ -0,0 +1,60 @@
+"""
+Тесты пакетной записи статусов
+"""
+import asyncio
+
+from sqlalchemy import select
+
+from models.notifications import Notification
+from schemas.notifications import CreateNotificationSchema
+from service.notifications.repository import NotificationRepository
+from service.notifications.status_flusher import StatusFlusher
+
+
+async def _flush_statuses(session_factory):
+    """
+    создает уведомления, передает их статусы в буфер
+    и возвращает статусы из БД после сброса по размеру
+    """
+    async with session_factory() as session:
+        created = await NotificationRepository(session).create_many([
+            CreateNotificationSchema(
+                user_id=128,
+                message=f"Flushed {i}",
+                type="email"
+            )
+            for i in range(3)
+        ], lease=60)
+    ids = [schema.id_notification for schema in created]
+
+    flusher = StatusFlusher(
+        session_factory=session_factory,
+        max_batch=3,
+        flush_interval=60,
+    )
+    flusher.start()
+    flusher.add(ids[0], "sent")
+    flusher.add(ids[1], "failed")
+    flusher.add(ids[2], "sent")
+    for _ in range(50):
+        await asyncio.sleep(0.05)
+        async with session_factory() as session:
+            result = await session.execute(
+                select(Notification.id_notification, Notification.status)
+                .where(Notification.id_notification.in_(ids))
+            )
+            statuses = dict(result.tuples().all())
+        if "pending" not in statuses.values():
+            break
+    await flusher.stop()
+    return ids, statuses
+
+
+def test_status_flusher_flushes_on_size(session_factory):
+    """
+    накопленные статусы записываются, как только буфер
+    достигает max_batch, не дожидаясь интервала
+    """
+    ids, statuses = asyncio.run(_flush_statuses(session_factory))
+
+    assert statuses == {ids[0]: "sent", ids[1]: "failed", ids[2]: "sent"}
@@ -0,0 +1,149 @@
+"""
+Тесты хаба событий смены статусов
+"""
+import asyncio
+import json
+import time
+
+from core.config import pg_config
+from schemas.notifications import (
+    NotificationPageSchema,
+    NotificationStatusEventSchema,
+)
+from service.notifications.cache import (
+    InMemoryCacheBackend,
+    NotificationHistoryCache,
+)
+from service.notifications.status_hub import StatusHub
+
+
+def _event(id_notification: int, user_id: int = 1):
+    """
+    событие отправки уведомления для тестов
+    """
+    return NotificationStatusEventSchema(
+        id_notification=id_notification,
+        user_id=user_id,
+        status="sent",
+    )
+
+
+async def _get(subscription, timeout: float = 0.2):
+    """
+    следующее событие подписки или None по таймауту
+    """
+    try:
+        return await asyncio.wait_for(subscription.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def _fan_out(session_factory):
+    """
+    публикует события в одном хабе и собирает события,
+    полученные подписками обоих хабов
+    """
+    sender, receiver = (
+        StatusHub(dsn=pg_config.dsn, queue_size=100, reconnect_delay=0.1)
+        for _ in range(2)
+    )
+    sender.start()
+    receiver.start()
+    try:
+        async with sender.subscribe(141) as own:
+            async with receiver.subscribe(141) as remote:
+                # LISTEN начинает работать после подключения: события
+                # отправляются, пока одно из них не будет получено
+                remote_event = None
+                id_notification = 0
+                deadline = time.time() + 5
+                while remote_event is None and time.time() < deadline:
+                    id_notification += 1
+                    events = [_event(id_notification, 141), _event(1, 142)]
+                    async with session_factory() as session:
+                        await sender.notify(session, events)
+                        await session.commit()
+                    sender.publish(events)
+                    remote_event = await _get(remote)
+                own_events = []
+                while (event := await _get(own)) is not None:
+                    own_events.append(event)
+    finally:
+        await sender.stop()
+        await receiver.stop()
+    return id_notification, own_events, remote_event
+
+
+def test_status_hub_fans_out_across_instances(session_factory):
+    """
+    события доходят до подписок другого экземпляра через
+    LISTEN/NOTIFY, а свои события не дублируются
+    """
+    sent, own_events, remote_event = asyncio.run(_fan_out(session_factory))
+
+    assert [event.id_notification for event in own_events] == list(
+        range(1, sent + 1)
+    )
+    assert remote_event.user_id == 141
+    assert remote_event.status == "sent"
+
+
+async def _overflow():
+    """
+    публикует больше событий, чем помещается в очередь подписки
+    """
+    hub = StatusHub(dsn=pg_config.dsn, queue_size=2, reconnect_delay=0.1)
+    async with hub.subscribe(1) as subscription:
+        hub.publish([_event(i) for i in range(1, 4)])
+        event = await subscription.get()
+    return subscription, event, hub.subscriptions
+
+
+def test_status_subscription_overflow_closes():
+    """
+    переполненная подписка закрывается без частичных событий
+    """
+    subscription, event, subscriptions = asyncio.run(_overflow())
+
+    assert subscription.overflowed
+    assert event is None
+    assert subscriptions == 0
+
+
+async def _invalidate_from_notify():
+    """
+    кэширует страницу пользователя и передает хабу
+    NOTIFY другого экземпляра
+    """
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return NotificationPageSchema(items=[], next_cursor=None)
+
+    cache = NotificationHistoryCache(
+        InMemoryCacheBackend(ttl=60, max_entries=10, max_bytes=10000)
+    )
+    hub = StatusHub(
+        dsn=pg_config.dsn,
+        queue_size=2,
+        reconnect_delay=0.1,
+        cache=cache,
+    )
+    await cache.get_or_load(147, None, None, 50, None, loader)
+    hub._on_notify(None, 0, None, json.dumps(
+        {"origin": "other", "events": [[1, 147, "sent"]]}
+    ))
+    await hub.stop()
+    await cache.get_or_load(147, None, None, 50, None, loader)
+    return len(loads), cache.stats()
+
+
+def test_status_hub_invalidates_cache_of_remote_events():
+    """
+    события другого экземпляра сбрасывают кэш истории получателей
+    """
+    loads, stats = asyncio.run(_invalidate_from_notify())
+
+    assert loads == 2
+    assert stats.invalidations == 1
@@ -0,0 +1,174 @@
+"""
+Тесты транспортов отправки уведомлений
+на локальных заглушках SMTP сервера и Telegram Bot API
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from core.config import SmtpConfig, TelegramConfig
+from service.notifications.exceptions import SendError
+from service.notifications.transports import (
+    SmtpMessage,
+    SmtpTransport,
+    TelegramTransport,
+)
+
+
+class SmtpStandIn:
+    """
+    Минимальный SMTP сервер: принимает письма и считает соединения,
+    адреса с "reject" отклоняются на RCPT
+    """
+    def __init__(self, pipelining: bool):
+        self.pipelining = pipelining
+        self.connections = 0
+        self.messages = []
+        self.server = None
+
+    async def start(self) -> int:
+        """
+        запускает сервер на свободном порту
+        """
+        self.server = await asyncio.start_server(
+            self._handle, "127.0.0.1", 0
+        )
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        останавливает сервер
+        """
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 stand-in\r\n")
+        recipient = None
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command.split(" ")[0].upper()
+            if verb == "EHLO":
+                extension = b"250-PIPELINING\r\n" if self.pipelining else b""
+                writer.write(b"250-stand-in\r\n" + extension + b"250 OK\r\n")
+            elif verb == "RCPT":
+                recipient = command[len("RCPT TO:<"):-1]
+                if "reject" in recipient:
+                    recipient = None
+                    writer.write(b"550 rejected\r\n")
+                else:
+                    writer.write(b"250 OK\r\n")
+            elif verb == "DATA":
+                if recipient is None:
+                    writer.write(b"554 no valid recipients\r\n")
+                    continue
+                writer.write(b"354 go ahead\r\n")
+                await writer.drain()
+                body = []
+                while (data_line := await reader.readline()) != b".\r\n":
+                    body.append(data_line)
+                self.messages.append((recipient, b"".join(body)))
+                recipient = None
+                writer.write(b"250 queued\r\n")
+            elif verb == "QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+async def _send_through_stand_in(pipelining: bool):
+    """
+    отправляет две пачки писем через пул из одного соединения
+    """
+    stand_in = SmtpStandIn(pipelining=pipelining)
+    port = await stand_in.start()
+    transport = SmtpTransport(SmtpConfig(
+        host="127.0.0.1",
+        port=port,
+        pool_size=1,
+        messages_per_connection=10,
+    ))
+    await transport.start()
+    try:
+        first = await transport.send([
+            SmtpMessage("from@test", "a@test", b"Subject: a\r\n\r\n.dot"),
+            SmtpMessage("from@test", "reject@test", b"Subject: b\r\n\r\nb"),
+            SmtpMessage("from@test", "c@test", b"Subject: c\r\n\r\nc"),
+        ])
+        second = await transport.send([
+            SmtpMessage("from@test", "d@test", b"Subject: d\r\n\r\nd"),
+        ])
+        opened = transport.pool.opened
+    finally:
+        await transport.close()
+        await stand_in.stop()
+    return first, second, opened, stand_in
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+def test_smtp_transport_reuses_connection(pipelining):
+    """
+    несколько писем уходят в одной SMTP сессии, соединение
+    переиспользуется между вызовами, а отклоненное письмо
+    не мешает остальным
+    """
+    first, second, opened, stand_in = asyncio.run(
+        _send_through_stand_in(pipelining)
+    )
+
+    assert first == [True, False, True]
+    assert second == [True]
+    assert opened == 1
+    assert stand_in.connections == 1
+    assert [recipient for recipient, _ in stand_in.messages] == [
+        "a@test",
+        "c@test",
+        "d@test",
+    ]
+    assert b"..dot" in stand_in.messages[0][1]
+
+
+def test_telegram_transport_send_message():
+    """
+    сообщение отправляется методом sendMessage,
+    ошибка Bot API превращается в SendError
+    """
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        payload = json.loads(request.content)
+        if payload["chat_id"] == 2:
+            return httpx.Response(
+                400,
+                json={"ok": False, "description": "chat not found"}
+            )
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    async def scenario():
+        transport = TelegramTransport(
+            TelegramConfig(api_url="http://telegram.test", token="TOKEN"),
+            transport=httpx.MockTransport(handle),
+        )
+        await transport.start()
+        try:
+            await transport.send_message(chat_id=1, text="Your code: 11111")
+            with pytest.raises(SendError):
+                await transport.send_message(chat_id=2, text="lost")
+        finally:
+            await transport.close()
+
+    asyncio.run(scenario())
+
+    assert requests[0].url == "http://telegram.test/botTOKEN/sendMessage"
+    assert json.loads(requests[0].content) == {
+        "chat_id": 1,
+        "text": "Your code: 11111",
+    }
@@ -0,0 +1,144 @@
+"""
+Модуль с circuit breaker по скользящей доле ошибок
+"""
+
+import time
+from collections import deque
+from typing import Deque, List, Literal
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker с состояниями closed, open и half_open.
+
+    В состоянии closed вызовы разрешены, а их результаты копятся
+    в скользящем окне из секундных корзин. Когда в окне набирается
+    не меньше min_calls вызовов и доля ошибок достигает failure_rate,
+    цепь размыкается (open) на open_timeout секунд и вызовы не
+    выполняются. После таймаута цепь переходит в half_open и
+    пропускает не больше half_open_calls пробных вызовов: успех
+    замыкает цепь, ошибка снова размыкает её.
+    """
+
+    def __init__(
+            self,
+            failure_rate: float,
+            min_calls: int,
+            window: float,
+            open_timeout: float,
+            half_open_calls: int = 1,
+    ):
+        """
+        :param failure_rate: доля ошибок в окне, при которой цепь
+         размыкается (от 0 до 1)
+        :param min_calls: минимум вызовов в окне для оценки доли ошибок
+        :param window: длина скользящего окна в секундах
+        :param open_timeout: время в состоянии open в секундах
+        :param half_open_calls: число одновременных пробных вызовов
+         в состоянии half_open
+        """
+        self._failure_rate = failure_rate
+        self._min_calls = min_calls
+        self._window = window
+        self._open_timeout = open_timeout
+        self._half_open_calls = half_open_calls
+        # корзины [секунда, успехи, ошибки]
+        self._buckets: Deque[List[int]] = deque()
+        self._state: CircuitState = "closed"
+        self._opened_at = 0.0
+        self._probes = 0
+        self.open_count = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """
+        Текущее состояние с учетом истекшего таймаута open
+        """
+        if (
+                self._state == "open"
+                and time.monotonic() >= self._opened_at + self._open_timeout
+        ):
+            self._state = "half_open"
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Разрешение на вызов. В состоянии half_open разрешение
+        занимает слот пробного вызова до вызова record
+
+        :return: можно ли выполнять вызов
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and self._probes < self._half_open_calls:
+            self._probes += 1
+            return True
+        return False
+
+    def record(self, successes: int, failures: int):
+        """
+        Учет результатов разрешенного вызова
+
+        :param successes: число успешных операций
+        :param failures: число неудачных операций
+        """
+        if self._state == "half_open":
+            self._probes = max(self._probes - 1, 0)
+            if failures:
+                self._open()
+            else:
+                self._state = "closed"
+                self._buckets.clear()
+            return
+        if self._state == "open":
+            return
+
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            bucket = self._buckets[-1]
+        else:
+            bucket = [now, 0, 0]
+            self._buckets.append(bucket)
+        bucket[1] += successes
+        bucket[2] += failures
+
+        calls, errors = self.window_calls()
+        if calls >= self._min_calls and errors >= calls * self._failure_rate:
+            self._open()
+
+    def window_calls(self):
+        """
+        Число вызовов и ошибок в скользящем окне
+
+        :return: (вызовы, ошибки)
+        """
+        expired_before = time.monotonic() - self._window
+        while self._buckets and self._buckets[0][0] < expired_before:
+            self._buckets.popleft()
+        successes = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return successes + failures, failures
+
+    def retry_after(self) -> float:
+        """
+        Время до перехода в half_open в секундах, 0 если цепь не open
+        """
+        if self.state != "open":
+            return 0.0
+        return max(
+            self._opened_at + self._open_timeout - time.monotonic(),
+            0.0
+        )
+
+    def _open(self):
+        """
+        Размыкание цепи
+        """
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._buckets.clear()
+        self.open_count += 1
@@ -0,0 +1,236 @@
+"""
+Модуль с метриками в текстовом формате Prometheus
+
+Счетчики и гистограммы рассчитаны на горячий путь: значения
+хранятся в словарях по кортежу меток, запись - одна операция
+со словарем без блокировок (весь код выполняется в потоке
+event loop), гистограммы используют заранее заданные корзины.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Форматирование меток вида {name="value",...}
+    """
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"')
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    """
+    Форматирование значения без лишней дробной части
+    """
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """
+    Монотонный счетчик с метками
+    """
+    def __init__(self, name: str, documentation: str, labels=()):
+        """
+        :param name: имя метрики
+        :param documentation: описание метрики
+        :param labels: имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        """
+        Увеличение счетчика
+
+        :param label_values: значения меток в порядке labels
+        :param amount: приращение
+        """
+        self._values[label_values] = (
+            self._values.get(label_values, 0) + amount
+        )
+
+    def value(self, *label_values: str) -> float:
+        """
+        Текущее значение счетчика
+        """
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self._values.items():
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Гистограмма с заранее заданными корзинами
+    """
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels=(),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """
+        :param name: имя метрики
+        :param documentation: описание метрики
+        :param labels: имена меток
+        :param buckets: верхние границы корзин по возрастанию
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # для каждого набора меток: счетчики корзин (последняя - +Inf)
+        # и сумма наблюдений
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *label_values: str):
+        """
+        Учет наблюдения
+
+        :param value: наблюдаемое значение
+        :param label_values: значения меток в порядке labels
+        """
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (
+                len(self.buckets) + 1
+            )
+            self._sums[label_values] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] += value
+
+    def count(self, *label_values: str) -> int:
+        """
+        Число наблюдений
+        """
+        return sum(self._counts.get(label_values, ()))
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for label_values, counts in self._counts.items():
+            cumulative = 0
+            for bound, bucket_count in zip(
+                    self.buckets + (float("inf"),),
+                    counts
+            ):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(names, label_values + (le,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield (
+                f"{self.name}_sum{labels} "
+                f"{_format_value(self._sums[label_values])}"
+            )
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge:
+    """
+    Значение, которое вычисляется функцией в момент сбора метрик
+    """
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            collect: Callable[[], Dict[LabelValues, float]],
+            labels=(),
+    ):
+        """
+        :param name: имя метрики
+        :param documentation: описание метрики
+        :param collect: функция, возвращающая значения по меткам
+        :param labels: имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for label_values, value in self._collect().items():
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик, отдающий их в текстовом формате Prometheus
+    """
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        """
+        Регистрирует счетчик
+        """
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labels=(),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """
+        Регистрирует гистограмму
+        """
+        return self._register(
+            Histogram(name, documentation, labels, buckets)
+        )
+
+    def gauge(
+            self,
+            name: str,
+            documentation: str,
+            collect: Callable[[], Dict[LabelValues, float]],
+            labels=(),
+    ) -> Gauge:
+        """
+        Регистрирует вычисляемое значение
+        """
+        return self._register(Gauge(name, documentation, collect, labels))
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
@@ -0,0 +1,65 @@
+"""
+Модуль с асинхронным token bucket
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket.
+
+    Токены пополняются со скоростью rate в секунду, но не больше burst.
+    Запрос, которому не хватило токена, резервирует его в долг
+    (баланс уходит в минус) и ждет, пока долг не погасится, поэтому
+    ожидающие обслуживаются в порядке очереди без блокировок.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: скорость пополнения, токенов в секунду
+        :param burst: емкость ведра
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    async def acquire(self) -> float:
+        """
+        Забирает один токен, при необходимости ожидая его
+
+        :return: время ожидания в секундах
+        """
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        wait = -self._tokens / self._rate
+        await asyncio.sleep(wait)
+        return wait
+
+    def try_acquire(self) -> float:
+        """
+        Забирает один токен без ожидания и без долга
+
+        :return: 0, если токен получен, иначе через сколько
+         секунд он появится
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def _refill(self):
+        """
+        Пополнение токенов за время с прошлого обращения
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst,
+            self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
@@ -0,0 +1,82 @@
+"""
+Точка входа обработчика очереди отправки уведомлений.
+
+Запускается отдельно от API (python worker.py) и может быть
+запущен в нескольких экземплярах для параллельной отправки.
+"""
+import asyncio
+import logging
+import signal
+
+from core.config import app_config
+from core.db import dispatch_session_factory, dispose_engines, init_db
+from core.tasks import (
+    notification_coalescer,
+    notification_dispatcher,
+    status_flusher,
+)
+from core.worker import QueueWorker
+from service.notifications.notification_sender import (
+    notification_handler_factory
+)
+from service.notifications.partitions import PartitionManager
+from service.notifications.scheduler import NotificationScheduler
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """
+    Запуск обработчика очереди до получения SIGINT/SIGTERM
+    """
+    await init_db()
+    await notification_handler_factory.start()
+    status_flusher.start()
+    notification_coalescer.start()
+    notification_dispatcher.start()
+    queue_worker = QueueWorker(
+        session_factory=dispatch_session_factory,
+        dispatcher=notification_dispatcher,
+        batch_size=app_config.worker_batch_size,
+        poll_interval=app_config.worker_poll_interval,
+        lease=app_config.dispatch_lease,
+    )
+    scheduler = NotificationScheduler(
+        session_factory=dispatch_session_factory,
+        dispatcher=notification_dispatcher,
+        horizon=app_config.scheduler_horizon,
+        max_entries=app_config.scheduler_max_entries,
+        batch_size=app_config.worker_batch_size,
+        poll_interval=app_config.worker_poll_interval,
+        lease=app_config.dispatch_lease,
+    )
+    scheduler_task = asyncio.create_task(scheduler.run())
+    partition_manager = PartitionManager(
+        session_factory=dispatch_session_factory,
+        premake_months=app_config.partition_premake_months,
+        retention_months=app_config.partition_retention_months,
+        archive_dir=app_config.partition_archive_dir,
+        interval=app_config.partition_maintenance_interval,
+    )
+    partition_manager_task = asyncio.create_task(partition_manager.run())
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, queue_worker.stop)
+
+    try:
+        await queue_worker.run()
+    finally:
+        logger.info("graceful shutdown")
+        scheduler.stop()
+        partition_manager.stop()
+        await asyncio.gather(scheduler_task, partition_manager_task)
+        notification_coalescer.stop()
+        await notification_dispatcher.stop()
+        await status_flusher.stop()
+        await notification_handler_factory.close()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())